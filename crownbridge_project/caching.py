@@ -0,0 +1,184 @@
+# crownbridge_project/caching.py
+"""
+Page and fragment caching with tag-based invalidation.
+
+Cached pages and template fragments are keyed on the versions of the tags
+they depend on. A tag names data such as "plans" or the balance of one
+user. invalidate_tags() drops the tag's version after the commit. The next
+lookup then starts a new version, so every entry built on the old one is
+never read again and expires on its own. Writers only know which data they
+changed, never which pages show it:
+
+- PLANS_TAG: InvestmentPlan saves and deletes (investment.signals);
+- balance_tag(user_id): ledger writes and deposit, withdrawal and transfer
+  changes, through payment.summary.invalidate_balance_summary;
+- INVESTMENTS_TAG: profit accrual and maturity runs;
+- WITHDRAWAL_FEED_TAG: changes to the public withdrawals feed.
+
+cache_anonymous_page() caches whole responses for visitors who are not
+logged in. The {% cachefragment %} tag (dashboard.templatetags.fragment_cache)
+caches per-user parts of logged-in pages.
+
+Hits and misses are counted per process in memory and added to shared
+counters in the cache at most every STATS_FLUSH_INTERVAL seconds.
+cache_stats() reads them; they back the staff-only cache stats page and the
+cache_stats command. The counters are approximate: the file backend's incr
+is not atomic across processes.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+TAG_PREFIX = "cache-tag:"
+STATS_PREFIX = "cache-stats:"
+STATS_NAMES_KEY = "cache-stats:names"
+STATS_FLUSH_INTERVAL = getattr(settings, "CACHE_STATS_FLUSH_INTERVAL", 10.0)
+PAGE_CACHE_TIMEOUT = getattr(settings, "PAGE_CACHE_TIMEOUT", 60)
+
+PLANS_TAG = "plans"
+INVESTMENTS_TAG = "investments"
+WITHDRAWAL_FEED_TAG = "withdrawal-feed"
+
+
+def balance_tag(user_id):
+    return f"balance:{user_id}"
+
+
+def tag_versions(tags) -> str:
+    """The current versions of `tags` joined into one string, starting any that are missing."""
+    keys = [TAG_PREFIX + tag for tag in tags]
+    if not keys:
+        return ""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex[:12], None)
+        versions.update(cache.get_many(missing))
+    return ".".join(versions.get(key, "") for key in keys)
+
+
+def invalidate_tags(*tags):
+    """Retire the current versions of `tags` once the surrounding transaction commits."""
+    keys = [TAG_PREFIX + tag for tag in tags if tag]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def make_key(kind, name, *parts, tags=()) -> str:
+    digest = hashlib.md5(repr((parts, tag_versions(tags))).encode(), usedforsecurity=False).hexdigest()
+    return f"{kind}:{name}:{digest}"
+
+
+# --- hit/miss counters ------------------------------------------------------
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def count(name, hit: bool):
+    global _flushed_at
+    with _counts_lock:
+        _counts[(name, "hits" if hit else "misses")] += 1
+        due = time.monotonic() - _flushed_at >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Add this process's counts to the shared counters."""
+    global _flushed_at
+    with _counts_lock:
+        pending = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    if not pending:
+        return
+    for (name, kind), n in pending.items():
+        key = f"{STATS_PREFIX}{name}:{kind}"
+        try:
+            cache.incr(key, n)
+        except ValueError:
+            if not cache.add(key, n, None):
+                cache.incr(key, n)
+    names = cache.get(STATS_NAMES_KEY, set())
+    new = {name for name, _ in pending} - names
+    if new:
+        cache.set(STATS_NAMES_KEY, names | new, None)
+
+
+def cache_stats():
+    """{name: {"hits", "misses", "hit_rate"}} across all processes."""
+    flush_stats()
+    names = sorted(cache.get(STATS_NAMES_KEY, set()))
+    values = cache.get_many([f"{STATS_PREFIX}{name}:{kind}" for name in names for kind in ("hits", "misses")])
+    stats = {}
+    for name in names:
+        hits = values.get(f"{STATS_PREFIX}{name}:hits", 0)
+        misses = values.get(f"{STATS_PREFIX}{name}:misses", 0)
+        stats[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None}
+    return stats
+
+
+def reset_stats():
+    with _counts_lock:
+        _counts.clear()
+    names = cache.get(STATS_NAMES_KEY, set())
+    cache.delete_many([f"{STATS_PREFIX}{name}:{kind}" for name in names for kind in ("hits", "misses")] + [STATS_NAMES_KEY])
+
+
+# --- full pages -------------------------------------------------------------
+
+def _cacheable_request(request):
+    if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+        return False
+    # a page showing flash messages is for this visitor only
+    return not len(get_messages(request))
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    )
+
+
+def cache_anonymous_page(name, tags=(), timeout=None, vary_on=None):
+    """
+    Cache the view's response for anonymous GET requests, per full path (or
+    per `vary_on(request)` when given) and the versions of `tags`. Logged-in
+    users always get a fresh response. Responses carry X-Cache: HIT or MISS.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+            vary = vary_on(request) if vary_on else request.get_full_path()
+            key = make_key("page", name, vary, tags=tags)
+            cached = cache.get(key)
+            count(f"page:{name}", cached is not None)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Cache"] = "HIT"
+                return response
+            response = view(request, *args, **kwargs)
+            if _cacheable_response(request, response):
+                cache.set(key, (response.content, response["Content-Type"]), timeout or PAGE_CACHE_TIMEOUT)
+            response["X-Cache"] = "MISS"
+            return response
+        return wrapped
+    return decorator
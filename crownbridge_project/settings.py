@@ -88,6 +88,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'crownbridge_project.wsgi.application'
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# File based, so web and worker processes on one host share entries and
+# invalidations without an external service (see crownbridge_project/caching.py).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'crownbridge_project.cache_backends.FileCache',
+        # private to this user (mode 0700): the backend unpickles whatever it finds here
+        'LOCATION': os.getenv("CACHE_DIR", os.path.join(BASE_DIR, '.cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+            'CULL_EVERY': 100,
+        },
+    }
+}
+
+# Seconds an anonymous page stays cached when none of its tags change
+PAGE_CACHE_TIMEOUT = 60
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
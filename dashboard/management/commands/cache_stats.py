@@ -0,0 +1,21 @@
+# dashboard/management/commands/cache_stats.py
+from django.core.management.base import BaseCommand
+
+from crownbridge_project import caching
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counters of the page, fragment and data caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = caching.cache_stats()
+        if not stats:
+            self.stdout.write("No cache lookups recorded yet")
+        for name, row in stats.items():
+            rate = "-" if row["hit_rate"] is None else f"{row['hit_rate']:.1%}"
+            self.stdout.write(f"{name:<32} {row['hits']:>10} hits {row['misses']:>10} misses  {rate}")
+        if options['reset']:
+            caching.reset_stats()
@@ -0,0 +1,60 @@
+# dashboard/templatetags/fragment_cache.py
+"""
+{% cachefragment %}: Django's {% cache %} with tag-based invalidation and
+hit/miss counting (see crownbridge_project.caching).
+
+    {% load fragment_cache %}
+    {% cachefragment 300 "dashboard-stats" request.user.pk tags=cache_tags %}
+        ...
+    {% endcachefragment %}
+
+The fragment is keyed on its name, the vary-on values and the current
+versions of `tags` (a list of tag names). Values the body reads should be
+lazy, for example SimpleLazyObject, so a hit also skips their queries.
+"""
+from django import template
+from django.core.cache import cache
+
+from crownbridge_project import caching
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, tags):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.tags = tags
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        tags = self.tags.resolve(context) if self.tags is not None else ()
+        key = caching.make_key("fragment", name, *[var.resolve(context) for var in self.vary_on], tags=tags)
+        value = cache.get(key)
+        caching.count(f"fragment:{name}", value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, self.timeout.resolve(context))
+        return value
+
+
+@register.tag
+def cachefragment(parser, token):
+    """{% cachefragment timeout name [vary_on ...] [tags=list] %} ... {% endcachefragment %}"""
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a timeout and a name.")
+    tags = None
+    if bits[-1].startswith("tags="):
+        tags = parser.compile_filter(bits.pop()[len("tags="):])
+    nodelist = parser.parse(("endcachefragment",))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        tags,
+    )
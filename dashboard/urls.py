@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import guest_home_view, home_view, user_dashboard_view
+from .views import cache_stats_view, guest_home_view, home_view, user_dashboard_view
 
 urlpatterns = [
     path("", guest_home_view, name="guest_home"),
     path("home/", home_view, name="home"),
     path("portfolio/", user_dashboard_view, name="user_dashboard"),
+    path("cache/stats/", cache_stats_view, name="cache_stats"),
 ]
@@ -1,16 +1,19 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from investment.models import InvestmentPlan
-from payment.models import WithdrawalRequest
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from crownbridge_project import caching
+from investment.catalog import get_catalog
+from payment.withdrawal_feed import get_feed
 
+@caching.cache_anonymous_page("guest-home", tags=(caching.PLANS_TAG, caching.WITHDRAWAL_FEED_TAG))
 def guest_home_view(request):
     if request.user.is_authenticated:
         return redirect("home")
 
-    plans = InvestmentPlan.objects.all().order_by("min_deposit")
+    plans = get_catalog().plans
 
-    successful_withdrawals = WithdrawalRequest.objects.filter(status="sent").select_related("user").order_by("-created_at")
-    paginator = Paginator(successful_withdrawals, 7)
+    paginator = Paginator(get_feed(), 7)
     page_obj = paginator.get_page(request.GET.get("page"))
 
     return render(request, "dashboard/guest_home.html", {
@@ -19,12 +22,17 @@ def guest_home_view(request):
     })
 
 
+@staff_member_required
+def cache_stats_view(request):
+    """Hit/miss counters of the page, fragment and data caches, across workers."""
+    return JsonResponse(caching.cache_stats())
+
+
 @login_required
 def home_view(request):
-    plans = InvestmentPlan.objects.all().order_by("min_deposit")
+    plans = get_catalog().plans
 
-    successful_withdrawals = WithdrawalRequest.objects.filter(status="sent").select_related("user").order_by("-created_at")
-    paginator = Paginator(successful_withdrawals, 7)
+    paginator = Paginator(get_feed(), 7)
     page_obj = paginator.get_page(request.GET.get("page"))
 
     return render(request, "dashboard/home.html", {
@@ -39,8 +47,30 @@ from django.core.paginator import Paginator
 from django.contrib import messages
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from investment.models import UserInvestment, InvestmentIntent
-from payment.models import WithdrawalRequest, Deposit, P2PTransfer
+from investment.projections import portfolio
+from payment.models import WithdrawalRequest, P2PTransfer
+from payment.summary import get_balance_summary
+from payment.pagination import keyset_paginate
+from payment.rollups import period_totals
+
+def dashboard_stats(user):
+    """Balance, totals and portfolio figures of the dashboard cards."""
+    summary = get_balance_summary(user)
+    projection = portfolio(user)
+    today = timezone.localdate()
+    month = period_totals(user, today.replace(day=1), today)
+    return {
+        "available_balance": summary.balance,
+        "total_deposit": summary.total_deposited,
+        "total_withdrawn": summary.total_withdrawn,
+        "total_profit": projection.accrued_profit,
+        "maturing_soon": projection.maturing_soon,
+        "month_deposited": month.get("deposit", (0, 0))[1],
+        "month_withdrawn": month.get("withdrawal", (0, 0))[1],
+    }
+
 
 @login_required
 def user_dashboard_view(request):
@@ -56,44 +86,42 @@ def user_dashboard_view(request):
         .select_related("plan")
         .order_by("-start_time")
     )
-    intents = InvestmentIntent.objects.filter(user=user)
-    intent_map = {i.plan_id: i.chain for i in intents}
+    intent_map = SimpleLazyObject(lambda: {i.plan_id: i.chain for i in InvestmentIntent.objects.filter(user=user)})
 
     # --- DEPOSITS & WITHDRAWALS ---
-    deposits = Deposit.objects.filter(user=user, status="confirmed")
     withdrawals = WithdrawalRequest.objects.filter(user=user)
-
-    total_deposit = deposits.aggregate(total=models.Sum("amount"))["total"] or 0
-    total_withdrawn = withdrawals.filter(status="sent").aggregate(total=models.Sum("amount"))["total"] or 0
-    available_balance = total_deposit - total_withdrawn
-
-    last_withdrawal = withdrawals.first()
+    last_withdrawal = SimpleLazyObject(withdrawals.first)
 
     paginator = Paginator(investments, 10)
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = SimpleLazyObject(lambda: paginator.get_page(page_number))
 
     # --- KYC STATUS ---
     kyc_verified = user.kyc_verified  # ✅ now directly from CustomUser
 
     referral_url = request.build_absolute_uri(user.referral_link)
 
-    sent_transfers = P2PTransfer.objects.filter(sender=user)
-    received_transfers = P2PTransfer.objects.filter(receiver=user)
+    # the cached fragments only evaluate these on a miss
+    sent_transfers = SimpleLazyObject(lambda: keyset_paginate(
+        P2PTransfer.objects.filter(sender=user).select_related("receiver"), request.GET, per_page=10, prefix="sent_"
+    ))
+    received_transfers = SimpleLazyObject(lambda: keyset_paginate(
+        P2PTransfer.objects.filter(receiver=user).select_related("sender"), request.GET, per_page=10, prefix="received_"
+    ))
 
     context = {
         "user": user,
         "page_obj": page_obj,
         "intent_map": intent_map,
-        "available_balance": available_balance,
-        "total_deposit": total_deposit,
-        "total_withdrawn": total_withdrawn,
+        "stats": SimpleLazyObject(lambda: dashboard_stats(user)),
+        "stats_tags": [caching.balance_tag(user.pk), caching.INVESTMENTS_TAG],
         "kyc_verified": kyc_verified,
         "last_withdrawal": last_withdrawal,
         "recent_withdrawals": withdrawals[:5],
         "referral_url": referral_url,
         "sent_transfers": sent_transfers,
         "received_transfers": received_transfers,
+        "transfer_tags": [caching.balance_tag(user.pk)],
 
     }
 
@@ -0,0 +1,88 @@
+# investment/accrual.py
+"""
+Hourly profit accrual for active investments.
+
+accrue_plan() advances UserInvestment.profit_earned for one plan with a
+single UPDATE. Each active investment gets its expected profit times the
+fraction of the plan's duration_hours that has elapsed at `as_of`, capped
+at the full profit. The value is recomputed from start_time, not added to,
+so repeating a step cannot double-count. It can only grow.
+
+ProfitAccrual holds each plan's watermark. Its row is locked while the plan
+accrues, and a step at or before the watermark is skipped, so concurrent or
+restarted jobs do no duplicate work. After downtime, one step to the current
+hour catches up. Investments that ended before the previous watermark were
+already fully accrued then, so each step only touches investments still
+running after it.
+
+The maturity scheduler (investment.maturity) writes the exact final profit
+when it deactivates an investment; accrual never touches inactive rows.
+"""
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crownbridge_project import caching
+from .models import InvestmentPlan, ProfitAccrual, UserInvestment
+
+INVESTMENT_TABLE = UserInvestment._meta.db_table
+ACCRUAL_STEP = timedelta(hours=1)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+AccrualStats = namedtuple("AccrualStats", ["plans", "investments", "as_of", "elapsed"])
+
+ACCRUE_SQL = f"""
+    UPDATE {INVESTMENT_TABLE}
+    SET profit_earned = GREATEST(profit_earned, ROUND(
+        amount_invested * %(percent)s / 100
+        * COALESCE(LEAST(GREATEST(EXTRACT(EPOCH FROM (%(as_of)s - start_time)) / 3600 / NULLIF(%(hours)s, 0), 0), 1), 1),
+        2
+    ))
+    WHERE plan_id = %(plan)s AND is_active AND start_time < %(as_of)s AND end_time > %(since)s
+"""
+
+
+def accrual_point(now=None):
+    """The most recent whole hour at or before `now`."""
+    now = now or timezone.now()
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def accrue_plan(plan: InvestmentPlan, as_of) -> int:
+    """Accrue profit on `plan` up to `as_of`; returns the number of investments updated."""
+    ProfitAccrual.objects.bulk_create([ProfitAccrual(plan=plan, accrued_until=EPOCH)], ignore_conflicts=True)
+    with transaction.atomic():
+        watermark = ProfitAccrual.objects.select_for_update().get(plan=plan)
+        if watermark.accrued_until >= as_of:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(ACCRUE_SQL, {
+                "percent": plan.profit_percent,
+                "hours": plan.duration_hours,
+                "plan": plan.pk,
+                "as_of": as_of,
+                "since": watermark.accrued_until,
+            })
+            updated = cursor.rowcount
+        watermark.accrued_until = as_of
+        watermark.save(update_fields=["accrued_until", "updated_at"])
+    return updated
+
+
+def accrue_all(as_of=None) -> AccrualStats:
+    """Accrue every plan up to `as_of` (default: the current hour)."""
+    started = time.perf_counter()
+    as_of = as_of or accrual_point()
+    plans = list(InvestmentPlan.objects.only("id", "profit_percent", "duration_hours"))
+    investments = sum(accrue_plan(plan, as_of) for plan in plans)
+    if investments:
+        caching.invalidate_tags(caching.INVESTMENTS_TAG)
+    return AccrualStats(len(plans), investments, as_of, time.perf_counter() - started)
+
+
+def seconds_until_next_step(now=None) -> float:
+    now = now or timezone.now()
+    return (accrual_point(now) + ACCRUAL_STEP - now).total_seconds()
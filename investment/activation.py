@@ -0,0 +1,67 @@
+# investment/activation.py
+"""
+Bulk activation of investment intents from confirmed deposits.
+
+activate_intents() takes a chunk of confirmed deposits, matches them to open
+InvestmentIntent rows (investment.matching), and creates the UserInvestment
+rows and completes the intents with bulk queries. bulk_create skips
+post_save, so the caller queues the referral bonuses that
+signals.credit_referral_on_investment queues for single saves, with
+investment.referral_bonuses.enqueue() in the same transaction; the
+post_referral_bonuses drain credits them later. The caller also posts the
+principal debits (principal_entries) with the rest of its batch. They move
+each invested amount out of the user's spendable balance until the
+maturity scheduler (investment.maturity) pays it back with the profit.
+"""
+from datetime import timedelta
+from decimal import ROUND_DOWN, Decimal
+
+from django.utils import timezone
+
+from payment.ledger import LedgerEntry
+from .matching import complete_intents, match_intents
+from .models import UserInvestment
+
+CENT = Decimal("0.01")
+
+
+def principal_entries(investments):
+    """Ledger debits moving each investment's principal out of the user's balance."""
+    return [
+        LedgerEntry(
+            i.user_id, i.amount_invested, "debit",
+            note=f"Investment {i.id} principal", reference=f"investment:{i.id}",
+        )
+        for i in investments
+        if i.amount_invested > 0
+    ]
+
+
+def activate_intents(deposits):
+    """
+    Activate the intents matched to `deposits` (see matching.match_intents).
+    Must run inside the caller's transaction; returns the created
+    UserInvestment rows.
+    """
+    pairs = match_intents(deposits)
+    if not pairs:
+        return []
+    complete_intents(pairs)
+
+    now = timezone.now()
+    investments = [
+        UserInvestment(
+            user_id=deposit.user_id,
+            plan=intent.plan,
+            # never invest more than arrived: the principal is debited from this deposit
+            amount_invested=min(intent.amount, deposit.amount.quantize(CENT, ROUND_DOWN)),
+            profit_earned=0,
+            start_time=now,
+            end_time=now + timedelta(hours=intent.plan.duration_hours),
+            is_active=True,
+            principal_debited=True,  # the caller posts principal_entries() in the same transaction
+        )
+        for deposit, intent in pairs
+    ]
+    UserInvestment.objects.bulk_create(investments, batch_size=1000)
+    return investments
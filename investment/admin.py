@@ -1,11 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import UserInvestment, InvestmentIntent
+from . import maturity
 # Register your models here.
 
 
+@admin.action(description="Pay out profit of selected matured investments")
+def pay_profit(modeladmin, request, queryset):
+    entries = maturity.pay_profit(queryset.values_list("pk", flat=True))
+    messages.info(request, f"Paid profit on {len(entries)} investments")
+
+
 @admin.register(UserInvestment)
 class UserInvestmentAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'plan', 'amount_invested', 'profit_earned', 'start_time', 'end_time', 'is_active', 'auto_payout_done')
+    actions = [pay_profit]
 
 @admin.register(InvestmentIntent)
 class InvestmentIntentAdmin(admin.ModelAdmin):
@@ -0,0 +1,106 @@
+# investment/catalog.py
+"""
+Per-process cache of the InvestmentPlan catalog.
+
+Plans change a few times a year but are read on every landing, plans and
+invest page. get_catalog() returns a PlanCatalog built once per worker.
+It holds the plans ordered by min_deposit, a lookup by id, and an
+amount -> plans interval lookup over the deposit limits.
+
+Invalidation uses a version counter in the shared Django cache, which
+InvestmentPlan save/delete signals and the post_migrate plan seeding bump (see
+investment.signals). A worker compares its catalog's version with the
+counter at most every CHECK_INTERVAL seconds, which is one cache read and
+no queries. If the counter is missing, for example after a cache flush, a
+new one is started, and every worker rebuilds on its next check. Catalogs
+older than MAX_AGE are rebuilt even when the version agrees. That bounds
+staleness when the cache backend is not shared between workers.
+
+The plan instances are shared by every request in the process: treat them
+as read-only.
+"""
+import bisect
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import InvestmentPlan
+
+VERSION_KEY = "investment:plan-catalog-version"
+CHECK_INTERVAL = getattr(settings, "PLAN_CATALOG_CHECK_INTERVAL", 2.0)
+MAX_AGE = getattr(settings, "PLAN_CATALOG_MAX_AGE", 300.0)
+
+
+class PlanCatalog:
+    def __init__(self, plans, version):
+        self.version = version
+        self.plans = tuple(sorted(plans, key=lambda p: (p.min_deposit, p.pk)))
+        self.by_id = {p.pk: p for p in self.plans}
+        self._mins = [p.min_deposit for p in self.plans]
+        self.built_at = self.checked_at = time.monotonic()
+
+    def __iter__(self):
+        return iter(self.plans)
+
+    def __len__(self):
+        return len(self.plans)
+
+    def get(self, plan_id):
+        return self.by_id.get(plan_id)
+
+    def plans_for_amount(self, amount):
+        """Plans whose deposit limits accept `amount`, lowest min_deposit first."""
+        end = bisect.bisect_right(self._mins, amount)
+        return [p for p in self.plans[:end] if p.max_deposit is None or amount <= p.max_deposit]
+
+    def plan_for_amount(self, amount):
+        """The highest tier that accepts `amount`, or None."""
+        plans = self.plans_for_amount(amount)
+        return plans[-1] if plans else None
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version(**kwargs):
+    """Invalidate every worker's catalog; usable directly as a signal receiver."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    global _catalog
+    _catalog = None
+
+
+def get_catalog() -> PlanCatalog:
+    global _catalog
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - catalog.checked_at < CHECK_INTERVAL:
+        return catalog
+    version = current_version()
+    if catalog is not None and catalog.version == version and now - catalog.built_at < MAX_AGE:
+        catalog.checked_at = now
+        return catalog
+    with _lock:
+        if _catalog is not None and _catalog is not catalog:  # another thread just rebuilt it
+            return _catalog
+        _catalog = PlanCatalog(InvestmentPlan.objects.all(), version)
+        return _catalog
+
+
+def get_plan_or_404(plan_id) -> InvestmentPlan:
+    plan = get_catalog().get(plan_id)
+    if plan is None:
+        raise Http404("No InvestmentPlan matches the given query.")
+    return plan
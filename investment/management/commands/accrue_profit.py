@@ -0,0 +1,25 @@
+# investment/management/commands/accrue_profit.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from investment import accrual
+
+
+class Command(BaseCommand):
+    help = "Accrue profit on active investments up to the current hour, one UPDATE per plan. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and accrue at every hour boundary')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = accrual.accrue_all()
+            if stats.investments:
+                self.stdout.write(
+                    f"Accrued profit on {stats.investments} investments across {stats.plans} plans "
+                    f"up to {stats.as_of:%Y-%m-%d %H:%M} in {stats.elapsed:.2f}s"
+                )
+            if not options['loop']:
+                return
+            time.sleep(accrual.seconds_until_next_step() + 1)
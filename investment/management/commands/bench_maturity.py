@@ -0,0 +1,66 @@
+# investment/management/commands/bench_maturity.py
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from investment import maturity
+from investment.models import InvestmentPlan, UserInvestment
+from payment.models import Transaction, UserBalance
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-maturity-"
+
+
+class Command(BaseCommand):
+    help = "Settle a backlog of synthetic overdue investments and report throughput (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--investments', type=int, default=100000)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def setup(self, n_users, n_investments):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BM{uuid.uuid4().hex[:10]}")
+            for i in range(n_users)
+        ])
+        plan = InvestmentPlan.objects.filter(automated_payout=True).order_by("id").first()
+        ids = [u.pk for u in users]
+        now = timezone.now()
+        # generated in the database: a million rows would not fit comfortably through bulk_create
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {UserInvestment._meta.db_table} "
+                f"(user_id, plan_id, amount_invested, profit_earned, start_time, end_time, is_active, auto_payout_done, principal_debited) "
+                f"SELECT (%s::bigint[])[1 + g %% %s], %s, 100 + g %% 7, 0, %s, %s - g * interval '1 second', true, false, true "
+                f"FROM generate_series(0, %s - 1) AS g",
+                [ids, len(ids), plan.pk, now - timedelta(days=30), now, n_investments],
+            )
+        return users, plan
+
+    def handle(self, *args, **options):
+        users, plan = self.setup(options['users'], options['investments'])
+        ids = [u.pk for u in users]
+        started = time.perf_counter()
+        stats = maturity.settle_due(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+
+        invested = UserInvestment.objects.filter(user_id__in=ids).aggregate(s=Sum("amount_invested"))["s"]
+        expected = invested * (1 + plan.profit_percent / 100)
+        credited = UserBalance.objects.filter(user_id__in=ids).aggregate(s=Sum("balance"))["s"]
+        active = UserInvestment.objects.filter(user_id__in=ids, is_active=True).count()
+        self.stdout.write(
+            f"{stats.matured} matured in {stats.chunks} chunks / {elapsed:.2f}s ({stats.matured / elapsed:.0f}/sec); "
+            f"credited {credited} (expected {expected:.2f}), {active} still active, "
+            f"{Transaction.objects.filter(user_id__in=ids).count()} transactions"
+        )
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,80 @@
+# investment/management/commands/bench_profit_accrual.py
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from investment import accrual
+from investment.models import InvestmentPlan, ProfitAccrual, UserInvestment
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-accrual-"
+
+
+def legacy_accrue(investments, now):
+    """Per-row accrual in Python, kept here for comparison only."""
+    for inv in investments:
+        total = inv.end_time - inv.start_time
+        fraction = min(max((now - inv.start_time) / total, 0), 1) if total else 1
+        inv.profit_earned = (inv.calculate_expected_profit() * Decimal(fraction)).quantize(Decimal("0.01"))
+        inv.save(update_fields=["profit_earned"])
+
+
+class Command(BaseCommand):
+    help = "Accrue profit on synthetic active investments row by row or per plan and report throughput (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--investments', type=int, default=100000)
+        parser.add_argument('--legacy', action='store_true', help='Accrue row by row in Python')
+
+    def setup(self, n_users, n_investments):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BA{uuid.uuid4().hex[:10]}")
+            for i in range(n_users)
+        ])
+        plans = list(InvestmentPlan.objects.order_by("id"))
+        ids = [u.pk for u in users]
+        now = timezone.now()
+        # investments spread over the first half of each plan's duration
+        with connection.cursor() as cursor:
+            for n, plan in enumerate(plans):
+                cursor.execute(
+                    f"INSERT INTO {UserInvestment._meta.db_table} "
+                    f"(user_id, plan_id, amount_invested, profit_earned, start_time, end_time, is_active, auto_payout_done, principal_debited) "
+                    f"SELECT (%s::bigint[])[1 + g %% %s], %s, 100 + g %% 7, 0, s, s + %s * interval '1 hour', true, false, true "
+                    f"FROM generate_series(0, %s - 1) AS g, "
+                    f"LATERAL (SELECT %s - (g %% 1000) * %s * interval '1 hour' / 2000 AS s) AS t",
+                    [ids, len(ids), plan.pk, plan.duration_hours, n_investments // len(plans), now, plan.duration_hours],
+                )
+        return users
+
+    def handle(self, *args, **options):
+        users = self.setup(options['users'], options['investments'])
+        ids = [u.pk for u in users]
+        as_of = accrual.accrual_point()
+        ProfitAccrual.objects.all().delete()
+        started = time.perf_counter()
+        if options['legacy']:
+            legacy_accrue(UserInvestment.objects.filter(user_id__in=ids).select_related("plan").iterator(chunk_size=2000), as_of)
+            updated = UserInvestment.objects.filter(user_id__in=ids).count()
+        else:
+            updated = accrual.accrue_all(as_of).investments
+        elapsed = time.perf_counter() - started
+        again = accrual.accrue_all(as_of).investments
+
+        total = UserInvestment.objects.filter(user_id__in=ids).aggregate(s=Sum("profit_earned"))["s"]
+        self.stdout.write(
+            f"{'legacy' if options['legacy'] else 'per plan'}: {updated} investments in {elapsed:.2f}s "
+            f"({updated / elapsed:.0f}/sec); accrued {total}; repeat run touched {again}"
+        )
+        ProfitAccrual.objects.all().delete()
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
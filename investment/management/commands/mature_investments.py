@@ -0,0 +1,36 @@
+# investment/management/commands/mature_investments.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from investment import maturity
+
+
+class Command(BaseCommand):
+    help = "Mature due investments and pay out principal plus profit in chunks. Safe to run several at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Investments settled per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running and wake up at each maturity')
+        parser.add_argument('--horizon', type=int, default=3600, help='Seconds of upcoming maturities kept in memory')
+        parser.add_argument('--refresh-interval', type=float, default=60.0, help='Seconds between reloads of upcoming maturities')
+
+    def report(self, stats):
+        elapsed = max(stats.elapsed, 1e-9)
+        self.stdout.write(
+            f"Matured {stats.matured} investments in {stats.chunks} chunks / {stats.elapsed:.2f}s "
+            f"({stats.matured / elapsed:.0f}/sec), paid {stats.paid} totalling {stats.total_paid}"
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            stats = maturity.settle_due(chunk_size=options['chunk_size'])
+            if stats.matured:
+                self.report(stats)
+            return
+        scheduler = maturity.MaturityScheduler(
+            chunk_size=options['chunk_size'],
+            horizon=timedelta(seconds=options['horizon']),
+            refresh_interval=options['refresh_interval'],
+        )
+        scheduler.run(on_settled=self.report)
@@ -0,0 +1,27 @@
+# investment/management/commands/post_referral_bonuses.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from investment import referral_bonuses
+
+
+class Command(BaseCommand):
+    help = "Credit queued multi-level referral bonuses in batches. Safe to run several at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bonuses claimed per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for newly queued bonuses')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when nothing is queued')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = referral_bonuses.drain(batch_size=options['batch_size'])
+            if stats.posted:
+                self.stdout.write(
+                    f"Posted {stats.posted} referral bonuses totalling {stats.total} "
+                    f"in {stats.batches} batches / {stats.elapsed:.2f}s"
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,99 @@
+# investment/matching.py
+"""
+Deposit-to-intent matching.
+
+match_intents() pairs a batch of deposits with open InvestmentIntent rows in
+a single query: the deposits' (user, chain, amount) keys are joined against
+the open intents, which the partial index investment_intent_open_idx covers,
+and the rows come back locked and oldest first. The pairing itself is a
+hash join in memory, so its cost does not depend on how many intents are
+open overall. Each deposit takes the oldest unused intent with the same
+user, chain and amount to the cent. A deposit whose chain is unknown (no
+platform wallet) falls back to the oldest intent with the same user and
+amount on any chain.
+"""
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from .models import InvestmentIntent, InvestmentPlan
+
+CENT = Decimal("0.01")
+INTENT_TABLE = InvestmentIntent._meta.db_table
+
+
+def deposit_key(deposit):
+    chain = deposit.platform_wallet.chain if deposit.platform_wallet_id else None
+    return deposit.user_id, chain, deposit.amount.quantize(CENT)
+
+
+def open_intents(keys, batch_size: int = 1000):
+    """Lock and return the open intents for (user_id, chain, amount) keys, oldest first."""
+    exact = sorted({k for k in keys if k[1] is not None})
+    loose = sorted({(uid, amount) for uid, chain, amount in keys if chain is None})
+    intents = []
+    for i in range(0, len(exact), batch_size):
+        chunk = exact[i:i + batch_size]
+        intents.extend(InvestmentIntent.objects.raw(
+            f"SELECT i.* FROM {INTENT_TABLE} i "
+            f"JOIN (VALUES {', '.join(['(%s, %s, %s::numeric)'] * len(chunk))}) AS k(user_id, chain, amount) "
+            f"ON i.user_id = k.user_id AND i.chain = k.chain AND i.amount = k.amount "
+            f"WHERE NOT i.completed ORDER BY i.user_id, i.created_at, i.id FOR UPDATE OF i",
+            [value for key in chunk for value in key],
+        ))
+    for i in range(0, len(loose), batch_size):
+        chunk = loose[i:i + batch_size]
+        intents.extend(InvestmentIntent.objects.raw(
+            f"SELECT i.* FROM {INTENT_TABLE} i "
+            f"JOIN (VALUES {', '.join(['(%s, %s::numeric)'] * len(chunk))}) AS k(user_id, amount) "
+            f"ON i.user_id = k.user_id AND i.amount = k.amount "
+            f"WHERE NOT i.completed ORDER BY i.user_id, i.created_at, i.id FOR UPDATE OF i",
+            [value for key in chunk for value in key],
+        ))
+    plans = InvestmentPlan.objects.in_bulk({i.plan_id for i in intents})
+    for intent in intents:
+        intent.plan = plans[intent.plan_id]
+    return intents
+
+
+def match_intents(deposits):
+    """
+    Return [(deposit, intent)] for the deposits that match an open intent.
+    Must run inside the caller's transaction, which keeps the intents locked.
+    """
+    keys = {d.pk: deposit_key(d) for d in deposits}
+    if not keys:
+        return []
+
+    by_exact, by_loose = defaultdict(deque), defaultdict(deque)
+    intents = sorted(open_intents(keys.values()), key=lambda i: (i.created_at, str(i.pk)))
+    seen = set()
+    for intent in intents:
+        if intent.pk in seen:  # returned by both the exact and the loose join
+            continue
+        seen.add(intent.pk)
+        by_exact[(intent.user_id, intent.chain, intent.amount)].append(intent)
+        by_loose[(intent.user_id, intent.amount)].append(intent)
+
+    used = set()
+    pairs = []
+    for d in deposits:
+        uid, chain, amount = keys[d.pk]
+        queue = by_exact[(uid, chain, amount)] if chain is not None else by_loose[(uid, amount)]
+        while queue and queue[0].pk in used:
+            queue.popleft()
+        if queue:
+            intent = queue.popleft()
+            used.add(intent.pk)
+            pairs.append((d, intent))
+    return pairs
+
+
+def complete_intents(pairs, batch_size: int = 1000):
+    """Mark matched intents completed, recording each deposit's tx hash, in bulk."""
+    intents = []
+    for deposit, intent in pairs:
+        intent.completed = True
+        intent.deposit_tx = deposit.tx_hash
+        intents.append(intent)
+    InvestmentIntent.objects.bulk_update(intents, ["completed", "deposit_tx"], batch_size=batch_size)
+    return intents
@@ -0,0 +1,195 @@
+# investment/maturity.py
+"""
+Maturity scheduler for UserInvestment.
+
+settle_due() matures investments whose end_time has passed, one chunk at a
+time. Each chunk is a single UPDATE: it claims up to `chunk_size` due
+investments through investment_maturity_idx with FOR UPDATE SKIP LOCKED,
+marks them inactive, and records their profit. It returns the rows it
+changed, and their payouts are posted with one ledger.post_batch call. Any
+number of schedulers can run side by side. After downtime the backlog is
+drained chunk by chunk, so a million overdue investments never have to be
+held in memory at once.
+
+Principal is credited back only when principal_debited is set, that is
+when activation debited it (investment.activation.principal_entries).
+Investments created before principal debits were introduced carry
+principal_debited = false, so their principal, which never left the
+balance, is not paid a second time. This holds for every plan. An
+investment whose plan has automated_payout is also credited its profit and
+flagged auto_payout_done. On other plans the profit is only recorded in
+profit_earned; an admin pays it out with pay_profit() (the "Pay out
+profit" admin action), which sets the same flag.
+
+MaturityScheduler keeps the upcoming end times in a min-heap, reloaded from
+the same index every `refresh_interval` seconds. It sleeps until the next
+investment is due, or until the next reload picks up newly activated ones.
+"""
+import heapq
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crownbridge_project import caching
+from payment import ledger
+from .models import InvestmentPlan, UserInvestment
+
+logger = logging.getLogger(__name__)
+
+INVESTMENT_TABLE = UserInvestment._meta.db_table
+PLAN_TABLE = InvestmentPlan._meta.db_table
+
+SettleStats = namedtuple("SettleStats", ["matured", "paid", "total_paid", "chunks", "elapsed"])
+
+# one statement claims a chunk of due investments and matures it
+MATURE_SQL = f"""
+    UPDATE {INVESTMENT_TABLE} AS i
+    SET is_active = false,
+        profit_earned = ROUND(i.amount_invested * p.profit_percent / 100, 2),
+        auto_payout_done = p.automated_payout
+    FROM {PLAN_TABLE} AS p
+    WHERE p.id = i.plan_id AND i.id IN (
+        SELECT id FROM {INVESTMENT_TABLE}
+        WHERE is_active AND end_time <= %s
+        ORDER BY end_time, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING i.id, i.user_id, i.amount_invested, i.profit_earned, p.automated_payout, i.principal_debited
+"""
+
+
+def payout_entries(rows):
+    """
+    Ledger credits for matured (id, user, principal, profit, automated,
+    principal debited) rows: the principal where activation debited it,
+    plus the profit on automated plans.
+    """
+    entries = []
+    for pk, user_id, principal, profit, automated, principal_debited in rows:
+        if not principal_debited:
+            principal = Decimal("0")
+        if not automated:
+            profit = Decimal("0")
+        amount = principal + profit
+        if amount > Decimal("0"):
+            entries.append(ledger.LedgerEntry(
+                user_id, amount, "credit",
+                note=f"Investment {pk} matured: principal {principal} + profit {profit}",
+                reference=f"investment:{pk}:payout",
+            ))
+    return entries
+
+
+# claims matured investments whose profit was not paid yet
+PAY_PROFIT_SQL = f"""
+    UPDATE {INVESTMENT_TABLE}
+    SET auto_payout_done = true
+    WHERE id = ANY(%s) AND NOT is_active AND NOT auto_payout_done
+    RETURNING id, user_id, profit_earned
+"""
+
+
+@ledger.retry_on_conflict
+def pay_profit(investment_ids):
+    """Credit the recorded profit of the matured, unpaid investments in `investment_ids`; returns the entries posted."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(PAY_PROFIT_SQL, [list(investment_ids)])
+            rows = cursor.fetchall()
+        entries = [
+            ledger.LedgerEntry(
+                user_id, profit, "credit",
+                note=f"Investment {pk} profit {profit}", reference=f"investment:{pk}:profit",
+            )
+            for pk, user_id, profit in rows
+            if profit > Decimal("0")
+        ]
+        ledger.post_batch(entries)
+    if rows:
+        caching.invalidate_tags(caching.INVESTMENTS_TAG)
+    return entries
+
+
+@ledger.retry_on_conflict
+def settle_chunk(now=None, chunk_size: int = 1000):
+    """Mature and pay out one chunk of due investments; returns (matured, ledger entries posted)."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(MATURE_SQL, [now, chunk_size])
+            rows = cursor.fetchall()
+        entries = payout_entries(rows)
+        ledger.post_batch(entries)
+    return len(rows), entries
+
+
+def settle_due(now=None, chunk_size: int = 1000, max_chunks: int = None) -> SettleStats:
+    """Settle every investment due at `now` (default: the current time), chunk by chunk."""
+    started = time.perf_counter()
+    matured = paid = chunks = 0
+    total = Decimal("0")
+    while max_chunks is None or chunks < max_chunks:
+        n, entries = settle_chunk(now, chunk_size)
+        if not n:
+            break
+        matured += n
+        paid += len(entries)
+        total += sum((e.amount for e in entries), Decimal("0"))
+        chunks += 1
+    if matured:
+        caching.invalidate_tags(caching.INVESTMENTS_TAG)
+    return SettleStats(matured, paid, total, chunks, time.perf_counter() - started)
+
+
+class MaturityScheduler:
+    def __init__(self, chunk_size: int = 1000, horizon=timedelta(hours=1), refresh_interval: float = 60.0):
+        self.chunk_size = chunk_size
+        self.horizon = horizon
+        self.refresh_interval = refresh_interval
+        self._heap = []  # end_time timestamps of active investments within the horizon
+        self._loaded_at = None
+
+    def load(self):
+        """Reload the end times due between now and now + horizon; overdue ones are left to settle_due."""
+        now = timezone.now()
+        upcoming = UserInvestment.objects.filter(
+            is_active=True, end_time__gt=now, end_time__lte=now + self.horizon
+        ).order_by("end_time").values_list("end_time", flat=True)
+        self._heap = [end.timestamp() for end in upcoming.iterator(chunk_size=5000)]
+        heapq.heapify(self._heap)
+        self._loaded_at = time.monotonic()
+
+    def next_wakeup(self) -> float:
+        """Seconds to sleep until the next due investment or the next reload."""
+        until_reload = self.refresh_interval - (time.monotonic() - self._loaded_at)
+        if not self._heap:
+            return max(until_reload, 0.0)
+        return max(min(self._heap[0] - time.time(), until_reload), 0.0)
+
+    def tick(self) -> SettleStats:
+        """Settle whatever is due now and drop it from the heap."""
+        now = timezone.now()
+        stats = settle_due(now, self.chunk_size)
+        cutoff = now.timestamp()
+        while self._heap and self._heap[0] <= cutoff:
+            heapq.heappop(self._heap)
+        return stats
+
+    def run(self, stop=None, on_settled=None):
+        """Catch up, then wake at each due time until `stop()` returns True."""
+        self.load()
+        while True:
+            stats = self.tick()
+            if stats.matured and on_settled:
+                on_settled(stats)
+            if stop and stop():
+                return
+            time.sleep(self.next_wakeup())
+            if time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self.load()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investment', '0002_investmentintent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investmentintent',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['user', 'chain', 'amount', 'created_at'], name='investment_intent_open_idx'),
+        ),
+    ]
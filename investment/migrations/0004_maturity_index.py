@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investment', '0003_intent_open_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userinvestment',
+            index=models.Index(fields=['is_active', 'end_time'], name='investment_maturity_idx'),
+        ),
+    ]
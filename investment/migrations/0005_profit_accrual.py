@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investment', '0004_maturity_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfitAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrued_until', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='accrual', to='investment.investmentplan')),
+            ],
+        ),
+    ]
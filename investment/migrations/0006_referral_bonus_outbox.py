@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investment', '0005_profit_accrual'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralBonus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('posted_at', models.DateTimeField(blank=True, null=True)),
+                ('beneficiary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_bonuses', to=settings.AUTH_USER_MODEL)),
+                ('investment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_bonuses', to='investment.userinvestment')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('posted_at__isnull', True)), fields=['id'], name='investment_refbonus_todo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('investment', 'beneficiary'), name='investment_refbonus_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investment', '0006_referral_bonus_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinvestment',
+            name='principal_debited',
+            field=models.BooleanField(default=False),
+        ),
+    ]
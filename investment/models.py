@@ -35,11 +35,17 @@ class UserInvestment(models.Model):
     end_time = models.DateTimeField()
     is_active = models.BooleanField(default=True)
     auto_payout_done = models.BooleanField(default=False)
+    # set when activation debited the principal from the balance; maturity only pays back principal it took
+    principal_debited = models.BooleanField(default=False)
 
     class Meta:
         verbose_name = "User Investment"
         verbose_name_plural = "User Investments"
         ordering = ['-start_time']
+        indexes = [
+            # maturity scheduler: next active investments to mature
+            models.Index(fields=["is_active", "end_time"], name="investment_maturity_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.plan.name}"
@@ -48,6 +54,38 @@ class UserInvestment(models.Model):
         return (self.amount_invested * self.plan.profit_percent) / 100
 
 
+class ReferralBonus(models.Model):
+    """A referral bonus owed to an upline member; posted to the ledger by investment.referral_bonuses."""
+    investment = models.ForeignKey(UserInvestment, on_delete=models.CASCADE, related_name='referral_bonuses')
+    beneficiary = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_bonuses')
+    level = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    posted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["investment", "beneficiary"], name="investment_refbonus_uniq"),
+        ]
+        indexes = [
+            # the outbox: bonuses not posted yet, oldest first
+            models.Index(fields=["id"], condition=models.Q(posted_at__isnull=True), name="investment_refbonus_todo_idx"),
+        ]
+
+    def __str__(self):
+        return f"Level {self.level} bonus {self.amount} for {self.beneficiary_id}"
+
+
+class ProfitAccrual(models.Model):
+    """Watermark of investment.accrual: profit on `plan` is accrued up to `accrued_until`."""
+    plan = models.OneToOneField(InvestmentPlan, on_delete=models.CASCADE, related_name='accrual')
+    accrued_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.plan.name} accrued until {self.accrued_until}"
+
+
 class InvestmentIntent(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='investment_intents')
@@ -57,3 +95,13 @@ class InvestmentIntent(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed = models.BooleanField(default=False)
     deposit_tx = models.CharField(max_length=128, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # open intents only: completed ones are never matched again
+            models.Index(
+                fields=["user", "chain", "amount", "created_at"],
+                condition=models.Q(completed=False),
+                name="investment_intent_open_idx",
+            ),
+        ]
@@ -0,0 +1,90 @@
+# investment/projections.py
+"""
+Portfolio figures and what-if quotes for investment plans.
+
+portfolio() computes a user's totals in one aggregate query, joined to the
+plan for the profit rate: amount invested, expected profit, profit accrued
+so far (UserInvestment.profit_earned, kept current by investment.accrual),
+and what matures next. This replaces a Python loop over
+calculate_expected_profit() that issued one plan query per investment.
+
+quote() projects a list of amounts onto every plan of the cached catalog
+(investment.catalog) in a single pass. Pages can show example returns for
+any number of amounts at a constant query count.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import UserInvestment
+
+CENT = Decimal("0.01")
+MATURING_WINDOW = timedelta(hours=24)
+
+Portfolio = namedtuple(
+    "Portfolio",
+    ["invested", "active_invested", "expected_profit", "accrued_profit", "next_maturity", "maturing_soon"],
+)
+Quote = namedtuple("Quote", ["plan", "amount", "eligible", "profit", "total", "duration_hours"])
+
+_MONEY = DecimalField(max_digits=32, decimal_places=8)
+
+
+def _total(expression, **extra):
+    return Coalesce(Sum(expression, **extra), Value(Decimal("0")), output_field=_MONEY)
+
+
+def portfolio(user, now=None, window: timedelta = MATURING_WINDOW) -> Portfolio:
+    """
+    Return `user`'s Portfolio in one query. `maturing_soon` is the principal
+    plus expected profit of active investments ending within `window`.
+    """
+    now = now or timezone.now()
+    expected = ExpressionWrapper(F("amount_invested") * F("plan__profit_percent") / 100, output_field=_MONEY)
+    active = Q(is_active=True)
+    totals = UserInvestment.objects.filter(user=user).aggregate(
+        invested=_total("amount_invested"),
+        active_invested=_total("amount_invested", filter=active),
+        expected_profit=_total(expected),
+        accrued_profit=_total("profit_earned"),
+        next_maturity=Min("end_time", filter=active),
+        maturing_soon=_total(F("amount_invested") + expected, filter=active & Q(end_time__lte=now + window)),
+    )
+    return Portfolio(
+        invested=totals["invested"].quantize(CENT),
+        active_invested=totals["active_invested"].quantize(CENT),
+        expected_profit=totals["expected_profit"].quantize(CENT),
+        accrued_profit=totals["accrued_profit"].quantize(CENT),
+        next_maturity=totals["next_maturity"],
+        maturing_soon=totals["maturing_soon"].quantize(CENT),
+    )
+
+
+def quote(amounts, plans=None):
+    """
+    Project every amount in `amounts` on every plan; returns
+    {plan id: [Quote, ...]} with the quotes in the order of `amounts`.
+    An amount outside a plan's deposit limits is quoted with eligible=False.
+    """
+    plans = list(plans) if plans is not None else get_catalog().plans
+    amounts = [Decimal(a) for a in amounts]
+    quotes = {}
+    for plan in plans:
+        rate = plan.profit_percent / 100
+        low, high = plan.min_deposit, plan.max_deposit
+        quotes[plan.pk] = [
+            Quote(
+                plan, amount,
+                low <= amount and (high is None or amount <= high),
+                (amount * rate).quantize(CENT),
+                (amount * (1 + rate)).quantize(CENT),
+                plan.duration_hours,
+            )
+            for amount in amounts
+        ]
+    return quotes
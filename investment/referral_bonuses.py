@@ -0,0 +1,128 @@
+# investment/referral_bonuses.py
+"""
+Multi-level referral bonuses through an outbox.
+
+enqueue() runs in the transaction that creates the investments. It reads
+the upline of every investor from the referral closure table
+(users.referrals) with one query, at most REFERRAL_LEVELS deep, and
+inserts one ReferralBonus row per (investment, beneficiary). The unique
+constraint on that pair makes re-enqueueing harmless. Nothing is credited
+at this point, so creating an investment costs the same whatever the depth
+of the tree.
+
+post_pending() is the drain. It claims a batch of unposted rows with FOR
+UPDATE SKIP LOCKED, credits them all with one ledger.post_batch call, and
+marks them posted in the same transaction. Several drains can run side by
+side (see the post_referral_bonuses command).
+
+The direct referrer earns their own referral_bonus_percent. Upline members
+at levels 2 and deeper earn REFERRAL_UPLINE_PERCENTS, one percentage per
+level.
+"""
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from payment import ledger
+from users.models import CustomUser, ReferralPath
+from .models import ReferralBonus
+
+CENT = Decimal("0.01")
+DEFAULT_PERCENT = Decimal("8.00")
+REFERRAL_UPLINE_PERCENTS = [Decimal(p) for p in getattr(settings, "REFERRAL_UPLINE_PERCENTS", ("3.00", "1.00"))]
+REFERRAL_LEVELS = 1 + len(REFERRAL_UPLINE_PERCENTS)
+
+DrainStats = namedtuple("DrainStats", ["posted", "total", "batches", "elapsed"])
+
+
+def bonus_percent(level: int, referrer_percent=None) -> Decimal:
+    """The percentage an upline member `level` steps above the investor earns."""
+    if level == 1:
+        return Decimal(referrer_percent if referrer_percent is not None else DEFAULT_PERCENT)
+    if level <= REFERRAL_LEVELS:
+        return REFERRAL_UPLINE_PERCENTS[level - 2]
+    return Decimal("0")
+
+
+def bonuses_for(investments):
+    """Unsaved ReferralBonus rows owed on `investments`, read from the closure table."""
+    investments = [i for i in investments if i.amount_invested > 0]
+    if not investments:
+        return []
+    uplines = {}
+    paths = ReferralPath.objects.filter(
+        descendant_id__in={i.user_id for i in investments}, depth__lte=REFERRAL_LEVELS
+    ).values_list("descendant_id", "ancestor_id", "depth", "ancestor__referral_bonus_percent")
+    for descendant_id, ancestor_id, depth, percent in paths:
+        uplines.setdefault(descendant_id, []).append((ancestor_id, depth, percent))
+
+    bonuses = []
+    for investment in investments:
+        for ancestor_id, depth, percent in uplines.get(investment.user_id, ()):
+            amount = (investment.amount_invested * bonus_percent(depth, percent) / 100).quantize(CENT)
+            if amount > 0:
+                bonuses.append(ReferralBonus(
+                    investment_id=investment.pk, beneficiary_id=ancestor_id, level=depth, amount=amount,
+                ))
+    return bonuses
+
+
+def enqueue(investments) -> int:
+    """Queue the referral bonuses owed on `investments`; returns how many were queued."""
+    bonuses = bonuses_for(investments)
+    ReferralBonus.objects.bulk_create(bonuses, batch_size=1000, ignore_conflicts=True)
+    return len(bonuses)
+
+
+def entries_for(bonuses):
+    """Ledger credits for claimed ReferralBonus rows."""
+    emails = dict(
+        CustomUser.objects.filter(pk__in={b.investment.user_id for b in bonuses}).values_list("pk", "email")
+    )
+    entries = []
+    for bonus in bonuses:
+        source = f"{emails.get(bonus.investment.user_id)} investment {bonus.investment_id}"
+        note = f"Referral bonus from {source}" if bonus.level == 1 else f"Level {bonus.level} referral bonus from {source}"
+        entries.append(ledger.LedgerEntry(
+            bonus.beneficiary_id, bonus.amount, "credit",
+            note=note, reference=f"referral:{bonus.investment_id}:{bonus.beneficiary_id}",
+        ))
+    return entries
+
+
+@ledger.retry_on_conflict
+def post_pending(batch_size: int = 1000):
+    """Credit one batch of queued bonuses; returns the ledger entries posted."""
+    with transaction.atomic():
+        bonuses = list(
+            ReferralBonus.objects.filter(posted_at__isnull=True)
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("investment")
+            .only("id", "beneficiary_id", "level", "amount", "investment_id", "investment__user_id")
+            .order_by("id")[:batch_size]
+        )
+        if not bonuses:
+            return []
+        entries = entries_for(bonuses)
+        ledger.post_batch(entries)
+        ReferralBonus.objects.filter(pk__in=[b.pk for b in bonuses]).update(posted_at=timezone.now())
+    return entries
+
+
+def drain(batch_size: int = 1000, max_batches: int = None) -> DrainStats:
+    """Post queued bonuses until none are left (or `max_batches` is reached)."""
+    started = time.perf_counter()
+    posted = batches = 0
+    total = Decimal("0")
+    while max_batches is None or batches < max_batches:
+        entries = post_pending(batch_size)
+        if not entries:
+            break
+        posted += len(entries)
+        total += sum((e.amount for e in entries), Decimal("0"))
+        batches += 1
+    return DrainStats(posted, total, batches, time.perf_counter() - started)
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_migrate
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
-from .models import InvestmentPlan
+from .models import InvestmentPlan, UserInvestment
+from crownbridge_project import caching
+from . import catalog
+from . import referral_bonuses
 
 
 @receiver(post_migrate)
@@ -44,35 +48,23 @@ def create_default_plans(sender, **kwargs):
         for plan_data in plans:
             InvestmentPlan.objects.get_or_create(name=plan_data["name"], defaults=plan_data)
 
+        # migrations may have changed plan rows without going through save()
+        catalog.bump_version()
+        caching.invalidate_tags(caching.PLANS_TAG)
 
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import UserInvestment
-from users.models import CustomUser
-from payment.models import UserBalance, Transaction
-from decimal import Decimal
-
 @receiver(post_save, sender=UserInvestment)
-def credit_referral_on_investment(sender, instance: UserInvestment, created, **kwargs):
-    if not created:
+def credit_referral_on_investment(sender, instance: UserInvestment, created, raw=False, **kwargs):
+    if not created or raw:
         return
+    # queue the upline's bonuses; the post_referral_bonuses command credits them
+    referral_bonuses.enqueue([instance])
 
-    user = instance.user
-    referrer = getattr(user, "referred_by", None)
-    if not referrer:
-        return
-
-    # compute bonus: percent on the invested amount
-    bonus_percent = getattr(referrer, "referral_bonus_percent", 8.0)
-    try:
-        percent = Decimal(bonus_percent) / Decimal(100)
-        bonus_amount = (instance.amount_invested * percent).quantize(Decimal("0.01"))
-    except Exception:
-        return
 
-    # credit the referrer internal balance and create a transaction
-    ub, _ = UserBalance.objects.get_or_create(user=referrer)
-    ub.credit(bonus_amount, note=f"Referral bonus from {user.email} investment {instance.id}")
+@receiver(post_save, sender=InvestmentPlan)
+@receiver(post_delete, sender=InvestmentPlan)
+def invalidate_plan_catalog(sender, **kwargs):
+    # bump after commit so no worker rebuilds from the uncommitted rows
+    transaction.on_commit(catalog.bump_version)
+    caching.invalidate_tags(caching.PLANS_TAG)
 
-    # Optionally record a Referral record (see below if you want)
@@ -1,3 +1,101 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from payment.models import Transaction, UserBalance
+from users.models import CustomUser
+from . import maturity
+from .models import InvestmentPlan, UserInvestment
+
+
+class MaturityTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.auto = InvestmentPlan.objects.create(
+            name="Test Auto", profit_percent=Decimal("10"), duration_hours=24, min_deposit=1, automated_payout=True
+        )
+        self.manual = InvestmentPlan.objects.create(
+            name="Test Manual", profit_percent=Decimal("10"), duration_hours=24, min_deposit=1, automated_payout=False
+        )
+
+    def invest(self, email, plan, amount, hours_left=-1, principal_debited=True):
+        user = CustomUser.objects.create_user(email=email, password="x")
+        investment = UserInvestment.objects.create(
+            user=user, plan=plan, amount_invested=Decimal(amount),
+            start_time=self.now - timedelta(hours=24), end_time=self.now + timedelta(hours=hours_left),
+            principal_debited=principal_debited,
+        )
+        return user, investment
+
+    def balance(self, user):
+        return UserBalance.objects.get(user=user).balance
+
+    def test_pays_principal_and_profit_of_due_automated_investments(self):
+        user, investment = self.invest("auto@example.com", self.auto, "100")
+        stats = maturity.settle_due(self.now)
+        self.assertEqual((stats.matured, stats.paid, stats.total_paid), (1, 1, Decimal("110")))
+        investment.refresh_from_db()
+        self.assertEqual((investment.is_active, investment.auto_payout_done), (False, True))
+        self.assertEqual(investment.profit_earned, Decimal("10"))
+        self.assertEqual(self.balance(user), Decimal("110"))
+        self.assertTrue(Transaction.objects.filter(reference=f"investment:{investment.pk}:payout").exists())
+
+    def test_principal_that_was_never_debited_is_not_paid_back(self):
+        user, _ = self.invest("legacy@example.com", self.auto, "100", principal_debited=False)
+        maturity.settle_due(self.now)
+        self.assertEqual(self.balance(user), Decimal("10"))
+
+    def test_manual_plans_get_their_principal_back_but_not_the_profit(self):
+        user, investment = self.invest("manual@example.com", self.manual, "100")
+        self.assertEqual(maturity.settle_due(self.now).total_paid, Decimal("100"))
+        investment.refresh_from_db()
+        self.assertEqual((investment.is_active, investment.auto_payout_done), (False, False))
+        self.assertEqual(investment.profit_earned, Decimal("10"))
+        self.assertEqual(self.balance(user), Decimal("100"))
+
+    def test_admin_pays_the_profit_of_manual_plans_once(self):
+        user, investment = self.invest("manual-profit@example.com", self.manual, "100")
+        _, running = self.invest("manual-running@example.com", self.manual, "100", hours_left=1)
+        maturity.settle_due(self.now)
+        self.assertEqual(len(maturity.pay_profit([investment.pk, running.pk])), 1)
+        self.assertEqual(maturity.pay_profit([investment.pk]), [])
+        self.assertEqual(self.balance(user), Decimal("110"))
+        investment.refresh_from_db()
+        self.assertTrue(investment.auto_payout_done)
+
+    def test_manual_plans_without_a_debited_principal_pay_nothing(self):
+        user, _ = self.invest("manual-legacy@example.com", self.manual, "100", principal_debited=False)
+        self.assertEqual(maturity.settle_due(self.now).paid, 0)
+        self.assertEqual(self.balance(user), Decimal("0"))
+
+    def test_settles_in_chunks_and_only_once(self):
+        users = [self.invest(f"chunk{i}@example.com", self.auto, "10")[0] for i in range(5)]
+        _, running = self.invest("running@example.com", self.auto, "10", hours_left=1)
+        stats = maturity.settle_due(self.now, chunk_size=2)
+        self.assertEqual((stats.matured, stats.chunks), (5, 3))
+        self.assertEqual(maturity.settle_due(self.now).matured, 0)
+        self.assertEqual([self.balance(u) for u in users], [Decimal("11")] * 5)
+        running.refresh_from_db()
+        self.assertTrue(running.is_active)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PlansPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("investment:investment_plans")
+
+    def test_out_of_range_amounts_are_dropped(self):
+        response = self.client.get(self.url, {"amount": "1e30,NaN,-5,abc,500"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["amounts"], [Decimal("500")])
+
+    def test_cached_per_parsed_amounts(self):
+        self.assertEqual(self.client.get(self.url, {"amount": "500"})["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url, {"amount": "500.00,junk"})["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(self.url, {"amount": "1e30"})["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url, {"amount": "x"})["X-Cache"], "HIT")
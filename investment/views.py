@@ -2,32 +2,60 @@ import logging
 from decimal import Decimal
 from types import SimpleNamespace
 
+from django import forms
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
 
-from .models import InvestmentPlan, InvestmentIntent, UserInvestment
+from crownbridge_project import caching
+from .models import InvestmentIntent, UserInvestment
+from .catalog import get_catalog, get_plan_or_404
+from .projections import quote
 from payment.models import PlatformWallet, DepositAddress, Deposit
+from payment.address_pool import assign_deposit_address
 
 logger = logging.getLogger(__name__)
 
 # Fixed receiver wallet address for testing (per your request)
 TEST_RECEIVER_WALLET = "TBVcbu56fAxhmw8akY8wjsGyad-EL4Stv66"
 
+# example amounts quoted on the plans page
+MAX_QUOTE_AMOUNTS = 10
+QUOTE_AMOUNT_FIELD = forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+
+
+def quote_amounts(request):
+    """The valid amounts of ?amount=100,500, sorted; anything else is dropped."""
+    amounts = []
+    for value in request.GET.get("amount", "").split(","):
+        try:
+            amounts.append(QUOTE_AMOUNT_FIELD.clean(value.strip()).quantize(Decimal("0.01")))
+        except forms.ValidationError:
+            continue
+    return tuple(sorted(set(amounts[:MAX_QUOTE_AMOUNTS])))
+
+
+# keyed on the parsed amounts, so arbitrary query strings share one entry
+@caching.cache_anonymous_page("investment-plans", tags=(caching.PLANS_TAG,), vary_on=quote_amounts)
 def investment_plans_list(request):
     """
-    Public page that shows all available investment plans.
+    Public page that shows all available investment plans, with example
+    returns for ?amount=100,500 (default: each plan's minimum deposit).
     """
-    plans = InvestmentPlan.objects.all().order_by('min_deposit')
-    return render(request, "investment/investment_plans.html", {"plans": plans})
+    plans = get_catalog().plans
+    amounts = sorted(set(quote_amounts(request) or (p.min_deposit for p in plans)))
+    quotes = quote(amounts, plans)
+    # catalog plans are shared across requests, so quotes travel alongside them
+    rows = [(plan, [q for q in quotes[plan.pk] if q.eligible]) for plan in plans]
+    return render(request, "investment/investment_plans.html", {"plans": rows, "amounts": amounts})
 
 
 def invest_now_redirect(request, plan_id):
     """
     If not authenticated send to login with next=invest_page, otherwise to invest_page.
     """
-    plan = get_object_or_404(InvestmentPlan, pk=plan_id)
+    plan = get_plan_or_404(plan_id)
     if not request.user.is_authenticated:
         login_url = f"{reverse('login')}?next={reverse('investment:invest_page', args=[plan.id])}"
         return redirect(login_url)
@@ -40,7 +68,7 @@ def invest_page(request, plan_id):
     Page where the user selects amount and chain. On POST creates an InvestmentIntent
     and redirects to deposit instructions page.
     """
-    plan = get_object_or_404(InvestmentPlan, pk=plan_id)
+    plan = get_plan_or_404(plan_id)
 
     # Build chain options: prefer PlatformWallet objects; fallback to defaults
     pw_qs = PlatformWallet.objects.all()
@@ -84,9 +112,7 @@ def invest_page(request, plan_id):
         # create (or ensure) a DepositAddress row for bookkeeping (we won't rely on it for the fixed test address)
         platform_wallet = PlatformWallet.objects.filter(chain=chain).first()
         if platform_wallet:
-            da, _ = DepositAddress.objects.get_or_create(user=request.user, platform_wallet=platform_wallet)
-            if not da.address:
-                da.generate_address()
+            assign_deposit_address(request.user, platform_wallet)
         # Redirect to a dedicated instructions page that shows the intent
         return redirect('investment:deposit_instructions', intent_id=intent.id)
 
@@ -0,0 +1,207 @@
+# payment/address_index.py
+"""
+In-process index of deposit addresses, one per chain.
+
+The scanner has to decide for every Transfer log whether the recipient is one
+of our deposit addresses. AddressIndex answers that from memory: it loads all
+of the chain's DepositAddress rows in one query and keeps a dict keyed by the
+normalised address, so transfers to anyone else are dropped without touching
+the database. An optional Bloom filter sits in front of the dict as a compact
+pre-check.
+
+Only addresses assigned to a user are indexed; transfers to pooled,
+unassigned addresses are ignored. The index stays current in two ways: DepositAddress saves and deletes in this
+process update it directly (see payment.signals), and refresh() picks up
+rows changed by other processes by polling DepositAddress.updated_at.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import DepositAddress
+
+ADDRESS_INDEX_BLOOM = getattr(settings, "ADDRESS_INDEX_BLOOM", False)
+ADDRESS_INDEX_REFRESH_INTERVAL = getattr(settings, "ADDRESS_INDEX_REFRESH_INTERVAL", 1.0)
+ADDRESS_INDEX_RELOAD_INTERVAL = getattr(settings, "ADDRESS_INDEX_RELOAD_INTERVAL", 3600)
+
+# rows committed slightly out of updated_at order are caught by re-reading this window
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+Owner = namedtuple("Owner", ["deposit_address_id", "user_id", "platform_wallet_id"])
+
+
+def normalize_address(address) -> str:
+    """Hex (EVM) addresses compare case-insensitively; other formats are case-sensitive."""
+    if not address:
+        return ""
+    address = address.strip()
+    if address[:2].lower() == "0x":
+        return address.lower()
+    return address
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class AddressIndex:
+    def __init__(self, chain: str, use_bloom: bool = ADDRESS_INDEX_BLOOM):
+        self.chain = chain
+        self.use_bloom = use_bloom
+        self._owners = {}
+        self._keys = {}  # deposit address id -> key, to drop an address that changed
+        self._bloom = None
+        self._watermark = None
+        self._refreshed_at = 0.0
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._owners)
+
+    def _rows(self, queryset):
+        return (
+            queryset.filter(platform_wallet__chain=self.chain, address__isnull=False, user__isnull=False)
+            .exclude(address="")
+            .values_list("address", "id", "user_id", "platform_wallet_id")
+            .iterator(chunk_size=5000)
+        )
+
+    def _latest_change(self):
+        return DepositAddress.objects.filter(platform_wallet__chain=self.chain).aggregate(m=Max("updated_at"))["m"]
+
+    def _rebuild_bloom(self):
+        if self.use_bloom:
+            self._bloom = BloomFilter(len(self._owners) * 2 + 1024)
+            for key in self._owners:
+                self._bloom.add(key)
+
+    def load(self):
+        """(Re)load every address for the chain in one query."""
+        with self._lock:
+            watermark = self._latest_change()
+            owners = {
+                normalize_address(address): Owner(da_id, user_id, wallet_id)
+                for address, da_id, user_id, wallet_id in self._rows(DepositAddress.objects.all())
+            }
+            self._owners = owners
+            self._keys = {owner.deposit_address_id: key for key, owner in owners.items()}
+            self._watermark = watermark
+            self._rebuild_bloom()
+            self._loaded_at = self._refreshed_at = time.monotonic()
+        return len(owners)
+
+    def refresh(self, force: bool = False):
+        """Pick up DepositAddress rows changed since the last load or refresh; returns how many were seen."""
+        if self._loaded_at is None:
+            return self.load()
+        now = time.monotonic()
+        if now - self._loaded_at >= ADDRESS_INDEX_RELOAD_INTERVAL:
+            # a full reload also drops rows deleted by other processes
+            return self.load()
+        if not force and now - self._refreshed_at < ADDRESS_INDEX_REFRESH_INTERVAL:
+            return 0
+
+        with self._lock:
+            watermark = self._latest_change()
+            changed = DepositAddress.objects.all()
+            if self._watermark is not None:
+                changed = changed.filter(updated_at__gte=self._watermark - REFRESH_OVERLAP)
+            seen = 0
+            for address, da_id, user_id, wallet_id in self._rows(changed):
+                self._put(address, Owner(da_id, user_id, wallet_id))
+                seen += 1
+            if watermark is not None:
+                self._watermark = watermark
+            self._refreshed_at = now
+        return seen
+
+    def _put(self, address, owner):
+        key = normalize_address(address)
+        previous = self._keys.get(owner.deposit_address_id)
+        if previous is not None and previous != key:
+            self._owners.pop(previous, None)
+        if not key:
+            self._keys.pop(owner.deposit_address_id, None)
+            return
+        self._owners[key] = owner
+        self._keys[owner.deposit_address_id] = key
+        if self._bloom is not None:
+            if self._bloom.count >= self._bloom.capacity:
+                self._rebuild_bloom()
+            else:
+                self._bloom.add(key)
+
+    def add(self, deposit_address: DepositAddress):
+        if deposit_address.user_id is None:  # still in the unassigned pool
+            return
+        with self._lock:
+            self._put(deposit_address.address, Owner(deposit_address.pk, deposit_address.user_id, deposit_address.platform_wallet_id))
+
+    def discard(self, deposit_address_id):
+        # the Bloom filter cannot forget; a stale bit only costs a dict miss
+        with self._lock:
+            key = self._keys.pop(deposit_address_id, None)
+            if key is not None:
+                self._owners.pop(key, None)
+
+    def lookup(self, address):
+        """Return the Owner of `address`, or None if it is not one of ours."""
+        key = normalize_address(address)
+        if self._bloom is not None and key not in self._bloom:
+            return None
+        return self._owners.get(key)
+
+    def __contains__(self, address) -> bool:
+        return self.lookup(address) is not None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(chain: str) -> AddressIndex:
+    """Return this process's index for `chain`, loading it on first use."""
+    index = _indexes.get(chain)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(chain)
+            if index is None:
+                index = AddressIndex(chain)
+                index.load()
+                _indexes[chain] = index
+    return index
+
+
+def loaded_index(chain: str):
+    """Return the index for `chain` if this process has loaded one, else None."""
+    return _indexes.get(chain)
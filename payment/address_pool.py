@@ -0,0 +1,150 @@
+# payment/address_pool.py
+"""
+Pre-derived deposit address pool.
+
+Deriving an address from a PlatformWallet.xpub is CPU work that does not
+belong on the request path. fill_pool() (run by the fill_address_pool
+command) keeps DEPOSIT_ADDRESS_POOL_SIZE unassigned DepositAddress rows
+(user is null) ready per wallet, deriving them in batches. Their
+derivation_index values come from a per-wallet Postgres sequence, created
+with the wallet, so concurrent fillers never collide. assign_deposit_address() then hands one
+to a user with a single UPDATE ... FOR UPDATE SKIP LOCKED, and only
+derives inline when the pool has run dry.
+
+Wallets on EVM chains with an xpub get real addresses (payment.hd_wallet).
+Everything else keeps the placeholder addresses used in development.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import hd_wallet
+from .address_index import loaded_index
+from .models import DepositAddress
+
+POOL_SIZE = getattr(settings, "DEPOSIT_ADDRESS_POOL_SIZE", 100)
+EVM_CHAINS = {"ethereum", "bsc", "polygon"}
+
+DEPOSIT_ADDRESS_TABLE = DepositAddress._meta.db_table
+
+# Name Django generated for DepositAddress.Meta.unique_together (user, platform_wallet)
+USER_WALLET_CONSTRAINT = "payment_depositaddress_user_id_platform_wallet_id_78fed12e_uniq"
+UNIQUE_VIOLATION = "23505"
+
+
+def sequence_name(wallet_id) -> str:
+    return f"payment_derivation_seq_{int(wallet_id)}"
+
+
+def create_sequence(wallet):
+    """
+    Create `wallet`'s derivation index sequence, starting after its highest
+    existing index. Called when the wallet is created (payment.signals) and
+    by migration 0017 for older wallets; never on the request path.
+    """
+    start = (DepositAddress.objects.filter(platform_wallet=wallet).aggregate(m=Max("derivation_index"))["m"] or -1) + 1
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence_name(wallet.pk)} MINVALUE 0 START WITH {int(start)}")
+
+
+def drop_sequence(wallet_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_name(wallet_id)}")
+
+
+def allocate_indexes(wallet, count: int):
+    """Reserve `count` derivation indexes for `wallet` in one round trip."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT nextval('{sequence_name(wallet.pk)}') FROM generate_series(1, %s)", [count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _is_user_wallet_conflict(exc: IntegrityError) -> bool:
+    cause = exc.__cause__
+    return (
+        getattr(cause, "pgcode", None) == UNIQUE_VIOLATION
+        and getattr(getattr(cause, "diag", None), "constraint_name", None) == USER_WALLET_CONSTRAINT
+    )
+
+
+def derive_addresses(wallet, indexes):
+    """Return [(index, address)] for `wallet`, skipping the (vanishingly rare) invalid BIP32 children."""
+    indexes = list(indexes)
+    if wallet.xpub and wallet.chain in EVM_CHAINS:
+        try:
+            return hd_wallet.derive_eth_addresses(wallet.xpub, indexes)
+        except ValueError:
+            pairs = []
+            for index in indexes:
+                try:
+                    pairs.extend(hd_wallet.derive_eth_addresses(wallet.xpub, [index]))
+                except ValueError:
+                    continue
+            return pairs
+    return [(index, f"{wallet.chain}_{uuid.uuid4().hex[:20]}") for index in indexes]
+
+
+def spare_count(wallet) -> int:
+    return DepositAddress.objects.filter(platform_wallet=wallet, user__isnull=True).count()
+
+
+def fill_pool(wallet, size: int = None, batch_size: int = 500) -> int:
+    """Top `wallet`'s pool up to `size` unassigned addresses; returns how many were derived."""
+    size = POOL_SIZE if size is None else size
+    missing = size - spare_count(wallet)
+    created = 0
+    while missing > 0:
+        count = min(batch_size, missing)
+        pairs = derive_addresses(wallet, allocate_indexes(wallet, count))
+        DepositAddress.objects.bulk_create([
+            DepositAddress(platform_wallet=wallet, address=address, derivation_index=index)
+            for index, address in pairs
+        ])
+        created += len(pairs)
+        missing -= count
+    return created
+
+
+ASSIGN_SQL = f"""
+    UPDATE {DEPOSIT_ADDRESS_TABLE} SET user_id = %s, updated_at = %s
+    WHERE id = (
+        SELECT id FROM {DEPOSIT_ADDRESS_TABLE}
+        WHERE platform_wallet_id = %s AND user_id IS NULL
+        ORDER BY derivation_index
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+"""
+
+
+def assign_deposit_address(user, wallet) -> DepositAddress:
+    """Return `user`'s deposit address on `wallet`, taking one from the pool the first time."""
+    existing = DepositAddress.objects.filter(user=user, platform_wallet=wallet).first()
+    if existing:
+        if not existing.address:
+            existing.generate_address()
+        return existing
+
+    try:
+        with transaction.atomic():
+            assigned = list(DepositAddress.objects.raw(ASSIGN_SQL, [user.pk, timezone.now(), wallet.pk]))
+            if assigned:
+                da = assigned[0]
+            else:
+                # pool ran dry: derive this one inline
+                da = DepositAddress.objects.create(user=user, platform_wallet=wallet)
+                da.generate_address()
+    except IntegrityError as exc:
+        if not _is_user_wallet_conflict(exc):
+            raise
+        # a concurrent request already gave this user an address on this wallet
+        return DepositAddress.objects.get(user=user, platform_wallet=wallet)
+
+    index = loaded_index(wallet.chain)
+    if index is not None:
+        transaction.on_commit(lambda: index.add(da))
+    return da
@@ -1,32 +1,33 @@
 from django.contrib import admin
 from .models import WithdrawalRequest, Transaction, UserBalance, PlatformWallet, Deposit, DepositAddress
-from django.utils import timezone
 from django.contrib import messages
+from . import approvals, payouts
 
 # Register your models here.
 
-@admin.action(description="Approve selected withdrawals (debit user and mark processing)")
+@admin.action(description="Approve selected withdrawals (debit user and mark approved)")
 def approve_withdrawals(modeladmin, request, queryset):
-    for w in queryset.filter(status='pending'):
-        try:
-            ub = UserBalance.objects.get(user=w.user)
-            # Check balance
-            if ub.balance < w.amount:
-                messages.error(request, f"User {w.user} has insufficient balance for withdrawal {w.id}")
-                continue
-            # Debit user's balance immediately (ledger)
-            ub.debit(w.amount, note=f"Withdrawal approved {w.id}", reference=str(w.id))
-            w.status = 'approved'
-            w.processed_at = timezone.now()
-            w.admin_note = (w.admin_note or "") + f"\nApproved by {request.user} at {w.processed_at}"
-            w.save()
-            messages.info(request, f"Approved withdrawal {w.id}")
-            # NOTE: Signing and broadcasting tx must happen in a secure worker / custody provider
-        except Exception as e:
-            messages.error(request, f"Error approving {w.id}: {e}")
+    # NOTE: Signing and broadcasting tx happens in the payout engine (payment.payouts)
+    result = approvals.approve_withdrawals(queryset.values_list("pk", flat=True), approved_by=request.user)
+    approvals.report_approval(request, result)
+
+@admin.action(description="Refund selected failed withdrawals")
+def refund_withdrawals(modeladmin, request, queryset):
+    # only failed, not yet refunded rows are credited back
+    entries = payouts.refund(queryset.values_list("pk", flat=True))
+    messages.info(request, f"Refunded {len(entries)} withdrawals")
 
 @admin.register(WithdrawalRequest)
 class WithdrawalRequestAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'amount', 'to_address', 'chain', 'status', 'requested_at', 'processed_at')
-    actions = [approve_withdrawals]
+    list_display = ('id', 'user', 'amount', 'to_address', 'chain', 'status', 'refunded', 'requested_at', 'processed_at')
+    actions = [approve_withdrawals, refund_withdrawals]
+    # status only changes through payment.withdrawal_states transitions
+    readonly_fields = ('status', 'version', 'tx_hash', 'nonce', 'processed_at')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # write only the edited fields so a stale form cannot undo a concurrent transition
+            obj.save(update_fields=form.changed_data)
+        else:
+            super().save_model(request, obj, form, change)
 
@@ -0,0 +1,113 @@
+# payment/approvals.py
+"""
+Set-based approval of pending withdrawals.
+
+approve_withdrawals() approves any number of pending withdrawals in one
+transaction. It locks the rows and checks that each still has the version
+it was read with, so a request another staff member approved or declined
+in the meantime is reported instead of debited twice. Every debit then
+goes through ledger.post_batch: one bulk Transaction INSERT and one
+balance UPDATE for all users, with each user's balance locked once and
+checked against their running total. Only the funded rows then flip from
+pending to approved, with one compare-and-set UPDATE
+(payment.withdrawal_states).
+
+Each user's withdrawals are debited oldest first. A withdrawal the user's
+running balance cannot cover is rejected and reported per row, and the
+user's later (smaller) withdrawals are still tried. Nothing is partially
+applied: a withdrawal is either debited and approved, or left pending with
+a Rejection explaining why.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.contrib import messages
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger, withdrawal_states
+from .models import WithdrawalRequest
+
+Rejection = namedtuple("Rejection", ["withdrawal_id", "user_id", "amount", "reason"])
+ApprovalResult = namedtuple("ApprovalResult", ["approved", "rejected"])
+
+MAX_REJECTION_MESSAGES = 20
+
+
+@ledger.retry_on_conflict
+def approve_withdrawals(withdrawal_ids, approved_by=None) -> ApprovalResult:
+    """
+    Debit and approve the pending withdrawals in `withdrawal_ids`; returns the
+    approved WithdrawalRequest rows and a Rejection for every other id.
+    """
+    ids = list(dict.fromkeys(withdrawal_ids))
+    now = timezone.now()
+    rejected = []
+
+    withdrawals = list(
+        WithdrawalRequest.objects.filter(pk__in=ids, status="pending")
+        .order_by("user_id", "requested_at", "id")
+        .only("id", "user_id", "amount", "status", "version")
+    )
+    found = {w.pk for w in withdrawals}
+    rejected += [Rejection(pk, None, None, "not pending") for pk in ids if pk not in found]
+
+    payable = []
+    for w in withdrawals:
+        if w.amount is None or w.amount <= Decimal("0"):
+            rejected.append(Rejection(w.pk, w.user_id, w.amount, "invalid amount"))
+        else:
+            payable.append(w)
+
+    with transaction.atomic():
+        # lock the rows so the transition below cannot lose after the debits are posted
+        current = dict(
+            WithdrawalRequest.objects.filter(pk__in=[w.pk for w in payable], status="pending")
+            .select_for_update()
+            .order_by("pk")
+            .values_list("pk", "version")
+        )
+        claimed = []
+        for w in payable:
+            if current.get(w.pk) == w.version:
+                claimed.append(w)
+            else:
+                rejected.append(Rejection(w.pk, w.user_id, w.amount, "changed by another request"))
+
+        result = ledger.post_batch(
+            [
+                ledger.LedgerEntry(w.user_id, w.amount, "debit", note=f"Withdrawal approved {w.id}", reference=str(w.id))
+                for w in claimed
+            ],
+            partial=True,
+        )
+        short = {e.reference for e in result.rejected}
+        approved = []
+        for w in claimed:
+            if str(w.pk) in short:
+                rejected.append(Rejection(w.pk, w.user_id, w.amount, "insufficient balance"))
+            else:
+                approved.append(w)
+
+        # only funded rows change; unfunded ones stay pending at the version they were read with
+        note = f"\nApproved by {approved_by} at {now}"
+        won = withdrawal_states.transition_many(
+            [(w.pk, w.version) for w in approved], "pending", "approved",
+            assignments=["processed_at = %s", "admin_note = COALESCE(w.admin_note, '') || %s"], params=[now, note],
+        )
+        if len(won) != len(approved):
+            raise RuntimeError("locked withdrawals changed during approval")
+        for w in approved:
+            w.status, w.version, w.processed_at = "approved", w.version + 1, now
+
+    return ApprovalResult(approved, rejected)
+
+
+def report_approval(request, result):
+    """Flash an approval summary and the first rejections."""
+    if result.approved:
+        messages.info(request, f"Approved {len(result.approved)} withdrawals")
+    for r in result.rejected[:MAX_REJECTION_MESSAGES]:
+        messages.error(request, f"Withdrawal {r.withdrawal_id} not approved: {r.reason}")
+    if len(result.rejected) > MAX_REJECTION_MESSAGES:
+        messages.error(request, f"... and {len(result.rejected) - MAX_REJECTION_MESSAGES} more not approved")
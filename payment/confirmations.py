@@ -0,0 +1,107 @@
+# payment/confirmations.py
+"""
+Set-based deposit confirmation pipeline.
+
+confirm_chunk() claims up to `chunk_size` pending deposits with SELECT ...
+FOR UPDATE SKIP LOCKED, so any number of worker processes can run it side by
+side without waiting on, or double-processing, each other's rows. In one
+transaction it then:
+
+- marks the whole chunk confirmed and credited with one UPDATE;
+- credits every deposit through ledger.post_batch;
+- adds the chunk to the daily deposit rollups;
+- activates the matching investment intents in bulk
+  (investment.activation), debits their principal and queues the
+  referral bonuses they earn (investment.referral_bonuses).
+
+The queryset UPDATE bypasses Deposit's post_save signal, so
+credit_on_confirm cannot credit the same deposits a second time.
+
+Only deposits found on chain (block_number set) are claimable, and only
+once the depth tracker (payment.depth_tracker) has recorded that they
+reached the chain's required number of confirmations. The "intent_..."
+rows that the deposit pages create carry no block. Crediting them would
+credit the transfer a second time when the scanner (payment.scanner)
+inserts the real deposit.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from investment import referral_bonuses
+from investment.activation import activate_intents, principal_entries
+from . import ledger, rollups
+from .models import Deposit
+
+ChunkResult = namedtuple("ChunkResult", ["deposits", "investments", "bonuses"])
+PipelineStats = namedtuple("PipelineStats", ["deposits", "investments", "bonuses", "chunks", "elapsed"])
+
+REQUIRED_CONFIRMATIONS = 12
+DEPOSIT_CONFIRMATIONS = getattr(settings, "DEPOSIT_CONFIRMATIONS", {"ethereum": 12, "bsc": 15, "polygon": 64})
+
+
+def required_confirmations(chain: str) -> int:
+    return DEPOSIT_CONFIRMATIONS.get(chain, REQUIRED_CONFIRMATIONS)
+
+
+def claimable():
+    # the tracker only writes `confirmations` once a deposit is deep enough
+    return Deposit.objects.filter(
+        status="pending", credited=False, amount__gt=0, block_number__isnull=False, confirmations__gt=0
+    )
+
+
+@ledger.retry_on_conflict
+def confirm_chunk(chunk_size: int = 500, eligible: Q = None, confirmations: int = REQUIRED_CONFIRMATIONS) -> ChunkResult:
+    """Claim, confirm and credit one chunk of pending deposits; returns what was done."""
+    with transaction.atomic():
+        queryset = claimable()
+        if eligible is not None:
+            queryset = queryset.filter(eligible)
+        deposits = list(
+            queryset.select_for_update(skip_locked=True, of=("self",))
+            .order_by("created_at", "id")
+            .select_related("platform_wallet")
+            .only("id", "user_id", "amount", "tx_hash", "platform_wallet__chain")[:chunk_size]
+        )
+        if not deposits:
+            return ChunkResult(0, 0, 0)
+
+        Deposit.objects.filter(pk__in=[d.pk for d in deposits]).update(
+            status="confirmed",
+            credited=True,
+            confirmations=Greatest(F("confirmations"), confirmations),
+            updated_at=timezone.now(),
+        )
+
+        investments = activate_intents(deposits)
+        entries = [
+            ledger.LedgerEntry(d.user_id, d.amount, "credit", note=f"Deposit {d.tx_hash}", reference=d.tx_hash)
+            for d in deposits
+        ]
+        # each principal debit follows the deposit credit that funds it
+        ledger.post_batch(entries + principal_entries(investments))
+        bonuses = referral_bonuses.enqueue(investments)
+        rollups.record((d.user_id, "deposit", d.amount) for d in deposits)
+
+    return ChunkResult(len(deposits), len(investments), bonuses)
+
+
+def run(chunk_size: int = 500, max_chunks: int = None, eligible: Q = None) -> PipelineStats:
+    """Confirm chunks until nothing claimable is left (or `max_chunks` is reached)."""
+    started = time.perf_counter()
+    deposits = investments = bonuses = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        result = confirm_chunk(chunk_size, eligible=eligible)
+        if not result.deposits:
+            break
+        deposits += result.deposits
+        investments += result.investments
+        bonuses += result.bonuses
+        chunks += 1
+    return PipelineStats(deposits, investments, bonuses, chunks, time.perf_counter() - started)
@@ -0,0 +1,179 @@
+# payment/depth_tracker.py
+"""
+Incremental confirmation-depth tracking for on-chain deposits.
+
+DepthTracker follows one chain's head. It fetches the headers of new blocks
+in one batch call and keeps a ring buffer of the most recent block hashes.
+Pending deposits wait in a min-heap keyed by their inclusion block. Each
+time the head advances, every deposit at the top of the heap that is now
+deep enough (head - block_number + 1 >= the chain's required confirmations)
+is promoted with one bulk UPDATE of Deposit.confirmations. The confirmation
+pipeline then confirms and credits them. The cost of a new block therefore
+depends on how many deposits just crossed the threshold, not on how many are
+pending.
+
+A header whose parentHash does not match the previous block's hash in the
+ring is a reorg. The tracker walks back through the ring to the fork point,
+deletes the pending (uncredited) deposits recorded in orphaned blocks, and
+rewinds the scanner's ChainCheckpoint so the new canonical blocks are
+scanned again. A deposit whose block_hash differs from the canonical hash
+when it is promoted is treated the same way.
+"""
+import heapq
+import logging
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import confirmations
+from .models import ChainCheckpoint, Deposit
+from .services import get_blocks, rpc_call
+
+logger = logging.getLogger(__name__)
+
+RING_SIZE = 128
+NEW_DEPOSIT_OVERLAP = timedelta(seconds=5)
+
+TrackStats = namedtuple("TrackStats", ["head", "new_blocks", "promoted", "reverted", "reorgs", "pending"])
+
+
+class DepthTracker:
+    def __init__(self, chain, required=None, ring_size=RING_SIZE, confirm=True, max_headers=1000):
+        self.chain = chain
+        self.required = required or confirmations.required_confirmations(chain)
+        self.ring = deque(maxlen=ring_size)  # (number, hash), oldest first
+        self.confirm = confirm
+        self.max_headers = max_headers
+        self.head = None
+        self._heap = []  # (block_number, deposit id, block hash)
+        self._known = set()
+        self._seen_until = None
+
+    # -- pending deposits --------------------------------------------------
+    def _pending(self):
+        return Deposit.objects.filter(
+            platform_wallet__chain=self.chain, status="pending", credited=False,
+            block_number__isnull=False, confirmations=0,
+        )
+
+    def load_pending(self):
+        """Push deposits the heap has not seen yet; a full load the first time."""
+        pending = self._pending()
+        if self._seen_until is not None:
+            pending = pending.filter(created_at__gte=self._seen_until - NEW_DEPOSIT_OVERLAP)
+        now = timezone.now()
+        added = 0
+        for pk, number, block_hash in pending.values_list("id", "block_number", "block_hash").iterator(chunk_size=5000):
+            pk = str(pk)
+            if pk in self._known:
+                continue
+            self._known.add(pk)
+            heapq.heappush(self._heap, (number, pk, block_hash))
+            added += 1
+        self._seen_until = now
+        return added
+
+    def __len__(self):
+        return len(self._heap)
+
+    # -- headers -----------------------------------------------------------
+    def _hash_at(self, number):
+        if self.ring and self.ring[0][0] <= number <= self.ring[-1][0]:
+            return self.ring[number - self.ring[0][0]][1]
+        return None
+
+    def _fork_point(self):
+        """Walk the ring back to the newest block whose hash is still canonical; return the first orphaned number."""
+        numbers = [number for number, _ in reversed(self.ring)]
+        canonical = {int(b["number"], 16): b["hash"] for b in get_blocks(self.chain, numbers) if b}
+        for number, block_hash in reversed(self.ring):
+            if canonical.get(number) == block_hash:
+                return number + 1
+        return self.ring[0][0]
+
+    def _rewind(self, fork):
+        while self.ring and self.ring[-1][0] >= fork:
+            self.ring.pop()
+        reverted = self.revert_from(fork)
+        self.head = fork - 1
+        return reverted
+
+    def revert_from(self, fork, ids=None):
+        """Drop pending deposits in orphaned blocks (>= `fork`, or just `ids`) and rewind the scanner."""
+        orphaned = Deposit.objects.filter(platform_wallet__chain=self.chain, credited=False, status="pending")
+        orphaned = orphaned.filter(pk__in=ids) if ids is not None else orphaned.filter(block_number__gte=fork)
+        reverted = orphaned.delete()[0]
+        credited = Deposit.objects.filter(platform_wallet__chain=self.chain, credited=True, block_number__gte=fork)
+        if ids is None and credited.exists():
+            logger.error("%s: reorg from block %s orphans %s credited deposits", self.chain, fork, credited.count())
+        ChainCheckpoint.objects.filter(chain=self.chain, last_block__gte=fork).update(last_block=fork - 1)
+        if ids is None:
+            self._heap = [entry for entry in self._heap if entry[0] < fork]
+            heapq.heapify(self._heap)
+            self._known = {pk for _, pk, _ in self._heap}
+        return reverted
+
+    def advance(self, head):
+        """Fetch headers up to `head`, handling reorgs; returns (new blocks, reverted, reorgs)."""
+        start = self.head + 1 if self.head is not None else head - self.ring.maxlen + 1
+        start = max(start, head - self.max_headers + 1)
+        new_blocks = reverted = reorgs = 0
+        while start <= head:
+            fork = None
+            for header in get_blocks(self.chain, range(start, head + 1)):
+                if header is None:  # the node has not caught up with the head it reported
+                    return new_blocks, reverted, reorgs
+                number = int(header["number"], 16)
+                if self.ring and self.ring[-1][0] != number - 1:
+                    self.ring.clear()  # fell too far behind to check parents across the gap
+                if self.ring and header["parentHash"] != self.ring[-1][1]:
+                    fork = self._fork_point()
+                    break
+                self.ring.append((number, header["hash"]))
+                self.head = number
+                new_blocks += 1
+            if fork is None:
+                break
+            logger.warning("%s: reorg detected, rewinding to block %s", self.chain, fork - 1)
+            reverted += self._rewind(fork)
+            reorgs += 1
+            start = fork
+        return new_blocks, reverted, reorgs
+
+    # -- promotion ---------------------------------------------------------
+    def promote(self):
+        """Bulk-promote every pending deposit that reached the required depth; returns (promoted, reverted)."""
+        if self.head is None:
+            return 0, 0
+        threshold = self.head - self.required + 1
+        ready, stale = [], []
+        while self._heap and self._heap[0][0] <= threshold:
+            number, pk, block_hash = heapq.heappop(self._heap)
+            self._known.discard(pk)
+            canonical = self._hash_at(number)
+            if canonical is not None and block_hash and canonical != block_hash:
+                stale.append((number, pk))  # recorded from a block that is no longer canonical
+            else:
+                ready.append(pk)
+
+        reverted = 0
+        if stale:
+            reverted = self.revert_from(min(number for number, _ in stale), ids=[pk for _, pk in stale])
+        promoted = 0
+        if ready:
+            promoted = Deposit.objects.filter(pk__in=ready, status="pending", confirmations=0).update(
+                confirmations=self.head + 1 - F("block_number"), updated_at=timezone.now()
+            )
+            if self.confirm:
+                confirmations.run(eligible=Q(pk__in=ready))
+        return promoted, reverted
+
+    def poll(self):
+        """Catch up with the chain head once; returns TrackStats."""
+        head = int(rpc_call(self.chain, "eth_blockNumber"), 16)
+        new_blocks, reverted, reorgs = self.advance(head)
+        self.load_pending()
+        promoted, stale = self.promote()
+        return TrackStats(self.head, new_blocks, promoted, reverted + stale, reorgs, len(self._heap))
@@ -1,6 +1,7 @@
 from django import forms
 from decimal import Decimal
 from .models import PlatformWallet
+from .payouts import valid_address
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -11,6 +12,14 @@ class WithdrawalRequestForm(forms.Form):
     to_address = forms.CharField(max_length=128)
     chain = forms.ChoiceField(choices=[('ethereum', 'Ethereum'), ('bsc', 'BSC')])
 
+    def clean(self):
+        cleaned = super().clean()
+        chain, to_address = cleaned.get("chain"), cleaned.get("to_address")
+        # payouts are only checked after approval has debited the balance, so catch typos here
+        if chain and to_address and not valid_address(chain, to_address):
+            self.add_error("to_address", f"Enter a valid {chain} address.")
+        return cleaned
+
 class DepositForm(forms.Form):
     amount = forms.DecimalField(max_digits=32, decimal_places=8, min_value=Decimal('0.000001'))
     chain = forms.ChoiceField(choices=PlatformWallet.CHAIN_CHOICES)
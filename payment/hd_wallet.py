@@ -1,21 +1,52 @@
-# # payments/hd_wallet.py
-# # WARNING: this is an example. Use well-tested libraries in production.
-# from hdwallet import HDWallet
-# from hdwallet.symbols import ETH as ETH_SYMBOL
-# from typing import Tuple
-
-# def derive_eth_address_from_xpub(xpub: str, index: int) -> Tuple[str, int]:
-#     """
-#     Derive an Ethereum address from an XPUB and index.
-#     Requires the 'hdwallet' library (pip install hdwallet).
-#     Returns checksum address.
-#     """
-#     hdwallet = HDWallet(symbol=ETH_SYMBOL)
-#     # set the extended public key
-#     hdwallet.from_xpub(xpub=xpub)
-#     # derive child - use BIP44 change 0 : path m/44'/60'/0'/0/index
-#     path = f"m/44'/60'/0'/0/{index}"
-#     child = hdwallet.from_path(path)
-#     address = child.p2pkh_address()  # for eth, hdwallet library exposes address
-#     # depending on library you may need to convert / checksum
-#     return address, index
+# payments/hd_wallet.py
+"""
+Watch-only BIP32 derivation of deposit addresses from a PlatformWallet.xpub.
+
+Only public derivation (CKDpub) is done here: the xpub is expected at the
+account level (e.g. m/44'/60'/0'), and deposit addresses are its children
+<branch>/<index>. The branch node is derived once per xpub and cached.
+
+The key derivation and the EIP-55 address encoding come from bip_utils
+(secp256k1 through coincurve, Keccak-256 through pycryptodome), pinned in
+requirements.txt.
+"""
+from functools import lru_cache
+from typing import Tuple
+
+from bip_utils import Base58ChecksumError, Bip32KeyError, Bip32Secp256k1, EthAddrEncoder
+
+HARDENED = 0x80000000
+
+
+def _child(node, index: int):
+    if index >= HARDENED:
+        raise ValueError("Hardened children cannot be derived from a public key")
+    try:
+        return node.ChildKey(index)
+    except Bip32KeyError as exc:  # the (vanishingly rare) invalid child
+        raise ValueError(f"Child {index} is invalid; use the next index") from exc
+
+
+@lru_cache(maxsize=64)
+def branch_node(xpub: str, branch: int = 0) -> Bip32Secp256k1:
+    """The parsed xpub's `branch` child (0 = receiving addresses), cached per process."""
+    try:
+        account = Bip32Secp256k1.FromExtendedKey(xpub.strip())
+    except (Base58ChecksumError, Bip32KeyError, ValueError) as exc:
+        raise ValueError(f"Invalid extended public key: {exc}") from exc
+    return _child(account, branch)
+
+
+def derive_eth_addresses(xpub: str, indexes, branch: int = 0):
+    """Return [(index, checksum address)] for `indexes` under xpub/<branch>."""
+    node = branch_node(xpub, branch)
+    return [(index, EthAddrEncoder.EncodeKey(_child(node, index).PublicKey().KeyObject())) for index in indexes]
+
+
+def derive_eth_address_from_xpub(xpub: str, index: int) -> Tuple[str, int]:
+    """
+    Derive an Ethereum address from an account-level XPUB and index
+    (path <xpub>/0/<index>). Returns (checksum address, index).
+    """
+    ((index, address),) = derive_eth_addresses(xpub, [index])
+    return address, index
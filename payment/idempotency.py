@@ -0,0 +1,138 @@
+# payment/idempotency.py
+"""
+Idempotency keys for money-moving POST endpoints.
+
+A client sends a key with a POST (the Idempotency-Key header, or the
+`idempotency_key` form field that the payment forms render from
+`request.idempotency_key`). The first request with a given (user, key) runs
+the view and its response is stored; retries get the stored response back
+without running the view again, and a retry that arrives while the first
+request is still running waits for it to finish. An in-progress claim older
+than IDEMPOTENCY_CLAIM_LEASE seconds is taken to belong to a worker that
+died, and the next retry takes it over and runs the view. Keys expire after
+IDEMPOTENCY_KEY_TTL seconds and are removed by purge_idempotency_keys.
+"""
+import functools
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_TTL = getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+WAIT_TIMEOUT = getattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 10)
+CLAIM_LEASE = getattr(settings, "IDEMPOTENCY_CLAIM_LEASE", 3 * WAIT_TIMEOUT)
+POLL_INTERVAL = 0.1
+
+
+def _request_key(request):
+    key = request.headers.get("Idempotency-Key") or request.POST.get("idempotency_key")
+    return key.strip()[:128] if key else None
+
+
+def _claim(user, key, path):
+    """Create the in-progress row for (user, key); return it, or None if it already exists."""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, path=path, expires_at=timezone.now() + timedelta(seconds=KEY_TTL)
+            )
+    except IntegrityError:
+        return None
+
+
+def _take_over(record):
+    """Re-claim an abandoned in-progress row; return it, or None if another retry got there first."""
+    now = timezone.now()
+    taken = IdempotencyKey.objects.filter(
+        pk=record.pk, status="in_progress", claimed_at=record.claimed_at
+    ).update(claimed_at=now, expires_at=now + timedelta(seconds=KEY_TTL))
+    if not taken:
+        return None
+    record.claimed_at = now
+    return record
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.response_body), status=record.response_status)
+    if record.response_location:
+        response["Location"] = record.response_location
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Run `view` at most once per (user, idempotency key) and replay its response to retries."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # fresh key for whichever form the view renders next
+        request.idempotency_key = uuid.uuid4().hex
+        if request.method != "POST":
+            return view(request, *args, **kwargs)
+
+        key = _request_key(request)
+        if not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            claimed = _claim(request.user, key, request.path)
+            if claimed:
+                break
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at <= timezone.now():
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+                continue
+            if record.path != request.path:
+                return HttpResponse("Idempotency key was already used for another endpoint.", status=422)
+            if record.status == "completed":
+                return _replay(record)
+            if record.claimed_at <= timezone.now() - timedelta(seconds=CLAIM_LEASE):
+                claimed = _take_over(record)
+                if claimed:
+                    break
+                continue
+            if time.monotonic() >= deadline:
+                return HttpResponse("A request with this idempotency key is still being processed.", status=409)
+            time.sleep(POLL_INTERVAL)
+
+        # only touch the row while this run still holds the claim
+        ours = IdempotencyKey.objects.filter(pk=claimed.pk, claimed_at=claimed.claimed_at)
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            # let the client retry a request that blew up
+            ours.delete()
+            raise
+
+        if response.streaming:
+            ours.delete()
+            return response
+        ours.update(
+            status="completed",
+            response_status=response.status_code,
+            response_body=response.content,
+            response_location=response.get("Location", ""),
+        )
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size: int = 10000):
+    """Delete expired keys in batches; returns the number removed."""
+    removed = 0
+    now = timezone.now()
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
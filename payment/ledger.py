@@ -0,0 +1,281 @@
+# payment/ledger.py
+"""
+Ledger posting API.
+
+Every balance change is applied as one conditional UPDATE (an upsert for
+credits) on the user's balance row, and the matching Transaction row is
+written by the same SQL statement through a data-modifying CTE, together
+with the user's daily rollup (see payment.rollups). Concurrent
+postings therefore never lose updates, credits never wait on a SELECT ... FOR
+UPDATE, and a debit can never take a balance below zero because the funds
+check lives in the UPDATE's WHERE clause.
+
+Batches of entries go through post_batch(), which writes all Transaction rows
+with one bulk INSERT and moves every affected balance with one UPDATE. Whenever
+more than one balance row is locked, rows are locked in user id order so
+concurrent postings cannot deadlock each other.
+"""
+import functools
+import logging
+import random
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction, OperationalError
+from django.utils import timezone
+
+from .models import P2PTransfer, UserBalance, Transaction
+from .summary import invalidate_balance_summary
+from . import rollups
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientBalance(ValueError):
+    """Raised when a debit would take a balance below zero."""
+
+    def __init__(self, message="Insufficient balance"):
+        super().__init__(message)
+
+
+_BALANCE_TABLE = UserBalance._meta.db_table
+_TRANSACTION_TABLE = Transaction._meta.db_table
+
+_INSERT_TRANSACTION = f"""
+    roll AS (
+        INSERT INTO {rollups.ROLLUP_TABLE} (user_id, day, kind, count, total, updated_at)
+        SELECT %(user_id)s, %(day)s, %(kind)s, 1, %(amount)s, %(now)s FROM bal
+        {rollups.UPSERT_CONFLICT_SQL}
+    ),
+    ins AS (
+        INSERT INTO {_TRANSACTION_TABLE} (id, user_id, amount, kind, note, reference, created_at)
+        SELECT %(id)s, %(user_id)s, %(amount)s, %(kind)s, %(note)s, %(reference)s, %(now)s FROM bal
+        RETURNING id
+    )
+    SELECT bal.balance FROM bal, ins
+"""
+
+CREDIT_SQL = f"""
+    WITH bal AS (
+        INSERT INTO {_BALANCE_TABLE} (user_id, balance, updated_at)
+        VALUES (%(user_id)s, %(amount)s, %(now)s)
+        ON CONFLICT (user_id) DO UPDATE
+            SET balance = {_BALANCE_TABLE}.balance + EXCLUDED.balance,
+                updated_at = EXCLUDED.updated_at
+        RETURNING balance
+    ),
+""" + _INSERT_TRANSACTION
+
+DEBIT_SQL = f"""
+    WITH bal AS (
+        UPDATE {_BALANCE_TABLE}
+            SET balance = balance - %(amount)s, updated_at = %(now)s
+        WHERE user_id = %(user_id)s AND balance >= %(amount)s
+        RETURNING balance
+    ),
+""" + _INSERT_TRANSACTION
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def post(user, amount, kind: str, note: str = "", reference: str = None) -> Decimal:
+    """
+    Post a single ledger entry for `user` (a user instance or id) and return
+    the new balance. Credits upsert the balance row; debits raise
+    InsufficientBalance when the balance does not cover `amount`.
+    """
+    amount = Decimal(amount)
+    if amount <= Decimal("0"):
+        raise ValueError("Ledger amount must be positive")
+    if kind not in ("credit", "debit"):
+        raise ValueError(f"Unknown ledger entry kind {kind!r}")
+
+    params = {
+        "id": uuid.uuid4(),
+        "user_id": _user_id(user),
+        "amount": amount,
+        "kind": kind,
+        "note": note,
+        "reference": reference,
+        "now": timezone.now(),
+        "day": timezone.localdate(),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(CREDIT_SQL if kind == "credit" else DEBIT_SQL, params)
+        row = cursor.fetchone()
+
+    if row is None:
+        raise InsufficientBalance()
+    invalidate_balance_summary(params["user_id"])
+    return row[0]
+
+
+def post_credit(user, amount, note: str = "", reference: str = None) -> Decimal:
+    return post(user, amount, "credit", note=note, reference=reference)
+
+
+def post_debit(user, amount, note: str = "", reference: str = None) -> Decimal:
+    return post(user, amount, "debit", note=note, reference=reference)
+
+
+LedgerEntry = namedtuple("LedgerEntry", ["user", "amount", "kind", "note", "reference"], defaults=["", None])
+BatchResult = namedtuple("BatchResult", ["posted", "rejected"])
+
+
+def post_batch(entries, partial: bool = False, batch_size: int = 1000) -> BatchResult:
+    """
+    Post many LedgerEntry rows in one database transaction.
+
+    Entries are applied per user in the order given: a debit that the user's
+    running balance cannot cover makes the whole batch fail with
+    InsufficientBalance, or, with `partial=True`, is left out and reported in
+    `BatchResult.rejected` while the remaining entries are posted. The
+    Transaction rows are bulk inserted and every affected balance is moved by
+    its net amount in one UPDATE ... FROM (VALUES ...).
+    """
+    entries = [
+        LedgerEntry(_user_id(e.user), Decimal(e.amount), e.kind, e.note, e.reference)
+        for e in entries
+    ]
+    for e in entries:
+        if e.amount <= Decimal("0"):
+            raise ValueError("Ledger amount must be positive")
+        if e.kind not in ("credit", "debit"):
+            raise ValueError(f"Unknown ledger entry kind {e.kind!r}")
+    if not entries:
+        return BatchResult([], [])
+
+    user_ids = sorted({e.user for e in entries})
+    now = timezone.now()
+
+    with transaction.atomic():
+        UserBalance.objects.bulk_create(
+            [UserBalance(user_id=uid) for uid in user_ids], ignore_conflicts=True, batch_size=batch_size
+        )
+        opening = dict(
+            UserBalance.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .order_by("user_id")
+            .values_list("user_id", "balance")
+        )
+
+        running = dict(opening)
+        posted, rejected = [], []
+        for e in entries:
+            if e.kind == "debit" and running[e.user] < e.amount:
+                if not partial:
+                    raise InsufficientBalance(f"Insufficient balance for user {e.user}")
+                rejected.append(e)
+                continue
+            running[e.user] += e.amount if e.kind == "credit" else -e.amount
+            posted.append(e)
+
+        Transaction.objects.bulk_create(
+            [
+                Transaction(user_id=e.user, amount=e.amount, kind=e.kind, note=e.note, reference=e.reference)
+                for e in posted
+            ],
+            batch_size=batch_size,
+        )
+        nets = [(uid, running[uid] - opening[uid]) for uid in user_ids if running[uid] != opening[uid]]
+        with connection.cursor() as cursor:
+            for i in range(0, len(nets), batch_size):
+                chunk = nets[i:i + batch_size]
+                cursor.execute(
+                    f"UPDATE {_BALANCE_TABLE} AS b SET balance = b.balance + v.net, updated_at = %s "
+                    f"FROM (VALUES {', '.join(['(%s, %s::numeric)'] * len(chunk))}) AS v(user_id, net) "
+                    f"WHERE b.user_id = v.user_id",
+                    [now] + [value for row in chunk for value in row],
+                )
+        rollups.record((e.user, e.kind, e.amount) for e in posted)
+        invalidate_balance_summary(*user_ids)
+
+    return BatchResult(posted, rejected)
+
+
+# Postgres SQLSTATEs worth retrying: serialization_failure, deadlock_detected
+RETRYABLE_PGCODES = {"40001", "40P01"}
+
+
+def is_retryable_conflict(exc: Exception) -> bool:
+    return getattr(exc.__cause__, "pgcode", None) in RETRYABLE_PGCODES
+
+
+def retry_on_conflict(func=None, *, attempts: int = 5, base_delay: float = 0.01, max_delay: float = 0.5):
+    """
+    Retry `func` with jittered exponential backoff when Postgres aborts it
+    with a serialization failure or deadlock. Only the outermost atomic block
+    can be retried, so nothing is retried when called inside one.
+    """
+    if func is None:
+        return functools.partial(retry_on_conflict, attempts=attempts, base_delay=base_delay, max_delay=max_delay)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == attempts or connection.in_atomic_block or not is_retryable_conflict(e):
+                    raise
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                logger.info("Retrying %s after %s (attempt %s)", func.__name__, e.__cause__.pgcode, attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+
+    return wrapper
+
+
+@retry_on_conflict
+def transfer(sender, recipient, amount, note: str = "Transfer", received_note: str = None):
+    """
+    Move `amount` from sender to recipient and return both UserBalance rows.
+
+    Both balance rows are created if missing (INSERT ... ON CONFLICT DO
+    NOTHING, so this cannot race with itself) and then locked together by a
+    single SELECT ... FOR UPDATE ordered by user id.
+    """
+    sender_id, recipient_id = _user_id(sender), _user_id(recipient)
+    amount = Decimal(amount)
+
+    if sender_id == recipient_id:
+        raise ValueError("Cannot transfer to self")
+    if amount <= Decimal("0"):
+        raise ValueError("Transfer amount must be positive")
+
+    with transaction.atomic():
+        UserBalance.objects.bulk_create(
+            [UserBalance(user_id=sender_id), UserBalance(user_id=recipient_id)], ignore_conflicts=True
+        )
+        balances = {
+            b.user_id: b
+            for b in UserBalance.objects.select_for_update().filter(user_id__in=[sender_id, recipient_id]).order_by("user_id")
+        }
+        sender_balance, receiver_balance = balances[sender_id], balances[recipient_id]
+
+        if sender_balance.balance < amount:
+            raise InsufficientBalance()
+
+        Transaction.objects.bulk_create([
+            Transaction(user_id=sender_id, amount=amount, kind="debit", note=note),
+            Transaction(user_id=recipient_id, amount=amount, kind="credit", note=received_note or note),
+        ])
+        sender_balance.balance -= amount
+        receiver_balance.balance += amount
+        sender_balance.save(update_fields=["balance", "updated_at"])
+        receiver_balance.save(update_fields=["balance", "updated_at"])
+        rollups.record([(sender_id, "debit", amount), (recipient_id, "credit", amount)])
+        invalidate_balance_summary(sender_id, recipient_id)
+
+    return sender_balance, receiver_balance
+
+
+@retry_on_conflict
+def p2p_transfer(sender, recipient, amount, note: str = "Transfer", received_note: str = None) -> P2PTransfer:
+    """Transfer like transfer() and record the P2PTransfer in the same transaction, retried as one unit."""
+    with transaction.atomic():
+        transfer(sender, recipient, amount, note=note, received_note=received_note)
+        return P2PTransfer.objects.create(sender_id=_user_id(sender), receiver_id=_user_id(recipient), amount=amount)
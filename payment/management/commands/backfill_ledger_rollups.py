@@ -0,0 +1,18 @@
+# payment/management/commands/backfill_ledger_rollups.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from payment.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily ledger rollups from transactions, deposits and withdrawals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD); default all history')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = backfill(since=options['since'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows"))
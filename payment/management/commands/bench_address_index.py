@@ -0,0 +1,60 @@
+# payment/management/commands/bench_address_index.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Lower
+
+from payment.address_index import AddressIndex
+from payment.mock_chain import MockChain
+from payment.models import DepositAddress
+from payment.scanner import topic_to_address
+
+
+class Command(BaseCommand):
+    help = "Compare per-log DB lookups of deposit addresses with the in-memory address index (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chain', default='ethereum')
+        parser.add_argument('--blocks', type=int, default=250)
+        parser.add_argument('--logs-per-block', type=int, default=200)
+        parser.add_argument('--deposit-share', type=float, default=0.01)
+
+    def timed(self, label, n, fn):
+        started = time.perf_counter()
+        matched = fn()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {label:<32} {elapsed:7.3f}s  {n / elapsed:10.0f} logs/sec  {matched} matched")
+        return elapsed
+
+    def handle(self, *args, **options):
+        chain_name = options['chain']
+        addresses = list(
+            DepositAddress.objects.filter(platform_wallet__chain=chain_name, address__startswith='0x')
+            .values_list('address', flat=True)
+        )
+        chain = MockChain(logs_per_block=options['logs_per_block'], deposit_addresses=addresses,
+                          deposit_share=options['deposit_share'])
+        recipients = [
+            topic_to_address(log["topics"][2])
+            for number in range(chain.start_block, chain.start_block + options['blocks'])
+            for log in chain.logs_for_block(number)
+        ]
+        n = len(recipients)
+        self.stdout.write(f"{n} Transfer logs against {len(addresses)} deposit addresses on {chain_name}")
+
+        def per_log_query():
+            qs = DepositAddress.objects.annotate(addr=Lower("address")).filter(platform_wallet__chain=chain_name)
+            return sum(1 for r in recipients if qs.filter(addr=r).values_list("id", "user_id").first())
+
+        def with_index(use_bloom):
+            index = AddressIndex(chain_name, use_bloom=use_bloom)
+            started = time.perf_counter()
+            index.load()
+            self.stdout.write(f"  load ({'bloom' if use_bloom else 'dict'}): {time.perf_counter() - started:.3f}s")
+            lookup = index.lookup
+            return lambda: sum(1 for r in recipients if lookup(r) is not None)
+
+        old = self.timed("one query per log", n, per_log_query)
+        new = self.timed("index (dict)", n, with_index(False))
+        bloom = self.timed("index (bloom + dict)", n, with_index(True))
+        self.stdout.write(f"speedup: {old / new:.0f}x dict, {old / bloom:.0f}x bloom")
@@ -0,0 +1,111 @@
+# payment/management/commands/bench_confirm_deposits.py
+import multiprocessing
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from investment import referral_bonuses
+from investment.models import InvestmentIntent, InvestmentPlan, UserInvestment
+from payment import confirmations
+from payment.models import Deposit, Transaction
+from users import referrals
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-confirm-"
+
+
+def legacy_confirm(deposits):
+    """The old one-row-at-a-time loop, kept here for comparison only."""
+    for d in deposits:
+        d.status = "confirmed"
+        d.confirmations = 12
+        d.save(update_fields=["status", "confirmations", "updated_at"])
+        amount = d.amount.quantize(Decimal('0.01'))
+        intent = InvestmentIntent.objects.filter(user=d.user, amount=amount, completed=False).first()
+        if intent:
+            UserInvestment.objects.create(
+                user=d.user, plan=intent.plan, amount_invested=amount, profit_earned=0,
+                start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=intent.plan.duration_hours),
+                is_active=True,
+            )
+            intent.completed = True
+            intent.deposit_tx = d.tx_hash
+            intent.save(update_fields=["completed", "deposit_tx"])
+
+
+def run_worker(chunk_size):
+    confirmations.run(chunk_size=chunk_size, eligible=confirmations.Q(user__email__startswith=BENCH_PREFIX))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Confirm a batch of synthetic deposits row by row or with the parallel pipeline and report throughput (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--deposits', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--legacy', action='store_true', help='Use the old row-at-a-time loop')
+
+    def setup(self, n_users, n_deposits):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BC{uuid.uuid4().hex[:10]}")
+            for i in range(n_users)
+        ])
+        # a quarter of the users were referred by user 1
+        User.objects.filter(pk__in=[u.pk for u in users[::4]]).update(referred_by=users[1])
+        referrals.rebuild()  # the queryset update skips the signal that maintains the closure table
+        plan = InvestmentPlan.objects.order_by("min_deposit").first()
+        Deposit.objects.bulk_create([
+            Deposit(
+                user=users[i % n_users], tx_hash=f"0x{uuid.uuid4().hex}", amount=Decimal(100 + i % 7), status="pending",
+                block_number=i, confirmations=confirmations.REQUIRED_CONFIRMATIONS,
+            )
+            for i in range(n_deposits)
+        ], batch_size=2000)
+        # one open intent per user for half the users
+        InvestmentIntent.objects.bulk_create([
+            InvestmentIntent(user=u, plan=plan, amount=Decimal(100 + i % 7)) for i, u in enumerate(users[::2])
+        ])
+        return users
+
+    def handle(self, *args, **options):
+        users = self.setup(options['users'], options['deposits'])
+        ids = [u.pk for u in users]
+        started = time.perf_counter()
+
+        if options['legacy']:
+            legacy_confirm(list(Deposit.objects.filter(user_id__in=ids, status="pending").select_related("user")))
+        else:
+            # separate processes, as with several mock_confirm_deposits runs; forked children must not share our connection
+            connections.close_all()
+            ctx = multiprocessing.get_context("fork")
+            procs = [ctx.Process(target=run_worker, args=(options['chunk_size'],)) for _ in range(options['workers'])]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+        elapsed = time.perf_counter() - started
+        referral_bonuses.drain()
+
+        confirmed = Deposit.objects.filter(user_id__in=ids, status="confirmed").count()
+        deposited = Deposit.objects.filter(user_id__in=ids).aggregate(s=Sum("amount"))["s"]
+        credited = Transaction.objects.filter(user_id__in=ids, note__startswith="Deposit ").aggregate(s=Sum("amount"))["s"]
+        activated = UserInvestment.objects.filter(user_id__in=ids).count()
+        bonuses = Transaction.objects.filter(user_id=ids[1], note__startswith="Referral bonus").count()
+        self.stdout.write(
+            f"{'legacy' if options['legacy'] else str(options['workers']) + ' workers'}: "
+            f"{confirmed} deposits in {elapsed:.2f}s ({confirmed / elapsed:.0f}/sec); "
+            f"deposited {deposited}, credited {credited}; {activated} investments, {bonuses} referral bonuses"
+        )
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
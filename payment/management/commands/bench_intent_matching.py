@@ -0,0 +1,88 @@
+# payment/management/commands/bench_intent_matching.py
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from investment.matching import complete_intents, match_intents
+from investment.models import InvestmentIntent, InvestmentPlan
+from payment.models import Deposit, PlatformWallet
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-intent-"
+CHAINS = ("ethereum", "bsc")
+
+
+class Command(BaseCommand):
+    help = "Match a batch of deposits against many open investment intents, per row or with the matching engine (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--intents', type=int, default=100000, help='Open intents to create')
+        parser.add_argument('--deposits', type=int, default=500, help='Deposits in the matched batch')
+
+    def setup(self, options):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BI{uuid.uuid4().hex[:10]}")
+            for i in range(options['users'])
+        ], batch_size=5000)
+        plan = InvestmentPlan.objects.order_by("min_deposit").first()
+        rng = random.Random(7)
+        InvestmentIntent.objects.bulk_create([
+            InvestmentIntent(user=rng.choice(users), plan=plan, chain=rng.choice(CHAINS), amount=Decimal(rng.randint(100, 120)))
+            for _ in range(options['intents'])
+        ], batch_size=5000)
+        wallets = {chain: PlatformWallet.objects.create(name=f"{BENCH_PREFIX}{chain}", chain=chain) for chain in CHAINS}
+        deposits = [
+            Deposit(
+                id=uuid.uuid4(), user_id=rng.choice(users).pk, platform_wallet=wallets[rng.choice(CHAINS)],
+                tx_hash=f"0x{uuid.uuid4().hex}", amount=Decimal(rng.randint(100, 120)),
+            )
+            for _ in range(options['deposits'])
+        ]
+        return deposits, wallets
+
+    def legacy(self, deposits):
+        matched = 0
+        for d in deposits:
+            intent = InvestmentIntent.objects.filter(user_id=d.user_id, amount=d.amount.quantize(Decimal('0.01')), completed=False).first()
+            if intent:
+                intent.completed = True
+                intent.deposit_tx = d.tx_hash
+                intent.save(update_fields=["completed", "deposit_tx"])
+                matched += 1
+        return matched
+
+    def engine(self, deposits):
+        pairs = match_intents(deposits)
+        complete_intents(pairs)
+        return len(pairs)
+
+    def timed(self, label, fn, deposits):
+        with transaction.atomic():
+            started = time.perf_counter()
+            matched = fn(deposits)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.stdout.write(f"  {label:<28} {elapsed:7.3f}s  {len(deposits) / elapsed:8.0f} deposits/sec  {matched} matched")
+        return elapsed
+
+    def handle(self, *args, **options):
+        deposits, wallets = self.setup(options)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {InvestmentIntent._meta.db_table}")
+        self.stdout.write(f"{len(deposits)} deposits against {options['intents']} open intents")
+        try:
+            old = self.timed("query per deposit", self.legacy, deposits)
+            new = self.timed("batched hash join", self.engine, deposits)
+            self.stdout.write(f"speedup: {old / new:.1f}x")
+        finally:
+            User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+            for wallet in wallets.values():
+                wallet.delete()
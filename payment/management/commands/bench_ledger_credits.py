@@ -0,0 +1,85 @@
+# payment/management/commands/bench_ledger_credits.py
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from payment.ledger import post_credit
+from payment.models import UserBalance, Transaction
+
+User = get_user_model()
+
+BENCH_EMAIL = "bench-hot-account@crownbridge.local"
+
+
+def legacy_credit(user_id, amount, note):
+    """The old read-modify-write credit path, kept here for comparison only."""
+    ub = UserBalance.objects.get(user_id=user_id)
+    Transaction.objects.create(user_id=user_id, amount=amount, kind='credit', note=note)
+    ub.balance = ub.balance + amount
+    ub.save(update_fields=['balance', 'updated_at'])
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent credits against a single hot account (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=32, help='Parallel writer threads')
+        parser.add_argument('--credits', type=int, default=200, help='Credits posted by each writer')
+        parser.add_argument('--amount', default='1.00', help='Amount of each credit')
+        parser.add_argument('--legacy', action='store_true', help='Use the old read-modify-write path instead')
+
+    def handle(self, *args, **options):
+        writers = options['writers']
+        per_writer = options['credits']
+        amount = Decimal(options['amount'])
+        credit = legacy_credit if options['legacy'] else post_credit
+
+        User.objects.filter(email=BENCH_EMAIL).delete()
+        user = User.objects.create_user(email=BENCH_EMAIL, password=None)
+        UserBalance.objects.get_or_create(user=user)
+
+        barrier = threading.Barrier(writers + 1)
+        errors = []
+
+        def writer():
+            try:
+                barrier.wait()
+                for _ in range(per_writer):
+                    credit(user.pk, amount, "bench credit")
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        posted = writers * per_writer
+        expected = amount * posted
+        actual = UserBalance.objects.get(user=user).balance
+        rows = Transaction.objects.filter(user=user).count()
+        User.objects.filter(pk=user.pk).delete()
+
+        mode = "legacy read-modify-write" if options['legacy'] else "ledger posting"
+        self.stdout.write(f"Mode:            {mode}")
+        self.stdout.write(f"Writers:         {writers}")
+        self.stdout.write(f"Credits posted:  {posted} in {elapsed:.2f}s")
+        self.stdout.write(f"Throughput:      {posted / elapsed:.0f} credits/sec")
+        self.stdout.write(f"Transaction rows: {rows}")
+        self.stdout.write(f"Expected balance: {expected}  actual: {actual}")
+        if errors:
+            self.stdout.write(self.style.ERROR(f"{len(errors)} writers failed, first error: {errors[0]}"))
+        if actual != expected:
+            self.stdout.write(self.style.ERROR(f"Lost updates: {(expected - actual) / amount:.0f} credits"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No lost updates"))
@@ -0,0 +1,101 @@
+# payment/management/commands/bench_payouts.py
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from payment import payouts
+from payment.models import WithdrawalRequest
+from payment.rollups import record_withdrawals_sent
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-payout-"
+CHAINS = ["ethereum", "bsc", "polygon"]
+
+
+def legacy_send(withdrawals):
+    """The old one-row-at-a-time loop, kept here for comparison only."""
+    for w in withdrawals:
+        w.status = "sent"
+        w.tx_hash = f"MOCKTX_{w.id.hex[:12]}"
+        w.processed_at = timezone.now()
+        w.save(update_fields=["status", "tx_hash", "processed_at"])
+        record_withdrawals_sent([w])
+
+
+def run_worker(batch_size, latency):
+    payouts.run(batch_size=batch_size, sender=payouts.FakeChainSender(latency=latency))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Send a queue of synthetic approved withdrawals row by row or with parallel payout workers (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--withdrawals', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.0, help='Fake sender seconds per batch')
+        parser.add_argument('--legacy', action='store_true', help='Use the old row-at-a-time loop')
+
+    def setup(self, n_users, n_withdrawals):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BP{uuid.uuid4().hex[:10]}")
+            for i in range(n_users)
+        ])
+        now = timezone.now()
+        WithdrawalRequest.objects.bulk_create([
+            WithdrawalRequest(
+                user=users[i % n_users], amount=Decimal(10 + i % 5), chain=CHAINS[i % len(CHAINS)],
+                # every 100th address is malformed so the failure path is exercised too
+                to_address="0xnot-an-address" if i % 100 == 99 else f"0x{uuid.uuid4().hex}{i:08x}",
+                status="approved", processed_at=now,
+            )
+            for i in range(n_withdrawals)
+        ], batch_size=2000)
+        return users
+
+    def handle(self, *args, **options):
+        users = self.setup(options['users'], options['withdrawals'])
+        ids = [u.pk for u in users]
+        started = time.perf_counter()
+
+        if options['legacy']:
+            legacy_send(list(WithdrawalRequest.objects.filter(user_id__in=ids, status="approved")))
+        else:
+            connections.close_all()
+            ctx = multiprocessing.get_context("fork")
+            procs = [
+                ctx.Process(target=run_worker, args=(options['batch_size'], options['latency']))
+                for _ in range(options['workers'])
+            ]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+        elapsed = time.perf_counter() - started
+
+        statuses = Counter(dict(
+            WithdrawalRequest.objects.filter(user_id__in=ids).values_list("status").annotate(n=Count("id"))
+        ))
+        done = statuses["sent"] + statuses["failed"]
+        duplicate_nonces = (
+            WithdrawalRequest.objects.filter(user_id__in=ids, nonce__isnull=False)
+            .values("chain", "nonce").annotate(n=Count("id")).filter(n__gt=1).count()
+        )
+        self.stdout.write(
+            f"{'legacy' if options['legacy'] else str(options['workers']) + ' workers'}: "
+            f"{done} payouts in {elapsed:.2f}s ({done / elapsed:.0f}/sec); "
+            f"{dict(statuses)}; {duplicate_nonces} duplicate nonces"
+        )
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,71 @@
+# payment/management/commands/bench_rpc.py
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from payment import services
+from payment.mock_chain import MockChain, serve_in_thread
+
+CHAIN = "ethereum"
+
+
+def unpooled_call(url, method, params):
+    """One request per call on a fresh connection, as a new Web3(HTTPProvider) per call does."""
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    return requests.post(url, json=payload, timeout=services.RPC_TIMEOUT).json()["result"]
+
+
+class Command(BaseCommand):
+    help = "Compare per-call RPC clients with the pooled, batched client against a local mock node (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=1000, help='Calls per pattern')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def timed(self, label, calls, fn):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {label:<44} {elapsed:7.3f}s  {calls / elapsed:9.0f} calls/sec")
+        return elapsed
+
+    def handle(self, *args, **options):
+        n = options['calls']
+        chain = MockChain(head=1_000_000 + n)
+        server, url = serve_in_thread(chain)
+        services.RPC_URLS[CHAIN] = url
+        services.USDT_CONTRACTS[CHAIN] = chain.token
+        services._token_metadata.clear()
+
+        tx_hashes = [f"0x{i:064x}" for i in range(n)]
+        numbers = [chain.start_block + i for i in range(n)]
+        addresses = [f"0x{i:040x}" for i in range(n)]
+        decimals_call = [{"to": chain.token, "data": services.DECIMALS_SELECTOR}, "latest"]
+
+        try:
+            self.stdout.write("eth_getTransactionReceipt")
+            old = self.timed("new client per call", n, lambda: [unpooled_call(url, "eth_getTransactionReceipt", [h]) for h in tx_hashes])
+            pooled = self.timed("keep-alive session, one call per request", n, lambda: [services.rpc_call(CHAIN, "eth_getTransactionReceipt", [h]) for h in tx_hashes])
+            new = self.timed(f"keep-alive session, batches of {options['batch_size']}", n, lambda: services.rpc_batch(CHAIN, (("eth_getTransactionReceipt", [h]) for h in tx_hashes), options['batch_size']))
+            self.stdout.write(f"  speedup: {old / pooled:.1f}x pooled, {old / new:.1f}x batched")
+
+            self.stdout.write("eth_getBlockByNumber")
+            old = self.timed("new client per call", n, lambda: [unpooled_call(url, "eth_getBlockByNumber", [hex(b), False]) for b in numbers])
+            new = self.timed("get_blocks (batched)", n, lambda: services.get_blocks(CHAIN, numbers))
+            self.stdout.write(f"  speedup: {old / new:.1f}x")
+
+            self.stdout.write("balanceOf")
+            old = self.timed("new client per call", n, lambda: [
+                unpooled_call(url, "eth_call", [{"to": chain.token, "data": services.BALANCE_OF_SELECTOR + "0" * 24 + a[2:]}, "latest"])
+                for a in addresses
+            ])
+            new = self.timed("get_token_balances (batched)", n, lambda: services.get_token_balances(CHAIN, addresses))
+            self.stdout.write(f"  speedup: {old / new:.1f}x")
+
+            self.stdout.write("token decimals")
+            old = self.timed("eth_call per lookup", n, lambda: [unpooled_call(url, "eth_call", decimals_call) for _ in range(n)])
+            new = self.timed("get_token_decimals (cached)", n, lambda: [services.get_token_decimals(CHAIN) for _ in range(n)])
+            self.stdout.write(f"  speedup: {old / new:.1f}x")
+        finally:
+            server.shutdown()
@@ -0,0 +1,110 @@
+# payment/management/commands/bench_transfers.py
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, OperationalError
+
+from payment import ledger
+from payment.models import UserBalance, Transaction
+
+User = get_user_model()
+
+BENCH_EMAILS = ("bench-transfer-a@crownbridge.local", "bench-transfer-b@crownbridge.local")
+
+
+def legacy_transfer(sender_id, recipient_id, amount, note):
+    """The old lock order (sender first, then receiver), kept here for comparison only."""
+    with transaction.atomic():
+        sender_balance = UserBalance.objects.select_for_update().get(user_id=sender_id)
+        receiver_balance = UserBalance.objects.select_for_update().get(user_id=recipient_id)
+        if sender_balance.balance < amount:
+            raise ValueError("Insufficient balance")
+        Transaction.objects.create(user_id=sender_id, amount=amount, kind='debit', note=note)
+        sender_balance.balance -= amount
+        sender_balance.save(update_fields=['balance', 'updated_at'])
+        Transaction.objects.create(user_id=recipient_id, amount=amount, kind='credit', note=note)
+        receiver_balance.balance += amount
+        receiver_balance.save(update_fields=['balance', 'updated_at'])
+
+
+class Command(BaseCommand):
+    help = "Stress A->B and B->A transfers concurrently and report throughput and abort rate (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Parallel workers (half send each way)')
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers issued by each worker')
+        parser.add_argument('--legacy', action='store_true', help='Use the old sender-then-receiver lock order')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        per_worker = options['transfers']
+        amount = Decimal('1.00')
+        once = legacy_transfer if options['legacy'] else ledger.transfer.__wrapped__
+        max_attempts = 1 if options['legacy'] else 5
+
+        User.objects.filter(email__in=BENCH_EMAILS).delete()
+        users = [User.objects.create_user(email=email, password=None) for email in BENCH_EMAILS]
+        opening = amount * per_worker * workers
+        for u in users:
+            UserBalance.objects.update_or_create(user=u, defaults={'balance': opening})
+
+        lock = threading.Lock()
+        stats = {'attempts': 0, 'aborts': 0, 'failed': 0}
+        barrier = threading.Barrier(workers + 1)
+
+        def worker(sender, recipient):
+            attempts = aborts = failed = 0
+            try:
+                barrier.wait()
+                for _ in range(per_worker):
+                    for attempt in range(1, max_attempts + 1):
+                        attempts += 1
+                        try:
+                            once(sender.pk, recipient.pk, amount, "bench transfer")
+                            break
+                        except OperationalError as e:
+                            if not ledger.is_retryable_conflict(e):
+                                raise
+                            aborts += 1
+                            if attempt == max_attempts:
+                                failed += 1
+                            else:
+                                time.sleep(0.01 * 2 ** (attempt - 1))
+            finally:
+                connection.close()
+                with lock:
+                    stats['attempts'] += attempts
+                    stats['aborts'] += aborts
+                    stats['failed'] += failed
+
+        threads = [
+            threading.Thread(target=worker, args=(users[i % 2], users[(i + 1) % 2]))
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        completed = workers * per_worker - stats['failed']
+        total = sum(UserBalance.objects.filter(user__in=users).values_list('balance', flat=True))
+        User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+        mode = "legacy lock order" if options['legacy'] else "ordered locks with retry"
+        self.stdout.write(f"Mode:          {mode}")
+        self.stdout.write(f"Workers:       {workers} ({workers // 2 + workers % 2} A->B, {workers // 2} B->A)")
+        self.stdout.write(f"Completed:     {completed} transfers in {elapsed:.2f}s")
+        self.stdout.write(f"Throughput:    {completed / elapsed:.0f} transfers/sec")
+        self.stdout.write(f"Abort rate:    {stats['aborts'] / max(stats['attempts'], 1):.2%} "
+                          f"({stats['aborts']} of {stats['attempts']} attempts)")
+        self.stdout.write(f"Failed:        {stats['failed']}")
+        if total != opening * 2:
+            self.stdout.write(self.style.ERROR(f"Money not conserved: {total} != {opening * 2}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Money conserved"))
@@ -0,0 +1,87 @@
+# payment/management/commands/bench_withdrawal_approval.py
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from payment import ledger
+from payment.approvals import approve_withdrawals
+from payment.models import Transaction, UserBalance, WithdrawalRequest
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench-approve-"
+
+
+def legacy_approve(withdrawals):
+    """The old one-row-at-a-time admin action, kept here for comparison only."""
+    approved = 0
+    for w in withdrawals:
+        try:
+            ub = UserBalance.objects.get(user=w.user)
+            if ub.balance < w.amount:
+                continue
+            ub.debit(w.amount, note=f"Withdrawal approved {w.id}", reference=str(w.id))
+            w.status = 'approved'
+            w.processed_at = timezone.now()
+            w.admin_note = (w.admin_note or "") + f"\nApproved by bench at {w.processed_at}"
+            w.save()
+            approved += 1
+        except Exception:
+            pass
+    return approved
+
+
+class Command(BaseCommand):
+    help = "Approve a backlog of synthetic withdrawals row by row or in bulk and report throughput (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--withdrawals', type=int, default=5000)
+        parser.add_argument('--legacy', action='store_true', help='Use the old row-at-a-time admin action')
+
+    def setup(self, n_users, n_withdrawals):
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
+        users = User.objects.bulk_create([
+            User(email=f"{BENCH_PREFIX}{i}@crownbridge.local", referral_code=f"BA{uuid.uuid4().hex[:10]}")
+            for i in range(n_users)
+        ])
+        # each user asks for about 10 x 25 = 250; every 10th user only holds 100
+        ledger.post_batch([
+            ledger.LedgerEntry(u.pk, Decimal(100 if i % 10 == 0 else 1000), "credit", note="bench funding")
+            for i, u in enumerate(users)
+        ])
+        WithdrawalRequest.objects.bulk_create([
+            WithdrawalRequest(user=users[i % n_users], amount=Decimal(25), chain="ethereum",
+                              to_address=f"0x{uuid.uuid4().hex}{i:08x}", status="pending")
+            for i in range(n_withdrawals)
+        ], batch_size=2000)
+        return users
+
+    def handle(self, *args, **options):
+        users = self.setup(options['users'], options['withdrawals'])
+        ids = [u.pk for u in users]
+        pending = WithdrawalRequest.objects.filter(user_id__in=ids, status="pending").order_by("requested_at")
+        started = time.perf_counter()
+
+        if options['legacy']:
+            approved = legacy_approve(list(pending.select_related("user")))
+            rejected = options['withdrawals'] - approved
+        else:
+            result = approve_withdrawals(list(pending.values_list("pk", flat=True)), approved_by="bench")
+            approved, rejected = len(result.approved), len(result.rejected)
+        elapsed = time.perf_counter() - started
+
+        debited = Transaction.objects.filter(user_id__in=ids, kind="debit").aggregate(s=Sum("amount"))["s"]
+        approved_total = WithdrawalRequest.objects.filter(user_id__in=ids, status="approved").aggregate(s=Sum("amount"))["s"]
+        negative = UserBalance.objects.filter(user_id__in=ids, balance__lt=0).count()
+        self.stdout.write(
+            f"{'legacy' if options['legacy'] else 'bulk'}: {approved} approved, {rejected} rejected in {elapsed:.2f}s "
+            f"({options['withdrawals'] / elapsed:.0f}/sec); debited {debited}, approved total {approved_total}, "
+            f"{negative} negative balances"
+        )
+        User.objects.filter(email__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,39 @@
+# payment/management/commands/export_statement.py
+import sys
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.statements import STATEMENT_FORMATS, period_bounds, statement_rows, render_statement
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream a user's account statement as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='email', required=True, help='User email')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--format', choices=STATEMENT_FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per cursor round trip')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"User missing: {options['email']}")
+
+        start, end = period_bounds(options['start'], options['end'])
+        rows = statement_rows(user, start, end, chunk_size=options['chunk_size'])
+
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            for chunk in render_statement(rows, options['format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,34 @@
+# payment/management/commands/fill_address_pool.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.address_pool import POOL_SIZE, fill_pool
+from payment.models import PlatformWallet
+
+
+class Command(BaseCommand):
+    help = "Keep a pool of pre-derived, unassigned deposit addresses ready for every platform wallet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=POOL_SIZE, help='Unassigned addresses to keep per wallet')
+        parser.add_argument('--chain', help='Only fill wallets on this chain')
+        parser.add_argument('--batch-size', type=int, default=500, help='Addresses derived per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep topping the pools up')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        wallets = PlatformWallet.objects.all()
+        if options['chain']:
+            wallets = wallets.filter(chain=options['chain'])
+
+        while True:
+            for wallet in wallets:
+                started = time.perf_counter()
+                created = fill_pool(wallet, size=options['size'], batch_size=options['batch_size'])
+                if created:
+                    elapsed = max(time.perf_counter() - started, 1e-9)
+                    self.stdout.write(f"{wallet}: derived {created} addresses in {elapsed:.2f}s ({created / elapsed:.0f}/sec)")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
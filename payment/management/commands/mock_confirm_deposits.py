@@ -1,46 +1,29 @@
 # payment/management/commands/mock_confirm_deposits.py
+import time
+
 from django.core.management.base import BaseCommand
-from payment.models import Deposit
-from django.utils import timezone
-from decimal import Decimal
-from django.db import transaction
-from payment.models import UserBalance
-from investment.models import InvestmentIntent, UserInvestment
-from datetime import timedelta
 
-class Command(BaseCommand):
-    help = "Mock confirm pending deposits created via invest flow and activate investments."
+from payment import confirmations
 
-    def handle(self, *args, **options):
-        pending = Deposit.objects.filter(status="pending")
-        for d in pending:
-            # mark deposit confirmed
-            d.status = "confirmed"
-            d.confirmations = 12
-            d.save(update_fields=["status", "confirmations", "updated_at"])
-            print(f"Confirmed deposit tx {d.tx_hash} for user {d.user}")
 
-            # credit user balance
-            ub, _ = UserBalance.objects.get_or_create(user=d.user)
-            # Ensure amount as Decimal (Deposit.amount might have many decimals); convert down to 8 decimals
-            amount = d.amount.quantize(Decimal('0.01')) if d.amount is not None else Decimal('0.00')
-            ub.credit(amount, note=f"Deposit {d.tx_hash}", reference=d.tx_hash)
+class Command(BaseCommand):
+    help = "Confirm pending on-chain deposits that reached their depth in chunks, credit them and activate matching investments. Safe to run several at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Deposits claimed per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new pending deposits')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when nothing is pending')
 
-            # Find matching InvestmentIntent (by amount and user) and activate
-            intent = InvestmentIntent.objects.filter(user=d.user, amount=amount, completed=False).first()
-            if intent:
-                # Create a UserInvestment record
-                end_time = timezone.now() + timedelta(hours=intent.plan.duration_hours)
-                ui = UserInvestment.objects.create(
-                    user=d.user,
-                    plan=intent.plan,
-                    amount_invested=amount,
-                    profit_earned=0,
-                    start_time=timezone.now(),
-                    end_time=end_time,
-                    is_active=True
+    def handle(self, *args, **options):
+        while True:
+            stats = confirmations.run(chunk_size=options['chunk_size'])
+            if stats.deposits:
+                elapsed = max(stats.elapsed, 1e-9)
+                self.stdout.write(
+                    f"Confirmed {stats.deposits} deposits in {stats.chunks} chunks / {stats.elapsed:.2f}s "
+                    f"({stats.deposits / elapsed:.0f}/sec), activated {stats.investments} investments, "
+                    f"queued {stats.bonuses} referral bonuses"
                 )
-                intent.completed = True
-                intent.deposit_tx = d.tx_hash
-                intent.save(update_fields=["completed", "deposit_tx"])
-                print(f"Activated investment {ui.id} for user {d.user}")
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,41 @@
+# payment/management/commands/mock_rpc_node.py
+from django.core.management.base import BaseCommand
+
+from payment.mock_chain import MockChain, serve
+from payment.models import DepositAddress
+
+
+class Command(BaseCommand):
+    help = "Run a local JSON-RPC stand-in node with synthetic USDT Transfer logs (dev only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8545)
+        parser.add_argument('--chain', default='ethereum', help='Pay deposits to this chain\'s deposit addresses')
+        parser.add_argument('--start-block', type=int, default=1_000_000)
+        parser.add_argument('--blocks', type=int, default=10_000, help='Blocks already mined at start')
+        parser.add_argument('--block-time', type=float, default=12.0, help='Seconds per new block (0 to stay still)')
+        parser.add_argument('--logs-per-block', type=int, default=20)
+        parser.add_argument('--deposit-share', type=float, default=0.05, help='Share of transfers paid to deposit addresses')
+
+    def handle(self, *args, **options):
+        addresses = list(
+            DepositAddress.objects.filter(platform_wallet__chain=options['chain'], address__startswith='0x')
+            .values_list('address', flat=True)
+        )
+        chain = MockChain(
+            start_block=options['start_block'],
+            head=options['start_block'] + options['blocks'],
+            logs_per_block=options['logs_per_block'],
+            deposit_addresses=addresses,
+            deposit_share=options['deposit_share'],
+            block_time=options['block_time'] or None,
+        )
+        server = serve(chain, port=options['port'])
+        self.stdout.write(
+            f"Mock node on http://127.0.0.1:{options['port']} head={chain.head} token={chain.token} "
+            f"paying {len(addresses)} deposit addresses"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
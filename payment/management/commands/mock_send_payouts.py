@@ -1,17 +1,29 @@
 # payment/management/commands/mock_send_payouts.py
+import time
+
 from django.core.management.base import BaseCommand
-from payment.models import WithdrawalRequest
-from django.utils import timezone
+
+from payment import payouts
+
 
 class Command(BaseCommand):
-    help = "Mock sending payouts for approved withdrawals."
+    help = "Send approved withdrawals in batches through the configured payout sender. Safe to run several at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Withdrawals claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for newly approved withdrawals')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when nothing is approved')
 
-    def handle(self, *args, **kwargs):
-        approved = WithdrawalRequest.objects.filter(status="approved")
-        for w in approved:
-            # simulate sending: set status to 'sent' and tx_hash
-            w.status = "sent"
-            w.tx_hash = f"MOCKTX_{w.id.hex[:12]}"
-            w.processed_at = timezone.now()
-            w.save(update_fields=["status", "tx_hash", "processed_at"])
-            self.stdout.write(self.style.SUCCESS(f"Sent payout for {w.id} tx {w.tx_hash}"))
+    def handle(self, *args, **options):
+        sender = payouts.get_sender()
+        while True:
+            stats = payouts.run(batch_size=options['batch_size'], sender=sender)
+            if stats.batches:
+                elapsed = max(stats.elapsed, 1e-9)
+                self.stdout.write(
+                    f"Sent {stats.sent} payouts ({stats.failed} failed) in {stats.batches} batches / "
+                    f"{stats.elapsed:.2f}s ({(stats.sent + stats.failed) / elapsed:.0f}/sec)"
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,15 @@
+# payment/management/commands/purge_idempotency_keys.py
+from django.core.management.base import BaseCommand
+
+from payment.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        removed = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {removed} expired idempotency keys"))
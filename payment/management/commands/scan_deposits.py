@@ -0,0 +1,47 @@
+# payment/management/commands/scan_deposits.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment import services
+from payment.scanner import DepositScanner
+
+
+class Command(BaseCommand):
+    help = "Scan a chain's USDT Transfer logs for payments to deposit addresses and record pending deposits."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chain', default='ethereum')
+        parser.add_argument('--rpc-url', help='Override the RPC URL configured for the chain')
+        parser.add_argument('--token', help='Override the token contract configured for the chain')
+        parser.add_argument('--from-block', type=int, help='First block to scan when no checkpoint exists yet')
+        parser.add_argument('--batch-blocks', type=int, default=100, help='Initial blocks per eth_getLogs call')
+        parser.add_argument('--lag', type=int, default=0, help='Stay this many blocks behind the head')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait once caught up')
+        parser.add_argument('--once', action='store_true', help='Exit after catching up with the head')
+
+    def handle(self, *args, **options):
+        chain = options['chain']
+        if options['rpc_url']:
+            services.RPC_URLS[chain] = options['rpc_url']
+
+        scanner = DepositScanner(
+            chain,
+            token=options['token'],
+            batch_blocks=options['batch_blocks'],
+            lag=options['lag'],
+            start_block=options['from_block'],
+        )
+        while True:
+            stats = scanner.scan()
+            if stats.blocks:
+                elapsed = max(stats.elapsed, 1e-9)
+                self.stdout.write(
+                    f"[{chain}] {stats.blocks} blocks, {stats.logs} logs, {stats.deposits} matched transfers "
+                    f"in {stats.batches} batches / {stats.elapsed:.2f}s: "
+                    f"{stats.blocks / elapsed:.0f} blocks/sec, {stats.logs / elapsed:.0f} logs/sec "
+                    f"(range now {scanner.batch_blocks} blocks)"
+                )
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,38 @@
+# payment/management/commands/track_confirmations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment import services
+from payment.depth_tracker import DepthTracker
+
+
+class Command(BaseCommand):
+    help = "Follow a chain's new blocks, promote deposits that reach the required depth and revert reorged ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chain', default='ethereum')
+        parser.add_argument('--rpc-url', help='Override the RPC URL configured for the chain')
+        parser.add_argument('--required', type=int, help='Override the confirmations required on this chain')
+        parser.add_argument('--no-confirm', action='store_true', help='Only record depth; leave crediting to mock_confirm_deposits')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between head polls')
+        parser.add_argument('--once', action='store_true', help='Exit after one poll')
+
+    def handle(self, *args, **options):
+        chain = options['chain']
+        if options['rpc_url']:
+            services.RPC_URLS[chain] = options['rpc_url']
+
+        tracker = DepthTracker(chain, required=options['required'], confirm=not options['no_confirm'])
+        tracker.load_pending()
+        self.stdout.write(f"[{chain}] tracking {len(tracker)} pending deposits, {tracker.required} confirmations required")
+        while True:
+            stats = tracker.poll()
+            if stats.new_blocks or stats.promoted or stats.reverted:
+                self.stdout.write(
+                    f"[{chain}] head {stats.head}: {stats.new_blocks} new blocks, {stats.promoted} promoted, "
+                    f"{stats.reverted} reverted ({stats.reorgs} reorgs), {stats.pending} pending"
+                )
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
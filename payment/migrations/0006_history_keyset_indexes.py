@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0005_p2ptransfer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_dep_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='p2ptransfer',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='payment_p2p_sender_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='p2ptransfer',
+            index=models.Index(fields=['receiver', '-created_at', '-id'], name='payment_p2p_recv_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_tx_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_wd_user_created_idx'),
+        ),
+    ]
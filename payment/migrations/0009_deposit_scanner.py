@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0008_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chain', models.CharField(choices=[('ethereum', 'Ethereum (ERC20)'), ('bsc', 'Binance Smart Chain (BEP20)'), ('tron', 'Tron (TRC20)'), ('bitcoin', 'Bitcoin (BTC)'), ('solana', 'Solana (SOL)'), ('polygon', 'Polygon (MATIC)')], max_length=32, unique=True)),
+                ('last_block', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='block_hash',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='block_number',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='log_index',
+            field=models.IntegerField(blank=True, help_text='Position of the Transfer log in its block', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='deposit',
+            constraint=models.UniqueConstraint(fields=('tx_hash', 'log_index'), name='payment_deposit_tx_log'),
+        ),
+    ]
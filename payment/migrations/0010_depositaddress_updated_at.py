@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0009_deposit_scanner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depositaddress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0010_depositaddress_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='depositaddress',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deposit_addresses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='depositaddress',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['platform_wallet', 'derivation_index'], name='payment_depaddr_pool_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='depositaddress',
+            constraint=models.UniqueConstraint(fields=('platform_wallet', 'derivation_index'), name='payment_depaddr_wallet_index'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0011_deposit_address_pool'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutNonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chain', models.CharField(choices=[('ethereum', 'Ethereum (ERC20)'), ('bsc', 'Binance Smart Chain (BEP20)'), ('tron', 'Tron (TRC20)'), ('bitcoin', 'Bitcoin (BTC)'), ('solana', 'Solana (SOL)'), ('polygon', 'Polygon (MATIC)')], max_length=32, unique=True)),
+                ('next_nonce', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='withdrawalrequest',
+            name='nonce',
+            field=models.BigIntegerField(blank=True, help_text='Hot wallet nonce the payout was sent with', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['chain', 'processed_at'], name='payment_wd_payout_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0012_payout_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='withdrawalrequest',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped by every status transition'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0013_withdrawal_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(condition=models.Q(('status', 'sent')), fields=['-processed_at', '-id'], name='payment_wd_sent_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:10
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0014_withdrawal_sent_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payoutnonce',
+            name='released',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0015_payout_released_nonces'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='withdrawalrequest',
+            name='refunded',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether a failed payout was credited back'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(condition=models.Q(('status', 'processing')), fields=['processed_at'], name='payment_wd_processing_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Per-wallet derivation index sequences (see payment.address_pool) for the
+# wallets that existed before they were created alongside the wallet.
+CREATE_SEQUENCES = """
+DO $$
+DECLARE w record;
+BEGIN
+    FOR w IN
+        SELECT pw.id, COALESCE(MAX(da.derivation_index) + 1, 0) AS start
+        FROM payment_platformwallet pw
+        LEFT JOIN payment_depositaddress da ON da.platform_wallet_id = pw.id
+        GROUP BY pw.id
+    LOOP
+        EXECUTE format('CREATE SEQUENCE IF NOT EXISTS payment_derivation_seq_%s MINVALUE 0 START WITH %s', w.id, w.start);
+    END LOOP;
+END $$;
+"""
+
+DROP_SEQUENCES = """
+DO $$
+DECLARE w record;
+BEGIN
+    FOR w IN SELECT id FROM payment_platformwallet LOOP
+        EXECUTE format('DROP SEQUENCE IF EXISTS payment_derivation_seq_%s', w.id);
+    END LOOP;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0016_withdrawal_refunded'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEQUENCES, DROP_SEQUENCES),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0017_derivation_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the current in-progress run started'),
+        ),
+    ]
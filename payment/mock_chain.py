@@ -0,0 +1,206 @@
+# payment/mock_chain.py
+"""
+Local JSON-RPC stand-in for an EVM node (dev and benchmarking only).
+
+MockChain generates a deterministic chain of blocks, each carrying a number
+of ERC20 Transfer logs for one token contract. A configurable share of the
+transfers go to the given deposit addresses. serve() exposes it over HTTP
+with the handful of JSON-RPC methods the payment services use, including
+batch requests and a node-style cap on eth_getLogs result size.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+DECIMALS_SELECTOR = "0x313ce567"
+SYMBOL_SELECTOR = "0x95d89b41"
+BALANCE_OF_SELECTOR = "0x70a08231"
+
+DEFAULT_TOKEN = "0xdac17f958d2ee523a2206206994597c13d831ec7"
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _hex(n: int) -> str:
+    return hex(n)
+
+
+def _word(value: int) -> str:
+    return "0x" + format(value, "064x")
+
+
+class MockChain:
+    def __init__(self, start_block=1_000_000, head=None, logs_per_block=20, deposit_addresses=(),
+                 deposit_share=0.1, token=DEFAULT_TOKEN, decimals=6, symbol="USDT", max_logs=10_000,
+                 block_time=None, seed="crownbridge"):
+        self.start_block = start_block
+        self._head = head if head is not None else start_block
+        self.logs_per_block = logs_per_block
+        self.deposit_addresses = [a.lower() for a in deposit_addresses]
+        self.deposit_share = deposit_share
+        self.token = token.lower()
+        self.decimals = decimals
+        self.symbol = symbol
+        self.max_logs = max_logs
+        self.block_time = block_time
+        self.seed = seed
+        self.forks = {}  # block number -> seed used from that block on
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    # -- chain state -------------------------------------------------------
+    @property
+    def head(self):
+        if self.block_time:
+            return self._head + int((time.monotonic() - self._started) / self.block_time)
+        return self._head
+
+    def mine(self, blocks=1):
+        with self._lock:
+            self._head += blocks
+        return self.head
+
+    def reorg(self, from_block):
+        """Replace every block from `from_block` on with a different history."""
+        with self._lock:
+            self.forks[from_block] = f"{self.seed}-fork-{from_block}-{len(self.forks)}"
+
+    def _seed_for(self, number):
+        seed = self.seed
+        for start in sorted(self.forks):
+            if number >= start:
+                seed = self.forks[start]
+        return seed
+
+    def block_hash(self, number):
+        return "0x" + hashlib.sha256(f"{self._seed_for(number)}:{number}".encode()).hexdigest()
+
+    def block(self, number):
+        return {
+            "number": _hex(number),
+            "hash": self.block_hash(number),
+            "parentHash": self.block_hash(number - 1),
+            "timestamp": _hex(1_700_000_000 + number * 12),
+            "transactions": [],
+        }
+
+    def logs_for_block(self, number):
+        rng = random.Random(self.block_hash(number))
+        block_hash = self.block_hash(number)
+        logs = []
+        for index in range(self.logs_per_block):
+            if self.deposit_addresses and rng.random() < self.deposit_share:
+                to = rng.choice(self.deposit_addresses)
+            else:
+                to = "0x" + format(rng.getrandbits(160), "040x")
+            sender = "0x" + format(rng.getrandbits(160), "040x")
+            value = rng.randint(1, 50_000) * 10 ** self.decimals
+            tx_hash = "0x" + hashlib.sha256(f"{block_hash}:{index}".encode()).hexdigest()
+            logs.append({
+                "address": self.token,
+                "topics": [TRANSFER_TOPIC, "0x" + "0" * 24 + sender[2:], "0x" + "0" * 24 + to[2:]],
+                "data": _word(value),
+                "blockNumber": _hex(number),
+                "blockHash": block_hash,
+                "transactionHash": tx_hash,
+                "transactionIndex": _hex(index),
+                "logIndex": _hex(index),
+                "removed": False,
+            })
+        return logs
+
+    # -- JSON-RPC methods --------------------------------------------------
+    def eth_chainId(self):
+        return _hex(1337)
+
+    def eth_blockNumber(self):
+        return _hex(self.head)
+
+    def eth_getBlockByNumber(self, number, full=False):
+        number = self.head if number == "latest" else int(number, 16)
+        return self.block(number) if number <= self.head else None
+
+    def eth_getLogs(self, flt):
+        head = self.head
+        from_block = int(flt.get("fromBlock", hex(head)), 16)
+        to_block = head if flt.get("toBlock", "latest") == "latest" else int(flt["toBlock"], 16)
+        to_block = min(to_block, head)
+        address = flt.get("address")
+        if address and address.lower() != self.token:
+            return []
+        if (to_block - from_block + 1) * self.logs_per_block > self.max_logs:
+            raise RPCError(-32005, f"query returned more than {self.max_logs} results")
+        logs = []
+        for number in range(from_block, to_block + 1):
+            logs.extend(self.logs_for_block(number))
+        return logs
+
+    def eth_getTransactionReceipt(self, tx_hash):
+        return {"transactionHash": tx_hash, "status": "0x1", "blockNumber": _hex(self.head)}
+
+    def eth_call(self, call, block="latest"):
+        data = call.get("data") or call.get("input") or ""
+        if data.startswith(DECIMALS_SELECTOR):
+            return _word(self.decimals)
+        if data.startswith(SYMBOL_SELECTOR):
+            raw = self.symbol.encode()
+            return _word(32) + _word(len(raw))[2:] + raw.hex().ljust(64, "0")
+        if data.startswith(BALANCE_OF_SELECTOR):
+            return _word(int(hashlib.sha256(data.encode()).hexdigest()[:12], 16))
+        raise RPCError(-32000, "execution reverted")
+
+    def handle(self, payload):
+        """Answer one JSON-RPC request object (or a batch list)."""
+        if isinstance(payload, list):
+            return [self.handle(item) for item in payload]
+        method = getattr(self, payload.get("method", ""), None)
+        reply = {"jsonrpc": "2.0", "id": payload.get("id")}
+        if method is None or not payload["method"].startswith("eth_"):
+            reply["error"] = {"code": -32601, "message": "Method not found"}
+            return reply
+        try:
+            reply["result"] = method(*payload.get("params", []))
+        except RPCError as e:
+            reply["error"] = {"code": e.code, "message": str(e)}
+        return reply
+
+
+def serve(chain: MockChain, host="127.0.0.1", port=8545):
+    """Start a threaded HTTP server for `chain` and return it (call serve_forever or run it in a thread)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out in separate writes on keep-alive sockets
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                reply = chain.handle(json.loads(body))
+            except (ValueError, AttributeError):
+                reply = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+            raw = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve_in_thread(chain: MockChain, host="127.0.0.1", port=0):
+    """Run a stand-in node in a daemon thread; returns (server, url)."""
+    server = serve(chain, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -2,7 +2,8 @@
 import uuid
 from decimal import Decimal
 from django.conf import settings
-from django.db import models, transaction
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
 from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
@@ -14,60 +15,27 @@ class UserBalance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def credit(self, amount: Decimal, note: str = "", reference: str = None):
-        Transaction.objects.create(user=self.user, amount=amount, kind='credit', note=note, reference=reference)
-        # Ensure Decimal arithmetic
-        self.balance = (self.balance or Decimal('0')) + Decimal(amount)
-        self.save(update_fields=['balance', 'updated_at'])
+        from .ledger import post_credit
+        self.balance = post_credit(self.user_id, amount, note=note, reference=reference)
 
     def debit(self, amount: Decimal, note: str = "", reference: str = None):
-        amount = Decimal(amount)
-        if (self.balance or Decimal('0')) < amount:
-            raise ValueError("Insufficient balance")
-        Transaction.objects.create(user=self.user, amount=amount, kind='debit', note=note, reference=reference)
-        self.balance = (self.balance or Decimal('0')) - amount
-        self.save(update_fields=['balance', 'updated_at'])
+        # The funds check happens inside the UPDATE, so no row lock is needed here
+        from .ledger import post_debit
+        self.balance = post_debit(self.user_id, amount, note=note, reference=reference)
 
     def transfer_to(self, recipient_user, amount: Decimal, note: str = "Transfer"):
         """
         Atomically transfer `amount` from this user to recipient_user.
         Creates Transaction rows for both parties and updates balances.
+        Retried automatically on deadlock or serialization failure.
         """
-        amount = Decimal(amount)
-
-        if self.user == recipient_user:
-            raise ValueError("Cannot transfer to self")
-        if amount <= Decimal('0'):
-            raise ValueError("Transfer amount must be positive")
-
-        # Use select_for_update to lock rows in a transaction
-        with transaction.atomic():
-            sender_balance = UserBalance.objects.select_for_update().get(pk=self.pk)
-            receiver_balance, _ = UserBalance.objects.select_for_update().get_or_create(user=recipient_user)
-
-            if (sender_balance.balance or Decimal('0')) < amount:
-                raise ValueError("Insufficient balance")
-
-            # record debit for sender
-            Transaction.objects.create(
-                user=self.user,
-                amount=amount,
-                kind='debit',
-                note=note,
-            )
-            sender_balance.balance = sender_balance.balance - amount
-            sender_balance.save(update_fields=['balance', 'updated_at'])
-
-            # record credit for receiver
-            Transaction.objects.create(
-                user=recipient_user,
-                amount=amount,
-                kind='credit',
-                note=f"Received transfer from {self.user}",
-            )
-            receiver_balance.balance = (receiver_balance.balance or Decimal('0')) + amount
-            receiver_balance.save(update_fields=['balance', 'updated_at'])
-
-            return sender_balance, receiver_balance
+        from .ledger import transfer
+        sender_balance, receiver_balance = transfer(
+            self.user_id, recipient_user, amount, note=note,
+            received_note=f"Received transfer from {self.user}",
+        )
+        self.balance = sender_balance.balance
+        return sender_balance, receiver_balance
 
 
 class Transaction(models.Model):
@@ -82,6 +50,29 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='payment_tx_user_created_idx')]
+
+
+class LedgerRollup(models.Model):
+    """Per-user daily count and sum of ledger activity, maintained by payment.rollups."""
+    KIND = [
+        ('credit', 'Credit'),
+        ('debit', 'Debit'),
+        ('deposit', 'Deposit'),
+        ('withdrawal', 'Withdrawal'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_rollups')
+    day = models.DateField()
+    kind = models.CharField(max_length=16, choices=KIND)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=40, decimal_places=18, default=Decimal('0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'day', 'kind'], name='payment_rollup_user_day_kind')]
+
+    def __str__(self):
+        return f"{self.user} {self.day} {self.kind}: {self.count} / {self.total}"
 
 
 class PlatformWallet(models.Model):
@@ -104,24 +95,49 @@ class PlatformWallet(models.Model):
         return f"{self.name} ({self.chain})"
 
 
+class ChainCheckpoint(models.Model):
+    """Last block whose Transfer logs the deposit scanner has fully processed, per chain."""
+    chain = models.CharField(max_length=32, choices=PlatformWallet.CHAIN_CHOICES, unique=True)
+    last_block = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.chain} @ {self.last_block}"
+
+
 class DepositAddress(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="deposit_addresses")
+    # null while the address sits unassigned in the wallet's pre-derived pool
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="deposit_addresses", null=True, blank=True)
     platform_wallet = models.ForeignKey(PlatformWallet, on_delete=models.CASCADE, related_name="deposit_addresses")
     address = models.CharField(max_length=128, db_index=True, blank=True, null=True)
     derivation_index = models.BigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     active = models.BooleanField(default=True)
 
     class Meta:
         unique_together = ("user", "platform_wallet")
+        constraints = [
+            models.UniqueConstraint(fields=["platform_wallet", "derivation_index"], name="payment_depaddr_wallet_index"),
+        ]
+        indexes = [
+            models.Index(
+                fields=["platform_wallet", "derivation_index"],
+                condition=models.Q(user__isnull=True),
+                name="payment_depaddr_pool_idx",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.user} -> {self.address or 'Pending...'} ({self.platform_wallet.chain})"
+        return f"{self.user or 'Pool'} -> {self.address or 'Pending...'} ({self.platform_wallet.chain})"
 
     def generate_address(self):
-        """Simulate address generation (replace with real wallet API in production)."""
-        self.address = f"{self.platform_wallet.chain}_{uuid.uuid4().hex[:20]}"
-        self.save(update_fields=["address"])
+        """Derive this row's address at the wallet's next derivation index."""
+        from .address_pool import allocate_indexes, derive_addresses
+
+        (index,) = allocate_indexes(self.platform_wallet, 1)
+        ((self.derivation_index, self.address),) = derive_addresses(self.platform_wallet, [index])
+        self.save(update_fields=["address", "derivation_index", "updated_at"])
         return self.address
 
 
@@ -137,6 +153,9 @@ class Deposit(models.Model):
     platform_wallet = models.ForeignKey(PlatformWallet, on_delete=models.SET_NULL, null=True)
     deposit_address = models.ForeignKey(DepositAddress, on_delete=models.SET_NULL, null=True, blank=True)
     tx_hash = models.CharField(max_length=128, db_index=True)
+    log_index = models.IntegerField(null=True, blank=True, help_text="Position of the Transfer log in its block")
+    block_number = models.BigIntegerField(null=True, blank=True)
+    block_hash = models.CharField(max_length=128, null=True, blank=True)
     from_address = models.CharField(max_length=128, blank=True, null=True)
     token_contract = models.CharField(max_length=128, help_text="Token contract address (USDT)", null=True, blank=True)
     amount = models.DecimalField(max_digits=32, decimal_places=18, null=True, blank=True)
@@ -148,7 +167,12 @@ class Deposit(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["tx_hash"]), models.Index(fields=["status"])]
+        indexes = [
+            models.Index(fields=["tx_hash"]),
+            models.Index(fields=["status"]),
+            models.Index(fields=["user", "-created_at", "-id"], name="payment_dep_user_created_idx"),
+        ]
+        constraints = [models.UniqueConstraint(fields=["tx_hash", "log_index"], name="payment_deposit_tx_log")]
 
     def __str__(self):
         return f"{self.user} deposit {self.amount} ({self.status})"
@@ -163,6 +187,12 @@ class WithdrawalRequest(models.Model):
         ("failed", "Failed"),
         ("rejected", "Rejected"),
     ]
+    # allowed status changes; applied only through payment.withdrawal_states
+    TRANSITIONS = {
+        "pending": ("approved", "rejected"),
+        "approved": ("processing",),
+        "processing": ("sent", "failed"),
+    }
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="withdrawals")
@@ -171,15 +201,41 @@ class WithdrawalRequest(models.Model):
     chain = models.CharField(max_length=32, choices=PlatformWallet.CHAIN_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS, default="pending")
+    version = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped by every status transition")
     admin_note = models.TextField(blank=True, null=True)
     tx_hash = models.CharField(max_length=128, null=True, blank=True)
+    nonce = models.BigIntegerField(null=True, blank=True, help_text="Hot wallet nonce the payout was sent with")
+    refunded = models.BooleanField(default=False, editable=False, help_text="Whether a failed payout was credited back")
     processed_at = models.DateTimeField(null=True, blank=True)
     requested_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-id"], name="payment_wd_user_created_idx"),
+            # payout queue: approved rows per chain, oldest approval first
+            models.Index(fields=["chain", "processed_at"], condition=models.Q(status="approved"), name="payment_wd_payout_queue_idx"),
+            # public feed rebuild: latest sent withdrawals
+            models.Index(fields=["-processed_at", "-id"], condition=models.Q(status="sent"), name="payment_wd_sent_feed_idx"),
+            # stale payout sweep: processing rows by claim time
+            models.Index(fields=["processed_at"], condition=models.Q(status="processing"), name="payment_wd_processing_idx"),
+        ]
+
     def __str__(self):
         return f"Withdrawal {self.amount} {self.chain} for {self.user} ({self.status})"
 
 
+class PayoutNonce(models.Model):
+    """Next nonce of the payout hot wallet on each chain (see payment.payouts)."""
+    chain = models.CharField(max_length=32, choices=PlatformWallet.CHAIN_CHOICES, unique=True)
+    next_nonce = models.BigIntegerField(default=0)
+    # nonces handed out but never broadcast; allocated again before next_nonce
+    released = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.chain} next nonce {self.next_nonce}"
+
+
 class P2PTransfer(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_transfers")
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_transfers")
@@ -188,6 +244,32 @@ class P2PTransfer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['sender', '-created_at', '-id'], name='payment_p2p_sender_created_idx'),
+            models.Index(fields=['receiver', '-created_at', '-id'], name='payment_p2p_recv_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.email} → {self.receiver.email} : {self.amount}"
+
+
+class IdempotencyKey(models.Model):
+    """First response to a client-keyed POST, replayed to retries until it expires."""
+    STATUS = [('in_progress', 'In progress'), ('completed', 'Completed')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=128)
+    path = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(blank=True, default=b'')
+    response_location = models.CharField(max_length=2048, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(default=timezone.now, help_text="When the current in-progress run started")
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='payment_idempotency_user_key')]
+
+    def __str__(self):
+        return f"{self.user} {self.key} ({self.status})"
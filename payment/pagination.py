@@ -0,0 +1,95 @@
+# payment/pagination.py
+"""
+Keyset (cursor) pagination for history pages.
+
+Rows are ordered newest first by (created_at, pk) and a page is fetched with
+a range condition on that pair instead of OFFSET, so page N costs the same as
+page 1 and no COUNT(*) is issued. Each model paginated this way carries a
+matching (owner, -created_at, -id) index.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+
+
+def encode_cursor(obj, field="created_at"):
+    raw = f"{getattr(obj, field).isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, model):
+    """Return (timestamp, pk) for a cursor string, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, pk = raw.split("|", 1)
+        return datetime.fromisoformat(value), model._meta.pk.to_python(pk)
+    except (ValueError, ValidationError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at either end)."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_paginate(queryset, params, per_page=DEFAULT_PAGE_SIZE, prefix="", field="created_at"):
+    """
+    Return the KeysetPage of `queryset` selected by the `<prefix>after` or
+    `<prefix>before` cursor in `params` (usually request.GET). Without a
+    valid cursor the newest page is returned.
+    """
+    after = decode_cursor(params.get(f"{prefix}after", ""), queryset.model)
+    before = None if after else decode_cursor(params.get(f"{prefix}before", ""), queryset.model)
+
+    if before:
+        value, pk = before
+        rows = list(
+            queryset.filter(**{f"{field}__gte": value})
+            .filter(Q(**{f"{field}__gt": value}) | Q(**{field: value, "pk__gt": pk}))
+            .order_by(field, "pk")[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], field) if rows else None,
+            previous_cursor=encode_cursor(rows[0], field) if rows and has_more else None,
+        )
+
+    if after:
+        value, pk = after
+        # the plain bound is what lets Postgres start the index scan at the cursor
+        queryset = queryset.filter(**{f"{field}__lte": value}).filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk})
+        )
+    rows = list(queryset.order_by(f"-{field}", "-pk")[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], field) if rows and has_more else None,
+        previous_cursor=encode_cursor(rows[0], field) if rows and after else None,
+    )
@@ -0,0 +1,344 @@
+# payment/payouts.py
+"""
+Batched payout engine for approved withdrawals.
+
+Any number of worker processes can call run() side by side. For each chain
+with approved withdrawals a worker:
+
+- takes one of the chain's concurrency slots (a session-level Postgres
+  advisory lock; PAYOUT_CONCURRENCY sets the number of slots per chain);
+- claims up to `batch_size` approved rows with SELECT ... FOR UPDATE SKIP
+  LOCKED and moves them to `processing` with one compare-and-set UPDATE
+  (payment.withdrawal_states), so overlapping workers never send the same
+  payout twice. The same UPDATE records the claim time and the hot wallet
+  nonce (PayoutNonce) reserved for each payout whose address is valid for
+  the chain (ADDRESS_PATTERNS); released nonces are reused first;
+- hands the batch to the configured sender (PAYOUT_SENDER) outside any
+  transaction;
+- writes the `sent` and `failed` outcomes back with one compare-and-set
+  UPDATE each and adds the sent amounts to the withdrawal rollups.
+
+The balance was debited when the withdrawal was approved. A failed payout
+is credited back in the same transaction that marks it failed, with its
+reason in admin_note, and its nonce is released to PayoutNonce.released.
+The next allocation on the chain hands that nonce out again, so no nonce
+gap stalls later transactions. A sender reports per-payout errors in its
+results and raises only when it broadcast nothing. If it raises, the
+whole batch fails.
+
+A worker that dies between claiming and finishing a batch leaves it in
+processing. run() first sweeps rows claimed more than PAYOUT_LEASE seconds
+ago (sweep_stale): they are failed and their nonces released, but not
+refunded, because they may have been broadcast. An operator checks the
+chain and then refunds them with refund() (the "Refund" admin action).
+"""
+import hashlib
+import logging
+import re
+import time
+import zlib
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import ledger, withdrawal_states
+from .models import PayoutNonce, WithdrawalRequest
+from .rollups import record_withdrawals_sent
+from .summary import invalidate_balance_summary
+
+logger = logging.getLogger(__name__)
+
+PAYOUT_SENDER = getattr(settings, "PAYOUT_SENDER", "payment.payouts.FakeChainSender")
+PAYOUT_CONCURRENCY = getattr(settings, "PAYOUT_CONCURRENCY", {"ethereum": 1, "bsc": 2, "polygon": 2})
+DEFAULT_CONCURRENCY = 1
+# seconds a claimed batch may stay in processing; must exceed the slowest sender call
+PAYOUT_LEASE = getattr(settings, "PAYOUT_LEASE", 900)
+
+EVM_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+BASE58 = "1-9A-HJ-NP-Za-km-z"
+ADDRESS_PATTERNS = {
+    "ethereum": EVM_ADDRESS_RE,
+    "bsc": EVM_ADDRESS_RE,
+    "polygon": EVM_ADDRESS_RE,
+    "tron": re.compile(rf"^T[{BASE58}]{{33}}$"),
+    "bitcoin": re.compile(rf"^(?:[13][{BASE58}]{{25,34}}|bc1[02-9ac-hj-np-z]{{11,71}})$"),
+    "solana": re.compile(rf"^[{BASE58}]{{32,44}}$"),
+}
+NONCE_TABLE = PayoutNonce._meta.db_table
+
+Payout = namedtuple("Payout", ["withdrawal", "nonce"])
+SendResult = namedtuple("SendResult", ["withdrawal_id", "tx_hash", "error"], defaults=[None, None])
+PayoutStats = namedtuple("PayoutStats", ["sent", "failed", "batches", "elapsed"])
+
+
+class FakeChainSender:
+    """
+    Local stand-in for a signing/broadcast service. Every valid payout gets a
+    deterministic tx hash; `latency` seconds are spent per batch to imitate a
+    node round trip.
+    """
+
+    def __init__(self, latency: float = None):
+        self.latency = getattr(settings, "PAYOUT_FAKE_LATENCY", 0.0) if latency is None else latency
+
+    def send(self, chain: str, payouts):
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        for w, nonce in payouts:
+            if not valid_address(chain, w.to_address):
+                results.append(SendResult(w.pk, error=f"invalid address {w.to_address!r}"))
+                continue
+            digest = hashlib.sha256(f"{chain}:{nonce}:{w.pk}:{w.to_address}:{w.amount}".encode()).hexdigest()
+            results.append(SendResult(w.pk, tx_hash=f"0x{digest}"))
+        return results
+
+
+def valid_address(chain: str, address) -> bool:
+    """Whether `address` is well-formed for `chain`; unknown chains accept nothing."""
+    pattern = ADDRESS_PATTERNS.get(chain)
+    return bool(pattern and pattern.match(address or ""))
+
+
+def get_sender():
+    return import_string(PAYOUT_SENDER)()
+
+
+# -- concurrency slots -----------------------------------------------------
+def _slot_key(chain: str, slot: int) -> int:
+    return zlib.crc32(f"payout:{chain}:{slot}".encode())
+
+
+def acquire_slot(chain: str):
+    """Take a free payout slot for `chain` on this connection; returns its key or None."""
+    with connection.cursor() as cursor:
+        for slot in range(PAYOUT_CONCURRENCY.get(chain, DEFAULT_CONCURRENCY)):
+            key = _slot_key(chain, slot)
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+            if cursor.fetchone()[0]:
+                return key
+    return None
+
+
+def release_slot(key: int):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+# -- nonces ----------------------------------------------------------------
+def allocate_nonces(chain: str, count: int):
+    """Reserve `count` nonces on `chain`, released ones first; returns them in ascending order."""
+    PayoutNonce.objects.bulk_create([PayoutNonce(chain=chain)], ignore_conflicts=True)
+    with transaction.atomic():
+        row = PayoutNonce.objects.select_for_update().get(chain=chain)
+        released = sorted(row.released)
+        nonces = released[:count]
+        fresh = count - len(nonces)
+        nonces += range(row.next_nonce, row.next_nonce + fresh)
+        row.released = released[len(nonces) - fresh:]
+        row.next_nonce += fresh
+        row.save(update_fields=["released", "next_nonce", "updated_at"])
+    return nonces
+
+
+def release_nonces(chain: str, nonces):
+    """Return unused `nonces` to `chain`'s pool for the next allocation."""
+    nonces = sorted(set(nonces))
+    if not nonces:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {NONCE_TABLE} SET released = ARRAY(SELECT DISTINCT unnest(released || %s::bigint[])), "
+            f"updated_at = %s WHERE chain = %s",
+            [nonces, timezone.now(), chain],
+        )
+
+
+# -- batches ---------------------------------------------------------------
+def claim_batch(chain: str, batch_size: int = 100):
+    """
+    Claim up to `batch_size` approved withdrawals on `chain`, mark them
+    processing and record the nonce reserved for each valid address.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            WithdrawalRequest.objects.filter(status="approved", chain=chain)
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("processed_at", "id")
+            .only("id", "user_id", "amount", "to_address", "chain", "status", "version")[:batch_size]
+        )
+        valid = [w for w in batch if valid_address(chain, w.to_address)]
+        nonces = dict(zip((w.pk for w in valid), allocate_nonces(chain, len(valid)))) if valid else {}
+        claimed = withdrawal_states.transition_many(
+            [(w.pk, w.version, nonces.get(w.pk)) for w in batch], "approved", "processing",
+            columns=["nonce::bigint"], assignments=["nonce = v.nonce", "processed_at = %s"], params=[now],
+        )
+        release_nonces(chain, [n for pk, n in nonces.items() if pk not in claimed])
+    batch = [w for w in batch if w.pk in claimed]
+    for w in batch:
+        w.status, w.version, w.nonce, w.processed_at = "processing", w.version + 1, nonces.get(w.pk), now
+    return batch
+
+
+def refund_entries(withdrawals):
+    return [
+        ledger.LedgerEntry(w.user_id, w.amount, "credit", note=f"Refund of failed withdrawal {w.pk}",
+                           reference=f"withdrawal:{w.pk}:refund")
+        for w in withdrawals
+    ]
+
+
+def finish_batch(batch, results):
+    """
+    Record the sender's results for a claimed batch with two compare-and-set
+    UPDATEs, refunding the failed payouts; returns (sent, failed).
+    """
+    by_id = {w.pk: w for w in batch}
+    now = timezone.now()
+    sent, failed, notes = [], [], {}
+    for result in results:
+        w = by_id.pop(result.withdrawal_id)
+        if result.tx_hash:
+            w.tx_hash = result.tx_hash
+            sent.append(w)
+        else:
+            notes[w.pk] = f"\nPayout failed at {now}: {result.error}; refunded"
+            failed.append(w)
+    if by_id:
+        logger.error("payout sender returned no result for %s withdrawals; left in processing", len(by_id))
+
+    with transaction.atomic():
+        sent_ids = withdrawal_states.transition_many(
+            [(w.pk, w.version, w.tx_hash) for w in sent], "processing", "sent",
+            columns=["tx_hash::text"], assignments=["tx_hash = v.tx_hash", "processed_at = %s"], params=[now],
+        )
+        failed_ids = withdrawal_states.transition_many(
+            [(w.pk, w.version, notes[w.pk]) for w in failed], "processing", "failed",
+            columns=["note::text"],
+            assignments=[
+                "admin_note = COALESCE(w.admin_note, '') || v.note", "nonce = NULL", "refunded = true",
+                "processed_at = %s",
+            ],
+            params=[now],
+        )
+        lost = [w.pk for w in sent if w.pk not in sent_ids]
+        if lost:
+            logger.error("payouts %s were sent but had already left processing", lost)
+        sent = [w for w in sent if w.pk in sent_ids]
+        failed = [w for w in failed if w.pk in failed_ids]
+        ledger.post_batch(refund_entries(failed))
+        record_withdrawals_sent(sent)
+        invalidate_balance_summary(*{w.user_id for w in sent + failed})
+        unused = {}
+        for w in failed:
+            if w.nonce is not None:
+                unused.setdefault(w.chain, []).append(w.nonce)
+        for chain, chain_nonces in unused.items():
+            release_nonces(chain, chain_nonces)
+    for w in sent:
+        w.status, w.version, w.processed_at = "sent", w.version + 1, now
+    for w in failed:
+        w.status, w.version, w.processed_at, w.nonce, w.refunded = "failed", w.version + 1, now, None, True
+    return sent, failed
+
+
+def send_batch(chain: str, batch, sender):
+    """Send the claimed payouts in `batch` that have a nonce and record the outcome."""
+    valid = [w for w in batch if w.nonce is not None]
+    results = [
+        SendResult(w.pk, error=f"invalid {chain} address {w.to_address!r}") for w in batch if w.nonce is None
+    ]
+    if valid:
+        try:
+            results += sender.send(chain, [Payout(w, w.nonce) for w in valid])
+        except Exception as exc:
+            logger.exception("%s: payout sender failed; failing %s withdrawals", chain, len(valid))
+            results += [SendResult(w.pk, error=f"payout sender error: {exc}") for w in valid]
+    return finish_batch(batch, results)
+
+
+def sweep_stale(lease: float = None):
+    """
+    Fail withdrawals left in processing for longer than `lease` seconds by a
+    worker that stopped before recording the outcome, and release their
+    nonces. They are not refunded: the sender may have broadcast them, so an
+    operator checks the chain first. Returns the failed ids.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=PAYOUT_LEASE if lease is None else lease)
+    note = f"\nPayout worker stopped before recording the outcome; failed at {now}. Check the chain before refunding."
+    with transaction.atomic():
+        stale = list(
+            WithdrawalRequest.objects.filter(status="processing", processed_at__lt=cutoff)
+            .select_for_update(skip_locked=True, of=("self",))
+            .only("id", "chain", "nonce", "version")
+        )
+        failed = withdrawal_states.transition_many(
+            [(w.pk, w.version) for w in stale], "processing", "failed",
+            assignments=["admin_note = COALESCE(w.admin_note, '') || %s", "nonce = NULL", "processed_at = %s"],
+            params=[note, now],
+        )
+        unused = {}
+        for w in stale:
+            if w.pk in failed and w.nonce is not None:
+                unused.setdefault(w.chain, []).append(w.nonce)
+        for chain, chain_nonces in unused.items():
+            release_nonces(chain, chain_nonces)
+    if failed:
+        logger.warning("failed %s payouts left in processing since before %s", len(failed), cutoff)
+    return failed
+
+
+@ledger.retry_on_conflict
+def refund(withdrawal_ids):
+    """Credit back the failed, not yet refunded withdrawals in `withdrawal_ids`; returns the entries posted."""
+    with transaction.atomic():
+        rows = list(
+            WithdrawalRequest.objects.filter(pk__in=list(withdrawal_ids), status="failed", refunded=False)
+            .select_for_update(of=("self",))
+            .only("id", "user_id", "amount")
+        )
+        WithdrawalRequest.objects.filter(pk__in=[w.pk for w in rows]).update(refunded=True)
+        entries = refund_entries(rows)
+        ledger.post_batch(entries)
+    return entries
+
+
+def pending_chains():
+    return list(
+        WithdrawalRequest.objects.filter(status="approved").order_by().values_list("chain", flat=True).distinct()
+    )
+
+
+def run(batch_size: int = 100, max_batches: int = None, sender=None) -> PayoutStats:
+    """Send approved withdrawals until none are left that this worker can take."""
+    sender = sender or get_sender()
+    started = time.perf_counter()
+    sent = failed = batches = 0
+    sweep_stale()
+    while max_batches is None or batches < max_batches:
+        progressed = False
+        for chain in pending_chains():
+            key = acquire_slot(chain)
+            if key is None:  # every slot for this chain is busy with other workers
+                continue
+            try:
+                while max_batches is None or batches < max_batches:
+                    batch = claim_batch(chain, batch_size)
+                    if not batch:
+                        break
+                    ok, ko = send_batch(chain, batch, sender)
+                    sent += len(ok)
+                    failed += len(ko)
+                    batches += 1
+                    progressed = True
+            finally:
+                release_slot(key)
+        if not progressed:
+            break
+    return PayoutStats(sent, failed, batches, time.perf_counter() - started)
@@ -0,0 +1,129 @@
+# payment/rollups.py
+"""
+Daily per-user ledger rollups.
+
+LedgerRollup keeps one row per (user, day, kind) with the count and sum of
+that day's activity: ledger credits and debits, confirmed deposits and sent
+withdrawals. Rows are maintained incrementally by upserts as entries are
+posted, and can be rebuilt from the raw tables with the
+backfill_ledger_rollups command. Period figures then cost a scan of at most
+a few hundred rollup rows instead of the user's whole history.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LedgerRollup, Transaction, Deposit, WithdrawalRequest
+
+ROLLUP_TABLE = LedgerRollup._meta.db_table
+
+# Shared by the single-entry ledger statement and record() below
+UPSERT_CONFLICT_SQL = f"""
+    ON CONFLICT (user_id, day, kind) DO UPDATE
+        SET count = {ROLLUP_TABLE}.count + EXCLUDED.count,
+            total = {ROLLUP_TABLE}.total + EXCLUDED.total,
+            updated_at = EXCLUDED.updated_at
+"""
+
+
+def record(entries, batch_size: int = 1000):
+    """
+    Add (user_id, kind, amount[, day]) entries to the rollups. Entries are
+    aggregated in memory first, so each (user, day, kind) is upserted once;
+    `day` defaults to today.
+    """
+    today = timezone.localdate()
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for entry in entries:
+        user_id, kind, amount = entry[:3]
+        day = entry[3] if len(entry) > 3 else today
+        bucket = totals[(user_id, day, kind)]
+        bucket[0] += 1
+        bucket[1] += Decimal(amount)
+    if not totals:
+        return
+
+    now = timezone.now()
+    # sorted keys give every writer the same lock order
+    rows = [(uid, day, kind, n, total, now) for (uid, day, kind), (n, total) in sorted(totals.items())]
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            chunk = rows[i:i + batch_size]
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_TABLE} (user_id, day, kind, count, total, updated_at) "
+                f"VALUES {placeholders} {UPSERT_CONFLICT_SQL}",
+                [value for row in chunk for value in row],
+            )
+
+
+def record_withdrawals_sent(withdrawals):
+    record((w.user_id, "withdrawal", w.amount) for w in withdrawals)
+
+
+def period_totals(user, start_day, end_day):
+    """Return {kind: (count, total)} for `user` between two days, inclusive."""
+    rows = (
+        LedgerRollup.objects.filter(user=user, day__gte=start_day, day__lte=end_day)
+        .values("kind")
+        .annotate(n=Sum("count"), amount=Sum("total"))
+    )
+    return {row["kind"]: (row["n"], row["amount"]) for row in rows}
+
+
+def _grouped(queryset, date_field, kind=None, batch_size=2000):
+    """Yield LedgerRollup rows aggregated by user and day from `queryset`."""
+    group = ["user_id", "day"] + ([] if kind else ["kind"])
+    rows = (
+        queryset.annotate(day=TruncDate(date_field))
+        .order_by()
+        .values(*group)
+        .annotate(n=Count("pk"), amount=Sum("amount"))
+        .values_list(*group, "n", "amount")
+        .iterator(chunk_size=batch_size)
+    )
+    for row in rows:
+        user_id, day = row[0], row[1]
+        row_kind = kind or row[2]
+        n, amount = row[-2], row[-1]
+        yield LedgerRollup(user_id=user_id, day=day, kind=row_kind, count=n, total=amount or Decimal("0"))
+
+
+def backfill(since=None, batch_size: int = 2000):
+    """
+    Rebuild the rollups from the raw tables, for every day from `since`
+    (all history when None). Run it while no postings are in flight, since
+    rows written concurrently for the rebuilt days would be overwritten.
+    """
+    transactions = Transaction.objects.all()
+    deposits = Deposit.objects.filter(status="confirmed")
+    withdrawals = WithdrawalRequest.objects.filter(status="sent", processed_at__isnull=False)
+    rollups = LedgerRollup.objects.all()
+    if since:
+        transactions = transactions.filter(created_at__date__gte=since)
+        deposits = deposits.filter(updated_at__date__gte=since)
+        withdrawals = withdrawals.filter(processed_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for source in (
+            _grouped(transactions, "created_at", batch_size=batch_size),
+            _grouped(deposits, "updated_at", kind="deposit", batch_size=batch_size),
+            _grouped(withdrawals, "processed_at", kind="withdrawal", batch_size=batch_size),
+        ):
+            batch = []
+            for row in source:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    LedgerRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            LedgerRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
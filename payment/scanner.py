@@ -0,0 +1,140 @@
+# payment/scanner.py
+"""
+Block-range scanner that turns ERC20 Transfer logs into Deposit rows.
+
+Each pass asks the chain's node for the token's Transfer logs over a range of
+blocks (eth_getLogs), matches the recipients against the in-memory deposit
+address index (payment.address_index), bulk inserts one pending Deposit per matching log (unique on tx_hash and log
+index, so rescanning a range is harmless) and moves the chain's
+ChainCheckpoint forward in the same transaction. The block range adapts to
+the node: it halves when the node rejects a range as too large and grows
+again while responses stay small.
+"""
+import logging
+import time
+from collections import namedtuple
+
+from django.db import transaction
+
+from .address_index import get_index
+from .models import ChainCheckpoint, Deposit
+from .services import RPCError, USDT_CONTRACTS, get_token_metadata, raw_to_human, rpc_call
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+ScanStats = namedtuple("ScanStats", ["blocks", "logs", "deposits", "batches", "elapsed"])
+
+
+def topic_to_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+class DepositScanner:
+    def __init__(self, chain, token=None, batch_blocks=100, min_batch=1, max_batch=5000,
+                 target_logs=2000, lag=0, start_block=None):
+        self.chain = chain
+        self.token = (token or USDT_CONTRACTS.get(chain) or "").lower()
+        if not self.token:
+            raise RuntimeError(f"No token contract configured for chain {chain}")
+        self.batch_blocks = batch_blocks
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_logs = target_logs
+        self.lag = lag
+        self.start_block = start_block
+        self.addresses = get_index(chain)
+
+    @property
+    def decimals(self):
+        return get_token_metadata(self.chain, self.token)["decimals"]
+
+    def checkpoint(self):
+        """Return the last scanned block, creating the checkpoint just behind `start_block` (or the head)."""
+        cp = ChainCheckpoint.objects.filter(chain=self.chain).first()
+        if cp:
+            return cp.last_block
+        start = self.start_block if self.start_block is not None else self.safe_head()
+        cp, _ = ChainCheckpoint.objects.get_or_create(chain=self.chain, defaults={"last_block": start - 1})
+        return cp.last_block
+
+    def safe_head(self):
+        return int(rpc_call(self.chain, "eth_blockNumber"), 16) - self.lag
+
+    def fetch_logs(self, from_block, to_block):
+        return rpc_call(self.chain, "eth_getLogs", [{
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+            "address": self.token,
+            "topics": [TRANSFER_TOPIC],
+        }])
+
+    def match(self, logs):
+        """Build pending Deposit rows for logs paid to one of our deposit addresses."""
+        self.addresses.refresh()
+        lookup = self.addresses.lookup
+        deposits = []
+        for log in logs:
+            if len(log["topics"]) < 3:
+                continue
+            owner = lookup(topic_to_address(log["topics"][2]))
+            if owner is None:
+                continue
+            da_id, user_id, wallet_id = owner
+            amount_raw = int(log["data"], 16)
+            deposits.append(Deposit(
+                user_id=user_id,
+                platform_wallet_id=wallet_id,
+                deposit_address_id=da_id,
+                tx_hash=log["transactionHash"],
+                log_index=int(log["logIndex"], 16),
+                block_number=int(log["blockNumber"], 16),
+                block_hash=log["blockHash"],
+                from_address=topic_to_address(log["topics"][1]),
+                token_contract=self.token,
+                amount_raw=amount_raw,
+                amount=raw_to_human(amount_raw, self.decimals),
+                status="pending",
+            ))
+        return deposits
+
+    def scan_range(self, from_block, to_block):
+        """Scan one block range and advance the checkpoint; returns (logs, deposits)."""
+        logs = self.fetch_logs(from_block, to_block)
+        deposits = self.match(logs)
+        with transaction.atomic():
+            Deposit.objects.bulk_create(deposits, ignore_conflicts=True, batch_size=1000)
+            ChainCheckpoint.objects.filter(chain=self.chain).update(last_block=to_block)
+        return len(logs), len(deposits)
+
+    def scan(self, max_batches=None):
+        """Scan from the checkpoint up to the current safe head; returns ScanStats."""
+        started = time.perf_counter()
+        head = self.safe_head()
+        cursor = self.checkpoint() + 1
+        blocks = logs = deposits = batches = 0
+
+        while cursor <= head and (max_batches is None or batches < max_batches):
+            to_block = min(head, cursor + self.batch_blocks - 1)
+            try:
+                n_logs, n_deposits = self.scan_range(cursor, to_block)
+            except RPCError as e:
+                if self.batch_blocks <= self.min_batch:
+                    raise
+                self.batch_blocks = max(self.min_batch, self.batch_blocks // 2)
+                logger.info("%s: shrinking scan range to %s blocks (%s)", self.chain, self.batch_blocks, e)
+                continue
+
+            blocks += to_block - cursor + 1
+            logs += n_logs
+            deposits += n_deposits
+            batches += 1
+            cursor = to_block + 1
+
+            if n_logs > self.target_logs:
+                self.batch_blocks = max(self.min_batch, self.batch_blocks // 2)
+            elif n_logs < self.target_logs // 2:
+                self.batch_blocks = min(self.max_batch, self.batch_blocks * 2)
+
+        return ScanStats(blocks, logs, deposits, batches, time.perf_counter() - started)
@@ -1,10 +1,19 @@
 # payments/services.py
+import itertools
 import os
+import threading
 from decimal import Decimal
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
+
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+try:
+    from web3 import Web3
+    from web3.middleware import geth_poa_middleware
+except ImportError:  # web3 is only needed for contract helpers; raw JSON-RPC works without it
+    Web3 = None
+
 # environment vars
 RPC_URLS = {
     # example keys - set in env
@@ -19,14 +28,151 @@ USDT_CONTRACTS = {
 }
 
 
-def get_web3(chain: str) -> Web3:
+RPC_TIMEOUT = 30
+RPC_POOL_SIZE = getattr(settings, "RPC_POOL_SIZE", 10)
+RPC_BATCH_SIZE = getattr(settings, "RPC_BATCH_SIZE", 100)
+
+DECIMALS_SELECTOR = "0x313ce567"
+SYMBOL_SELECTOR = "0x95d89b41"
+BALANCE_OF_SELECTOR = "0x70a08231"
+
+
+class RPCError(RuntimeError):
+    """Error object returned by a JSON-RPC node."""
+
+    def __init__(self, error):
+        super().__init__(error.get("message", "JSON-RPC error"))
+        self.code = error.get("code")
+
+
+def get_rpc_url(chain: str) -> str:
     rpc = RPC_URLS.get(chain)
     if not rpc:
         raise RuntimeError(f"No RPC URL defined for chain {chain}")
-    w3 = Web3(Web3.HTTPProvider(rpc))
-    # some chains (BSC, etc) require PoA middleware
-    if chain == "bsc":
-        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    return rpc
+
+
+# -------------------------
+# Per-process client registry
+# -------------------------
+# One keep-alive HTTP session (and Web3 client) per chain and process. The
+# pid is part of the key so forked workers never share a parent's sockets.
+_registry_lock = threading.Lock()
+_sessions = {}
+_web3_clients = {}
+_token_metadata = {}
+_rpc_ids = itertools.count(1)
+
+
+def get_session(chain: str) -> requests.Session:
+    key = (os.getpid(), chain)
+    session = _sessions.get(key)
+    if session is None:
+        with _registry_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RPC_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[key] = session
+    return session
+
+
+def _post(chain: str, payload):
+    response = get_session(chain).post(get_rpc_url(chain), json=payload, timeout=RPC_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def rpc_call(chain: str, method: str, params=()):
+    """Make a single raw JSON-RPC call against the chain's node."""
+    reply = _post(chain, {"jsonrpc": "2.0", "id": next(_rpc_ids), "method": method, "params": list(params)})
+    if "error" in reply:
+        raise RPCError(reply["error"])
+    return reply["result"]
+
+
+def rpc_batch(chain: str, calls, batch_size: int = None):
+    """
+    Send many (method, params) calls as JSON-RPC batch requests of up to
+    `batch_size` calls each and return the results in call order. Raises
+    RPCError for the first call the node answered with an error.
+    """
+    calls = list(calls)
+    batch_size = batch_size or RPC_BATCH_SIZE
+    results = []
+    for start in range(0, len(calls), batch_size):
+        chunk = calls[start:start + batch_size]
+        ids = [next(_rpc_ids) for _ in chunk]
+        payload = [
+            {"jsonrpc": "2.0", "id": rid, "method": method, "params": list(params)}
+            for rid, (method, params) in zip(ids, chunk)
+        ]
+        reply = _post(chain, payload)
+        if isinstance(reply, dict):  # the node rejected the batch as a whole
+            raise RPCError(reply.get("error", {}))
+        by_id = {item.get("id"): item for item in reply}
+        for rid in ids:
+            item = by_id.get(rid, {"error": {"message": "Missing response in batch"}})
+            if "error" in item:
+                raise RPCError(item["error"])
+            results.append(item["result"])
+    return results
+
+
+def get_transaction_receipts(chain: str, tx_hashes):
+    return rpc_batch(chain, (("eth_getTransactionReceipt", [h]) for h in tx_hashes))
+
+
+def get_blocks(chain: str, numbers, full_transactions: bool = False):
+    return rpc_batch(chain, (("eth_getBlockByNumber", [hex(n), full_transactions]) for n in numbers))
+
+
+def get_token_balances(chain: str, addresses, token: str = None):
+    """Return raw balanceOf values for `addresses`, in order."""
+    token = token or USDT_CONTRACTS.get(chain)
+    calls = (
+        ("eth_call", [{"to": token, "data": BALANCE_OF_SELECTOR + "0" * 24 + a.lower().removeprefix("0x")}, "latest"])
+        for a in addresses
+    )
+    return [int(value, 16) for value in rpc_batch(chain, calls)]
+
+
+def _decode_abi_string(value: str) -> str:
+    raw = bytes.fromhex(value.removeprefix("0x"))
+    if len(raw) == 32:  # some tokens return bytes32
+        return raw.rstrip(b"\0").decode(errors="replace")
+    length = int.from_bytes(raw[32:64], "big")
+    return raw[64:64 + length].decode(errors="replace")
+
+
+def get_token_metadata(chain: str, token: str = None) -> dict:
+    """
+    Return {"decimals", "symbol"} for the chain's token. Token metadata never
+    changes, so it is fetched once per process with a single batch request.
+    """
+    token = (token or USDT_CONTRACTS.get(chain) or "").lower()
+    key = (chain, token)
+    if key not in _token_metadata:
+        decimals, symbol = rpc_batch(chain, [
+            ("eth_call", [{"to": token, "data": DECIMALS_SELECTOR}, "latest"]),
+            ("eth_call", [{"to": token, "data": SYMBOL_SELECTOR}, "latest"]),
+        ])
+        _token_metadata[key] = {"decimals": int(decimals, 16), "symbol": _decode_abi_string(symbol)}
+    return _token_metadata[key]
+
+
+def get_web3(chain: str) -> Web3:
+    rpc = get_rpc_url(chain)
+    key = (os.getpid(), chain, rpc)
+    w3 = _web3_clients.get(key)
+    if w3 is None:
+        w3 = Web3(Web3.HTTPProvider(rpc, session=get_session(chain)))
+        # some chains (BSC, etc) require PoA middleware
+        if chain == "bsc":
+            w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        _web3_clients[key] = w3
     return w3
 
 
@@ -64,10 +210,7 @@ def get_token_contract(w3: Web3, token_address: str):
 
 
 def get_token_decimals(chain: str) -> int:
-    w3 = get_web3(chain)
-    contract_addr = USDT_CONTRACTS.get(chain)
-    contract = get_token_contract(w3, contract_addr)
-    return contract.functions.decimals().call()
+    return get_token_metadata(chain)["decimals"]
 
 
 def raw_to_human(amount_raw: int, decimals: int) -> Decimal:
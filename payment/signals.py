@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import UserBalance, Deposit
+from django.db import transaction
+from .models import UserBalance, Deposit, DepositAddress, PlatformWallet, WithdrawalRequest, P2PTransfer
+from .ledger import post_credit
+from .summary import invalidate_balance_summary
+from . import address_pool, rollups, withdrawal_feed
+from .address_index import loaded_index
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -17,7 +22,54 @@ def create_user_balance(sender, instance, created, **kwargs):
 def credit_on_confirm(sender, instance: Deposit, created, **kwargs):
     # when a deposit becomes confirmed and not yet credited, credit the user's balance
     if instance.status == 'confirmed' and not instance.credited:
-        ub, _ = UserBalance.objects.get_or_create(user=instance.user)
-        ub.credit(instance.amount, note=f"Deposit {instance.tx_hash}", reference=instance.tx_hash)
+        with transaction.atomic():
+            # claim the credit first so two concurrent saves can't both credit it
+            claimed = Deposit.objects.filter(pk=instance.pk, credited=False).update(credited=True)
+            if claimed:
+                post_credit(instance.user_id, instance.amount, note=f"Deposit {instance.tx_hash}", reference=instance.tx_hash)
+                rollups.record([(instance.user_id, "deposit", instance.amount)])
         instance.credited = True
-        instance.save(update_fields=['credited'])
\ No newline at end of file
+
+
+@receiver([post_save, post_delete], sender=UserBalance)
+@receiver([post_save, post_delete], sender=Deposit)
+@receiver([post_save, post_delete], sender=WithdrawalRequest)
+def invalidate_summary(sender, instance, **kwargs):
+    invalidate_balance_summary(instance.user_id)
+
+
+@receiver(post_delete, sender=WithdrawalRequest)
+def drop_deleted_from_feed(sender, instance, **kwargs):
+    if instance.status == "sent":
+        withdrawal_feed.invalidate()
+
+
+@receiver([post_save, post_delete], sender=P2PTransfer)
+def invalidate_summary_on_p2p(sender, instance, **kwargs):
+    invalidate_balance_summary(instance.sender_id, instance.receiver_id)
+
+
+@receiver(post_save, sender=DepositAddress)
+def index_deposit_address(sender, instance, **kwargs):
+    index = loaded_index(instance.platform_wallet.chain)
+    if index is not None:
+        transaction.on_commit(lambda: index.add(instance))
+
+
+@receiver(post_delete, sender=DepositAddress)
+def unindex_deposit_address(sender, instance, **kwargs):
+    index = loaded_index(instance.platform_wallet.chain)
+    if index is not None:
+        pk = instance.pk  # the deletion collector clears instance.pk before the commit
+        transaction.on_commit(lambda: index.discard(pk))
+
+
+@receiver(post_save, sender=PlatformWallet)
+def create_derivation_sequence(sender, instance, created, **kwargs):
+    if created:
+        address_pool.create_sequence(instance)
+
+
+@receiver(post_delete, sender=PlatformWallet)
+def drop_derivation_sequence(sender, instance, **kwargs):
+    address_pool.drop_sequence(instance.pk)
@@ -0,0 +1,117 @@
+# payment/statements.py
+"""
+Streaming account statements.
+
+Ledger transactions, deposits, withdrawals and P2P transfers are read through
+server-side cursors (QuerySet.iterator) in created_at order and merged into a
+single chronological stream, so exporting a statement keeps memory flat no
+matter how many rows it has.
+"""
+import csv
+import heapq
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Transaction, Deposit, WithdrawalRequest, P2PTransfer
+
+STATEMENT_COLUMNS = ["created_at", "source", "id", "kind", "amount", "status", "reference", "note"]
+STATEMENT_FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 2000
+
+
+def period_bounds(start_date=None, end_date=None):
+    """Turn an inclusive date range into aware datetimes [start, end)."""
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(start_date, time.min, tzinfo=tz) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz) if end_date else None
+    return start, end
+
+
+def _in_period(queryset, start, end):
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by("created_at", "pk")
+
+
+def _stream(queryset, fields, to_row, chunk_size):
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield to_row(*values)
+
+
+def statement_rows(user, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Yield statement rows (dicts keyed by STATEMENT_COLUMNS) oldest first."""
+    transactions = _stream(
+        _in_period(Transaction.objects.filter(user=user), start, end),
+        ["created_at", "id", "kind", "amount", "reference", "note"],
+        lambda created_at, pk, kind, amount, reference, note: {
+            "created_at": created_at, "source": "transaction", "id": pk, "kind": kind,
+            "amount": amount, "status": "", "reference": reference or "", "note": note or "",
+        },
+        chunk_size,
+    )
+    deposits = _stream(
+        _in_period(Deposit.objects.filter(user=user), start, end),
+        ["created_at", "id", "amount", "status", "tx_hash"],
+        lambda created_at, pk, amount, status, tx_hash: {
+            "created_at": created_at, "source": "deposit", "id": pk, "kind": "credit",
+            "amount": amount, "status": status, "reference": tx_hash, "note": "",
+        },
+        chunk_size,
+    )
+    withdrawals = _stream(
+        _in_period(WithdrawalRequest.objects.filter(user=user), start, end),
+        ["created_at", "id", "amount", "status", "tx_hash", "to_address"],
+        lambda created_at, pk, amount, status, tx_hash, to_address: {
+            "created_at": created_at, "source": "withdrawal", "id": pk, "kind": "debit",
+            "amount": amount, "status": status, "reference": tx_hash or "", "note": f"To {to_address}",
+        },
+        chunk_size,
+    )
+    sent = _stream(
+        _in_period(P2PTransfer.objects.filter(sender=user), start, end),
+        ["created_at", "id", "amount", "receiver__email"],
+        lambda created_at, pk, amount, email: {
+            "created_at": created_at, "source": "p2p", "id": pk, "kind": "debit",
+            "amount": amount, "status": "", "reference": "", "note": f"Sent to {email}",
+        },
+        chunk_size,
+    )
+    received = _stream(
+        _in_period(P2PTransfer.objects.filter(receiver=user), start, end),
+        ["created_at", "id", "amount", "sender__email"],
+        lambda created_at, pk, amount, email: {
+            "created_at": created_at, "source": "p2p", "id": pk, "kind": "credit",
+            "amount": amount, "status": "", "reference": "", "note": f"Received from {email}",
+        },
+        chunk_size,
+    )
+    yield from heapq.merge(transactions, deposits, withdrawals, sent, received, key=lambda row: row["created_at"])
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(STATEMENT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([row["created_at"].isoformat()] + [row[c] for c in STATEMENT_COLUMNS[1:]])
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(row, created_at=row["created_at"].isoformat()), default=str) + "\n"
+
+
+def render_statement(rows, fmt):
+    if fmt not in STATEMENT_FORMATS:
+        raise ValueError(f"Unknown statement format {fmt!r}")
+    return render_csv(rows) if fmt == "csv" else render_ndjson(rows)
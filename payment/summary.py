@@ -0,0 +1,84 @@
+# payment/summary.py
+"""
+Per-user balance summary shared by the dashboard, withdraw and transfer pages.
+
+The summary is computed with one query (correlated subqueries on the user row)
+and cached per user. Ledger writes and status changes on deposits, withdrawals
+and P2P transfers invalidate the cached copy, together with the user's
+balance cache tag (crownbridge_project.caching), so a page view normally
+costs no queries for these figures however long the user's history is.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from crownbridge_project import caching
+
+from .models import UserBalance, Deposit, WithdrawalRequest, P2PTransfer
+
+BalanceSummary = namedtuple(
+    "BalanceSummary", ["balance", "total_deposited", "total_withdrawn", "total_sent", "total_received"]
+)
+
+CACHE_TIMEOUT = getattr(settings, "BALANCE_SUMMARY_CACHE_TIMEOUT", 300)
+
+
+def _cache_key(user_id):
+    return f"payment:balance-summary:{user_id}"
+
+
+def _sum_of(queryset, field, group_by="user"):
+    """Correlated SUM(field) over `queryset` as a subquery; 0 when it matches no rows."""
+    decimal = models.DecimalField(max_digits=32, decimal_places=18)
+    total = Subquery(
+        queryset.order_by().values(group_by).annotate(total=Sum(field)).values("total")[:1],
+        output_field=decimal,
+    )
+    return Coalesce(total, Value(Decimal("0")), output_field=decimal)
+
+
+def compute_balance_summary(user_id) -> BalanceSummary:
+    """Read every figure of the summary in a single query, bypassing the cache."""
+    user = OuterRef("pk")
+    row = (
+        get_user_model().objects.filter(pk=user_id)
+        .annotate(
+            s_balance=_sum_of(UserBalance.objects.filter(user=user), "balance"),
+            s_deposited=_sum_of(Deposit.objects.filter(user=user, status="confirmed"), "amount"),
+            s_withdrawn=_sum_of(WithdrawalRequest.objects.filter(user=user, status="sent"), "amount"),
+            s_sent=_sum_of(P2PTransfer.objects.filter(sender=user), "amount", "sender"),
+            s_received=_sum_of(P2PTransfer.objects.filter(receiver=user), "amount", "receiver"),
+        )
+        .values_list("s_balance", "s_deposited", "s_withdrawn", "s_sent", "s_received")
+        .first()
+    )
+    return BalanceSummary(*(row or (Decimal("0"),) * 5))
+
+
+def get_balance_summary(user) -> BalanceSummary:
+    user_id = getattr(user, "pk", user)
+    key = _cache_key(user_id)
+    summary = cache.get(key)
+    caching.count("balance-summary", summary is not None)
+    if summary is None:
+        summary = compute_balance_summary(user_id)
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_balance_summary(*user_ids):
+    """
+    Drop the cached summaries of `user_ids` once the surrounding transaction
+    commits (immediately when there is none), so readers never re-cache a
+    value from before the write.
+    """
+    user_ids = [uid for uid in user_ids if uid is not None]
+    keys = [_cache_key(uid) for uid in user_ids] + [caching.TAG_PREFIX + caching.balance_tag(uid) for uid in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
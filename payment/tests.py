@@ -1,3 +1,491 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from users.models import CustomUser
+from . import address_pool, approvals, confirmations, hd_wallet, idempotency, ledger, payouts, withdrawal_states
+from .forms import WithdrawalRequestForm
+from .pagination import keyset_paginate
+from .models import (
+    Deposit, DepositAddress, IdempotencyKey, P2PTransfer, PayoutNonce, PlatformWallet, Transaction, UserBalance, WithdrawalRequest,
+)
+
+
+def make_user(email, balance=None):
+    user = CustomUser.objects.create_user(email=email, password="x")
+    if balance:
+        ledger.post_credit(user, balance, note="Opening balance")
+    return user
+
+
+def balance_of(user):
+    return UserBalance.objects.get(user=user).balance
+
+
+class LedgerPostTests(TestCase):
+    def setUp(self):
+        self.user = make_user("ledger@example.com")
+
+    def test_credit_and_debit_return_the_new_balance(self):
+        self.assertEqual(ledger.post_credit(self.user, "100"), Decimal("100"))
+        self.assertEqual(ledger.post_debit(self.user, "40", note="Fee", reference="fee:1"), Decimal("60"))
+        self.assertEqual(balance_of(self.user), Decimal("60"))
+        debit = Transaction.objects.get(user=self.user, kind="debit")
+        self.assertEqual((debit.amount, debit.note, debit.reference), (Decimal("40"), "Fee", "fee:1"))
+
+    def test_credit_creates_a_missing_balance_row(self):
+        UserBalance.objects.filter(user=self.user).delete()
+        self.assertEqual(ledger.post_credit(self.user.pk, "5"), Decimal("5"))
+        self.assertEqual(balance_of(self.user), Decimal("5"))
+
+    def test_debit_beyond_the_balance_writes_nothing(self):
+        ledger.post_credit(self.user, "10")
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post_debit(self.user, "10.01")
+        self.assertEqual(balance_of(self.user), Decimal("10"))
+        self.assertFalse(Transaction.objects.filter(user=self.user, kind="debit").exists())
+
+    def test_rejects_non_positive_amounts_and_unknown_kinds(self):
+        with self.assertRaises(ValueError):
+            ledger.post_credit(self.user, "0")
+        with self.assertRaises(ValueError):
+            ledger.post(self.user, "1", "refund")
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+
+class LedgerBatchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com", "50")
+        self.bob = make_user("bob@example.com")
+
+    def test_moves_each_balance_by_its_net_amount(self):
+        result = ledger.post_batch([
+            ledger.LedgerEntry(self.alice, "20", "debit", reference="batch:1"),
+            ledger.LedgerEntry(self.bob, "20", "credit", reference="batch:1"),
+            ledger.LedgerEntry(self.bob, "5", "debit", reference="batch:2"),
+        ])
+        self.assertEqual(len(result.posted), 3)
+        self.assertEqual(result.rejected, [])
+        self.assertEqual(balance_of(self.alice), Decimal("30"))
+        self.assertEqual(balance_of(self.bob), Decimal("15"))
+        self.assertEqual(Transaction.objects.filter(reference__startswith="batch:").count(), 3)
+
+    def test_debits_are_checked_against_the_running_balance(self):
+        # the credit comes first, so it funds the debit that follows it
+        ledger.post_batch([
+            ledger.LedgerEntry(self.bob, "10", "credit"),
+            ledger.LedgerEntry(self.bob, "10", "debit"),
+        ])
+        self.assertEqual(balance_of(self.bob), Decimal("0"))
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post_batch([
+                ledger.LedgerEntry(self.bob, "10", "debit"),
+                ledger.LedgerEntry(self.bob, "10", "credit"),
+            ])
+
+    def test_an_uncovered_debit_fails_the_whole_batch(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post_batch([
+                ledger.LedgerEntry(self.bob, "1", "credit", reference="all-or-nothing"),
+                ledger.LedgerEntry(self.alice, "50.01", "debit", reference="all-or-nothing"),
+            ])
+        self.assertEqual(balance_of(self.alice), Decimal("50"))
+        self.assertEqual(balance_of(self.bob), Decimal("0"))
+        self.assertFalse(Transaction.objects.filter(reference="all-or-nothing").exists())
+
+    def test_partial_posts_the_rest_and_reports_the_rejected(self):
+        too_much = ledger.LedgerEntry(self.alice, "40", "debit", reference="second")
+        result = ledger.post_batch([
+            ledger.LedgerEntry(self.alice, "30", "debit", reference="first"),
+            too_much,
+            ledger.LedgerEntry(self.alice, "20", "debit", reference="third"),
+        ], partial=True)
+        self.assertEqual([e.reference for e in result.posted], ["first", "third"])
+        self.assertEqual(result.rejected, [too_much._replace(user=self.alice.pk, amount=Decimal("40"))])
+        self.assertEqual(balance_of(self.alice), Decimal("0"))
+        self.assertFalse(Transaction.objects.filter(reference="second").exists())
+
+    def test_rejects_non_positive_amounts_before_writing(self):
+        with self.assertRaises(ValueError):
+            ledger.post_batch([
+                ledger.LedgerEntry(self.bob, "1", "credit"),
+                ledger.LedgerEntry(self.bob, "-1", "credit"),
+            ])
+        self.assertEqual(balance_of(self.bob), Decimal("0"))
+
+    def test_empty_batch(self):
+        self.assertEqual(ledger.post_batch([]), ledger.BatchResult([], []))
+
+
+def make_deposit(user, amount, tx_hash, **fields):
+    fields = {"block_number": 1, "confirmations": confirmations.REQUIRED_CONFIRMATIONS, **fields}
+    return Deposit.objects.create(user=user, amount=Decimal(amount), tx_hash=tx_hash, **fields)
+
+
+class ConfirmationTests(TestCase):
+    def setUp(self):
+        self.user = make_user("depositor@example.com")
+
+    def test_confirms_and_credits_each_deposit_once(self):
+        make_deposit(self.user, "25", "0xaaa")
+        make_deposit(self.user, "75", "0xbbb")
+        stats = confirmations.run(chunk_size=1)
+        self.assertEqual((stats.deposits, stats.chunks), (2, 2))
+        self.assertEqual(confirmations.run().deposits, 0)
+        self.assertEqual(balance_of(self.user), Decimal("100"))
+        self.assertEqual(Transaction.objects.filter(user=self.user, reference__in=["0xaaa", "0xbbb"]).count(), 2)
+        self.assertFalse(Deposit.objects.exclude(status="confirmed", credited=True).exists())
+
+    def test_skips_deposits_still_waiting_for_depth(self):
+        make_deposit(self.user, "10", "0xshallow", block_number=100, confirmations=0)
+        self.assertEqual(confirmations.confirm_chunk().deposits, 0)
+        Deposit.objects.filter(tx_hash="0xshallow").update(confirmations=12)
+        self.assertEqual(confirmations.confirm_chunk().deposits, 1)
+
+
+    def test_never_credits_intent_rows_without_a_block(self):
+        make_deposit(self.user, "10", "intent_abc", block_number=None, confirmations=0)
+        self.assertEqual(confirmations.run().deposits, 0)
+        # the scanner's row for the actual transfer is the one credited
+        make_deposit(self.user, "10", "0xreal", block_number=7)
+        self.assertEqual(confirmations.run().deposits, 1)
+        self.assertEqual(balance_of(self.user), Decimal("10"))
+
+
+class ConcurrentConfirmationTests(TransactionTestCase):
+    def setUp(self):
+        self.user = make_user("racer@example.com")
+        self.deposits = [make_deposit(self.user, "1", f"0x{i:03x}") for i in range(40)]
+
+    def test_a_deposit_locked_by_another_worker_is_skipped(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    Deposit.objects.select_for_update().get(pk=self.deposits[0].pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(confirmations.confirm_chunk().deposits, 39)
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(confirmations.confirm_chunk().deposits, 1)
+        self.assertEqual(balance_of(self.user), Decimal("40"))
+
+    def test_parallel_workers_credit_every_deposit_exactly_once(self):
+        def work():
+            try:
+                confirmations.run(chunk_size=5)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        credits = Transaction.objects.filter(user=self.user, kind="credit").values_list("reference", flat=True)
+        self.assertCountEqual(credits, [d.tx_hash for d in self.deposits])
+        self.assertEqual(balance_of(self.user), Decimal("40"))
+
+
+ETH_ADDRESS = "0x" + "ab" * 20
+
+
+def make_withdrawal(user, amount="10", status="approved", chain="ethereum", to_address=ETH_ADDRESS):
+    return WithdrawalRequest.objects.create(
+        user=user, amount=Decimal(amount), status=status, chain=chain, to_address=to_address
+    )
+
+
+class BrokenSender:
+    def send(self, chain, payouts):
+        raise ConnectionError("node unreachable")
+
+
+class PayoutTests(TestCase):
+    def setUp(self):
+        self.user = make_user("payee@example.com")
+        self.sender = payouts.FakeChainSender(latency=0)
+
+    def test_claims_each_approved_withdrawal_once(self):
+        for _ in range(3):
+            make_withdrawal(self.user)
+        make_withdrawal(self.user, status="pending")
+        batch = payouts.claim_batch("ethereum", batch_size=2)
+        self.assertEqual([w.nonce for w in batch], [0, 1])
+        self.assertEqual(sorted(WithdrawalRequest.objects.filter(status="processing").values_list("nonce", flat=True)), [0, 1])
+        self.assertEqual(len(payouts.claim_batch("ethereum")), 1)
+        self.assertEqual(payouts.claim_batch("ethereum"), [])
+        self.assertEqual(WithdrawalRequest.objects.filter(status="processing").count(), 3)
+
+    def test_sends_valid_payouts_and_fails_invalid_addresses(self):
+        good = make_withdrawal(self.user)
+        bad = make_withdrawal(self.user, to_address="0x123")
+        sent, failed = payouts.send_batch("ethereum", payouts.claim_batch("ethereum"), self.sender)
+        self.assertEqual(([w.pk for w in sent], [w.pk for w in failed]), ([good.pk], [bad.pk]))
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.status, good.nonce), ("sent", 0))
+        self.assertTrue(good.tx_hash.startswith("0x"))
+        self.assertEqual((bad.status, bad.nonce, bad.tx_hash, bad.refunded), ("failed", None, None, True))
+        self.assertIn("invalid ethereum address", bad.admin_note)
+        self.assertEqual(balance_of(self.user), Decimal("10"))
+        # an invalid address never takes a nonce
+        self.assertEqual(PayoutNonce.objects.get(chain="ethereum").next_nonce, 1)
+
+    def test_validates_addresses_per_chain(self):
+        self.assertTrue(payouts.valid_address("tron", "T" + "A" * 33))
+        self.assertFalse(payouts.valid_address("tron", ETH_ADDRESS))
+        self.assertFalse(payouts.valid_address("dogecoin", ETH_ADDRESS))
+        form = WithdrawalRequestForm({"amount": "10", "chain": "bsc", "to_address": "T" + "A" * 33})
+        self.assertFalse(form.is_valid())
+        self.assertIn("to_address", form.errors)
+        self.assertTrue(WithdrawalRequestForm({"amount": "10", "chain": "bsc", "to_address": ETH_ADDRESS}).is_valid())
+
+    def test_a_sender_error_fails_the_batch_and_releases_its_nonces(self):
+        for _ in range(2):
+            make_withdrawal(self.user)
+        with self.assertLogs("payment.payouts", "ERROR"):
+            sent, failed = payouts.send_batch("ethereum", payouts.claim_batch("ethereum"), BrokenSender())
+        self.assertEqual((len(sent), len(failed)), (0, 2))
+        self.assertFalse(WithdrawalRequest.objects.exclude(status="failed").exists())
+        self.assertIn("node unreachable", WithdrawalRequest.objects.first().admin_note)
+        self.assertEqual(balance_of(self.user), Decimal("20"))
+        self.assertCountEqual(PayoutNonce.objects.get(chain="ethereum").released, [0, 1])
+
+        retry = make_withdrawal(self.user)
+        payouts.send_batch("ethereum", payouts.claim_batch("ethereum"), self.sender)
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.nonce), ("sent", 0))
+        self.assertEqual(PayoutNonce.objects.get(chain="ethereum").released, [1])
+
+    def test_finish_leaves_a_withdrawal_that_moved_on(self):
+        w = make_withdrawal(self.user)
+        batch = payouts.claim_batch("ethereum")
+        self.assertTrue(withdrawal_states.transition(WithdrawalRequest.objects.get(pk=w.pk), "failed"))
+        with self.assertLogs("payment.payouts", "ERROR"):
+            sent, failed = payouts.finish_batch(batch, [payouts.SendResult(w.pk, tx_hash="0xfeed")])
+        self.assertEqual((sent, failed), ([], []))
+        w.refresh_from_db()
+        self.assertEqual((w.status, w.tx_hash), ("failed", None))
+
+    def test_stale_processing_rows_are_failed_and_release_their_nonces(self):
+        stale, fresh = make_withdrawal(self.user), make_withdrawal(self.user)
+        payouts.claim_batch("ethereum")
+        WithdrawalRequest.objects.filter(pk=stale.pk).update(processed_at=timezone.now() - timedelta(hours=1))
+        nonce = WithdrawalRequest.objects.get(pk=stale.pk).nonce
+        with self.assertLogs("payment.payouts", "WARNING"):
+            self.assertEqual(payouts.sweep_stale(lease=600), {stale.pk})
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.nonce, stale.refunded), ("failed", None, False))
+        self.assertEqual(WithdrawalRequest.objects.get(pk=fresh.pk).status, "processing")
+        self.assertEqual(PayoutNonce.objects.get(chain="ethereum").released, [nonce])
+        # an operator refunds it once the chain shows it was never sent
+        self.assertEqual(len(payouts.refund([stale.pk, fresh.pk])), 1)
+        self.assertEqual(payouts.refund([stale.pk]), [])
+        self.assertEqual(balance_of(self.user), Decimal("10"))
+
+    def test_run_drains_every_chain(self):
+        make_withdrawal(self.user, chain="ethereum")
+        make_withdrawal(self.user, chain="tron", to_address="T" + "B" * 33)
+        stats = payouts.run(batch_size=10, sender=self.sender)
+        self.assertEqual((stats.sent, stats.failed), (2, 0))
+        self.assertFalse(WithdrawalRequest.objects.exclude(status="sent").exists())
+
+
+class WithdrawalTransitionTests(TestCase):
+    def setUp(self):
+        self.user = make_user("transitions@example.com")
+        self.withdrawal = make_withdrawal(self.user, status="pending")
+
+    def test_a_stale_copy_loses_and_is_left_untouched(self):
+        first = WithdrawalRequest.objects.get(pk=self.withdrawal.pk)
+        second = WithdrawalRequest.objects.get(pk=self.withdrawal.pk)
+        self.assertTrue(withdrawal_states.transition(first, "approved", admin_note="ok"))
+        self.assertFalse(withdrawal_states.transition(second, "rejected", admin_note="no"))
+        self.assertEqual((first.status, first.version), ("approved", 1))
+        self.assertEqual((second.status, second.version, second.admin_note), ("pending", 0, None))
+        self.withdrawal.refresh_from_db()
+        self.assertEqual((self.withdrawal.status, self.withdrawal.version, self.withdrawal.admin_note), ("approved", 1, "ok"))
+
+    def test_transition_many_only_changes_rows_still_at_the_read_version(self):
+        other = make_withdrawal(self.user, status="pending")
+        stale = (self.withdrawal.pk, self.withdrawal.version)
+        self.assertTrue(withdrawal_states.transition(self.withdrawal, "rejected"))
+        changed = withdrawal_states.transition_many(
+            [stale + ("bulk",), (other.pk, other.version, "bulk")], "pending", "approved",
+            columns=["note::text"], assignments=["admin_note = v.note"],
+        )
+        self.assertEqual(changed, {other.pk})
+        self.assertEqual(WithdrawalRequest.objects.get(pk=self.withdrawal.pk).status, "rejected")
+        other.refresh_from_db()
+        self.assertEqual((other.status, other.version, other.admin_note), ("approved", 1, "bulk"))
+
+    def test_disallowed_transitions_raise(self):
+        with self.assertRaises(withdrawal_states.InvalidTransition):
+            withdrawal_states.transition(self.withdrawal, "sent")
+        with self.assertRaises(withdrawal_states.InvalidTransition):
+            withdrawal_states.transition_many([(self.withdrawal.pk, 0)], "sent", "pending")
+        self.withdrawal.refresh_from_db()
+        self.assertEqual((self.withdrawal.status, self.withdrawal.version), ("pending", 0))
+
+
+class KeysetPaginationTests(TestCase):
+    def test_walks_rows_with_equal_timestamps_both_ways(self):
+        user = make_user("pages@example.com")
+        now = timezone.now()
+        Transaction.objects.bulk_create(
+            Transaction(user=user, amount=1, kind="credit", created_at=now - timedelta(seconds=i // 2)) for i in range(5)
+        )
+        queryset = Transaction.objects.filter(user=user)
+        expected = list(queryset.order_by("-created_at", "-pk"))
+        pages = [keyset_paginate(queryset, {}, per_page=2)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(queryset, {"after": pages[-1].next_cursor}, per_page=2))
+        self.assertEqual([t for page in pages for t in page], expected)
+        back = keyset_paginate(queryset, {"before": pages[-1].previous_cursor}, per_page=2)
+        self.assertEqual(list(back), list(pages[-2]))
+
+
+class P2PTransferTests(TestCase):
+    def test_moves_funds_and_records_the_transfer(self):
+        alice, bob = make_user("p2p-a@example.com", "30"), make_user("p2p-b@example.com")
+        record = ledger.p2p_transfer(alice, bob, Decimal("12.50"))
+        self.assertEqual((record.sender_id, record.receiver_id, record.amount), (alice.pk, bob.pk, Decimal("12.50")))
+        self.assertEqual((balance_of(alice), balance_of(bob)), (Decimal("17.5"), Decimal("12.5")))
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.p2p_transfer(alice, bob, Decimal("100"))
+        self.assertEqual(P2PTransfer.objects.count(), 1)
+
+
+class ApprovalTests(TestCase):
+    def setUp(self):
+        self.user = make_user("approvals@example.com", "15")
+
+    def test_approves_what_the_balance_covers_and_leaves_the_rest_untouched(self):
+        first = make_withdrawal(self.user, "10", status="pending")
+        second = make_withdrawal(self.user, "10", status="pending")
+        third = make_withdrawal(self.user, "5", status="pending")
+        result = approvals.approve_withdrawals([first.pk, second.pk, third.pk], approved_by="staff")
+        self.assertCountEqual([w.pk for w in result.approved], [first.pk, third.pk])
+        self.assertEqual([(r.withdrawal_id, r.reason) for r in result.rejected], [(second.pk, "insufficient balance")])
+        self.assertEqual(balance_of(self.user), Decimal("0"))
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.version, second.admin_note), ("pending", 0, None))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.version), ("approved", 1))
+        self.assertIn("Approved by staff", first.admin_note)
+
+    def test_rows_changed_since_they_were_read_are_not_debited(self):
+        withdrawal = make_withdrawal(self.user, "10", status="pending")
+        self.assertTrue(withdrawal_states.transition(WithdrawalRequest.objects.get(pk=withdrawal.pk), "rejected"))
+        result = approvals.approve_withdrawals([withdrawal.pk])
+        self.assertEqual([(r.withdrawal_id, r.reason) for r in result.rejected], [(withdrawal.pk, "not pending")])
+        self.assertEqual(balance_of(self.user), Decimal("15"))
+
+
+class HDWalletTests(TestCase):
+    # BIP32 test vector 1: m/0H and m/0H/1
+    VECTOR_M_0H = "xpub68Gmy5EdvgibQVfPdqkBBCHxA5htiqg55crXYuXoQRKfDBFA1WEjWgP6LHhwBZeNK1VTsfTFUHCdrfp1bgwQ9xv5ski8PX9rL2dZXvgGDnw"
+    VECTOR_M_0H_1 = "xpub6ASuArnXKPbfEwhqN6e3mwBcDTgzisQN1wXN9BJcM47sSikHjJf3UFHKkNAWbWMiGj7Wf5uMash7SyYq527Hqck2AxYysAA7xmALppuCkwQ"
+    # m/44'/60'/0' of the BIP39 mnemonic "abandon x11 about"
+    ACCOUNT_XPUB = "xpub6DCoCpSuQZB2jawqnGMEPS63ePKWkwWPH4TU45Q7LPXWuNd8TMtVxRrgjtEshuqpK3mdhaWHPFsBngh5GFZaM6si3yZdUsT8ddYM3PwnATt"
+
+    def test_public_derivation_matches_the_bip32_vector(self):
+        self.assertEqual(hd_wallet.branch_node(self.VECTOR_M_0H, 1).PublicKey().ToExtended(), self.VECTOR_M_0H_1)
+
+    def test_derives_checksummed_eth_addresses(self):
+        self.assertEqual(
+            hd_wallet.derive_eth_address_from_xpub(self.ACCOUNT_XPUB, 0),
+            ("0x9858EfFD232B4033E47d90003D41EC34EcaEda94", 0),
+        )
+
+    def test_rejects_hardened_indexes_and_bad_keys(self):
+        with self.assertRaises(ValueError):
+            hd_wallet.derive_eth_addresses(self.ACCOUNT_XPUB, [hd_wallet.HARDENED])
+        with self.assertRaises(ValueError):
+            hd_wallet.derive_eth_addresses(self.ACCOUNT_XPUB[:-1] + "u", [0])
+
+
+class AddressPoolTests(TestCase):
+    def setUp(self):
+        self.wallet = PlatformWallet.objects.create(name="Tron", chain="tron")
+
+    def test_new_wallets_get_their_index_sequence(self):
+        self.assertEqual(address_pool.allocate_indexes(self.wallet, 3), [0, 1, 2])
+        self.assertEqual(address_pool.fill_pool(self.wallet, size=2), 2)
+        self.assertEqual(sorted(DepositAddress.objects.values_list("derivation_index", flat=True)), [3, 4])
+
+    def test_assigns_one_pooled_address_per_user(self):
+        address_pool.fill_pool(self.wallet, size=2)
+        user = make_user("pool@example.com")
+        first = address_pool.assign_deposit_address(user, self.wallet)
+        self.assertEqual(first.derivation_index, 0)
+        self.assertEqual(address_pool.assign_deposit_address(user, self.wallet).pk, first.pk)
+        self.assertEqual(address_pool.spare_count(self.wallet), 1)
+
+    def test_only_the_user_wallet_conflict_is_swallowed(self):
+        user = make_user("dup@example.com")
+        DepositAddress.objects.create(user=user, platform_wallet=self.wallet, address="x", derivation_index=0)
+        with self.assertRaises(IntegrityError) as raised, transaction.atomic():
+            DepositAddress.objects.create(user=user, platform_wallet=self.wallet)
+        self.assertTrue(address_pool._is_user_wallet_conflict(raised.exception))
+        with self.assertRaises(IntegrityError) as raised, transaction.atomic():
+            DepositAddress.objects.create(platform_wallet=self.wallet, derivation_index=0)
+        self.assertFalse(address_pool._is_user_wallet_conflict(raised.exception))
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = make_user("idem@example.com")
+        self.calls = 0
+
+        @idempotency.idempotent
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f"run {self.calls}", status=201)
+
+        self.view = view
+
+    def post(self, key="k1"):
+        request = RequestFactory().post("/pay/", {"idempotency_key": key})
+        request.user = self.user
+        return self.view(request)
+
+    def leave_in_progress(self, age):
+        return IdempotencyKey.objects.create(
+            user=self.user, key="k1", path="/pay/", claimed_at=timezone.now() - timedelta(seconds=age),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def test_retries_replay_the_first_response(self):
+        self.assertEqual(self.post().content, b"run 1")
+        replay = self.post()
+        self.assertEqual((replay.status_code, replay.content, replay["Idempotent-Replayed"]), (201, b"run 1", "true"))
+        self.assertEqual(self.calls, 1)
+
+    def test_a_claim_past_its_lease_is_taken_over(self):
+        self.leave_in_progress(idempotency.CLAIM_LEASE + 1)
+        self.assertEqual(self.post().content, b"run 1")
+        self.assertEqual(IdempotencyKey.objects.get(key="k1").status, "completed")
+
+    def test_a_live_claim_is_not_taken_over(self):
+        self.leave_in_progress(0)
+        with mock.patch.object(idempotency, "WAIT_TIMEOUT", 0):
+            self.assertEqual(self.post().status_code, 409)
+        self.assertEqual(self.calls, 0)
@@ -9,6 +9,7 @@ urlpatterns = [
     path("withdraw/history/", views.withdrawal_history, name="withdrawals"),
     # Staff endpoints
     path("admin/withdrawals/pending/", views.pending_withdrawals, name="admin_pending_withdrawals"),
+    path("admin/withdrawals/approve/", views.approve_selected_withdrawals, name="approve_selected_withdrawals"),
     path("admin/withdrawals/<uuid:wid>/approve/", views.approve_withdrawal, name="approve_withdrawal"),
     path("admin/withdrawals/<uuid:wid>/decline/", views.decline_withdrawal, name="decline_withdrawal"),
     path("withdraw/<uuid:wid>/pay/", views.withdrawal_payment_page, name="withdrawal_payment_page"),
@@ -21,6 +22,7 @@ urlpatterns = [
     # Transfers
     path('transfer/', views.transfer_page, name='transfer'),
     path('transfer/history/', views.transfer_history, name='transfer_history'),
+    path('statement/export/', views.statement_export, name='statement_export'),
     path("p2ptransfer/", views.p2p_transfer_view, name="p2ptransfer")
 
 ]
@@ -1,41 +1,44 @@
 # payment/views.py
 from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import StreamingHttpResponse, HttpResponseBadRequest
+from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.urls import reverse
 from django.utils import timezone
 from django.db import transaction
-from uuid import uuid4
+from uuid import UUID, uuid4
 from users.models import CustomUser
+from investment.projections import portfolio
 from .forms import WithdrawalRequestForm, TransferForm, DepositForm
 from .models import WithdrawalRequest, UserBalance, Transaction, Deposit, PlatformWallet, DepositAddress
+from .ledger import transfer, p2p_transfer
+from .summary import get_balance_summary
+from .pagination import keyset_paginate
+from .idempotency import idempotent
+from .address_pool import assign_deposit_address
+from .approvals import approve_withdrawals, report_approval
+from .withdrawal_states import transition
+from .statements import STATEMENT_FORMATS, period_bounds, statement_rows, render_statement
 
 # helper
 def is_staff(user):
     return user.is_staff
 
 @login_required
+@idempotent
 def withdraw_page(request):
     """
     Show withdrawal form displaying user's invested totals and profit summary.
     On POST create WithdrawalRequest with status 'pending' and notify user.
     """
-    # calculate totals (you might want to refine to separate profit vs principal)
-    # We'll compute 'total_invested' and 'total_profit' from UserInvestment if available
-    try:
-        from investment.models import UserInvestment
-        investments = UserInvestment.objects.filter(user=request.user)
-        total_invested = sum((inv.amount_invested for inv in investments), Decimal('0.00'))
-        # expected profit sum (calculated)
-        total_expected_profit = sum((inv.calculate_expected_profit() for inv in investments), Decimal('0.00'))
-    except Exception:
-        total_invested = Decimal('0.00')
-        total_expected_profit = Decimal('0.00')
+    # invested and profit totals in one query (investment.projections)
+    projection = portfolio(request.user)
 
     # user balance available for withdrawal
-    ub, _ = UserBalance.objects.get_or_create(user=request.user)
+    summary = get_balance_summary(request.user)
 
     if request.method == "POST":
         form = WithdrawalRequestForm(request.POST)
@@ -49,7 +52,7 @@ def withdraw_page(request):
                 messages.error(request, "Enter a valid amount.")
                 return redirect("payment:withdraw")
 
-            if ub.balance < amount:
+            if summary.balance < amount:
                 messages.error(request, "Insufficient balance for withdrawal.")
                 return redirect("payment:withdraw")
 
@@ -68,9 +71,11 @@ def withdraw_page(request):
 
     context = {
         "form": form,
-        "total_invested": total_invested,
-        "total_expected_profit": total_expected_profit,
-        "user_balance": ub.balance,
+        "total_invested": projection.invested,
+        "total_profit": projection.accrued_profit,
+        "total_expected_profit": projection.expected_profit,
+        "next_maturity": projection.next_maturity,
+        "user_balance": summary.balance,
     }
     return render(request, "payment/withdrawal_request.html", context)
 
@@ -83,7 +88,7 @@ def withdrawal_history(request):
     - approved: show button linking to payment page
     - rejected: show 'Declined' button linking to dashboard
     """
-    withdrawals = WithdrawalRequest.objects.filter(user=request.user).order_by("-requested_at")
+    withdrawals = keyset_paginate(WithdrawalRequest.objects.filter(user=request.user), request.GET)
     return render(request, "payment/withdrawal_history.html", {"withdrawals": withdrawals})
 
 
@@ -100,34 +105,32 @@ def pending_withdrawals(request):
 def approve_withdrawal(request, wid):
     """
     Approve a pending withdrawal: debit user's balance immediately, mark as 'approved'.
-    NOTE: Actual blockchain payout should happen in background (worker). Here we only mark.
+    NOTE: Actual blockchain payout happens in the payout engine (payment.payouts). Here we only mark.
     """
     wr = get_object_or_404(WithdrawalRequest, pk=wid)
-    if wr.status != "pending":
-        messages.error(request, "Withdrawal is not pending.")
-        return redirect("payment:admin_pending_withdrawals")
+    result = approve_withdrawals([wr.pk], approved_by=request.user)
+    if result.approved:
+        messages.success(request, f"Approved withdrawal {wr.id}. User will be paid by the payout service.")
+    else:
+        messages.error(request, f"Cannot approve withdrawal {wr.id}: {result.rejected[0].reason}.")
+    return redirect("payment:admin_pending_withdrawals")
 
-    with transaction.atomic():
-        ub, _ = UserBalance.objects.get_or_create(user=wr.user)
-        # Check balance again
-        if ub.balance < wr.amount:
-            messages.error(request, f"User {wr.user} has insufficient balance — cannot approve.")
-            return redirect("payment:admin_pending_withdrawals")
 
-        # Debit and record transaction
+@staff_member_required
+def approve_selected_withdrawals(request):
+    """
+    Approve every withdrawal ticked on the pending list in one transaction,
+    reporting the ones that could not be approved.
+    """
+    if request.method != "POST":
+        return redirect("payment:admin_pending_withdrawals")
+    ids = []
+    for value in request.POST.getlist("withdrawal"):
         try:
-            ub.debit(wr.amount, note=f"Withdrawal approved {wr.id}", reference=str(wr.id))
-        except Exception as e:
-            messages.error(request, f"Error debiting user balance: {e}")
-            return redirect("payment:admin_pending_withdrawals")
-
-        # Update withdrawal status
-        wr.status = "approved"
-        wr.processed_at = timezone.now()
-        wr.admin_note = (wr.admin_note or "") + f"\nApproved by {request.user} at {wr.processed_at}"
-        wr.save(update_fields=["status", "processed_at", "admin_note"])
-
-    messages.success(request, f"Approved withdrawal {wr.id}. User will be paid by the payout service.")
+            ids.append(UUID(value))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid withdrawal id")
+    report_approval(request, approve_withdrawals(ids, approved_by=request.user))
     return redirect("payment:admin_pending_withdrawals")
 
 
@@ -141,10 +144,14 @@ def decline_withdrawal(request, wid):
         messages.error(request, "Withdrawal is not pending.")
         return redirect("payment:admin_pending_withdrawals")
 
-    wr.status = "rejected"
-    wr.processed_at = timezone.now()
-    wr.admin_note = (wr.admin_note or "") + f"\nRejected by {request.user} at {wr.processed_at}"
-    wr.save(update_fields=["status", "processed_at", "admin_note"])
+    now = timezone.now()
+    rejected = transition(
+        wr, "rejected", processed_at=now,
+        admin_note=(wr.admin_note or "") + f"\nRejected by {request.user} at {now}",
+    )
+    if not rejected:
+        messages.error(request, "Withdrawal was changed by someone else; nothing was rejected.")
+        return redirect("payment:admin_pending_withdrawals")
 
     messages.info(request, f"Rejected withdrawal {wr.id}.")
     return redirect("payment:admin_pending_withdrawals")
@@ -171,6 +178,7 @@ def withdrawal_payment_page(request, wid):
 # Deposit flows (Intent)
 # -------------------------
 @login_required
+@idempotent
 def deposit_page(request):
     """
     Create a deposit intent (flow B).
@@ -186,10 +194,7 @@ def deposit_page(request):
 
             deposit_address = None
             if pw:
-                da, _ = DepositAddress.objects.get_or_create(user=request.user, platform_wallet=pw)
-                if not da.address:
-                    da.generate_address()
-                deposit_address = da
+                deposit_address = assign_deposit_address(request.user, pw)
 
             pseudo = f"intent_{uuid4().hex}"
             deposit = Deposit.objects.create(
@@ -228,7 +233,7 @@ def deposit_instructions(request, deposit_id):
 
 @login_required
 def deposit_history(request):
-    deposits = Deposit.objects.filter(user=request.user).order_by('-created_at')
+    deposits = keyset_paginate(Deposit.objects.filter(user=request.user).select_related('platform_wallet'), request.GET)
     return render(request, 'payment/deposit_history.html', {'deposits': deposits})
 
 
@@ -236,6 +241,7 @@ def deposit_history(request):
 # Transfers (internal)
 # -------------------------
 @login_required
+@idempotent
 def transfer_page(request):
     """
     Transfer internal balance from logged in user to another user (by email or username).
@@ -262,9 +268,8 @@ def transfer_page(request):
                 messages.error(request, 'You cannot transfer to yourself.')
                 return redirect('payment:transfer')
 
-            ub, _ = UserBalance.objects.get_or_create(user=request.user)
             try:
-                ub.transfer_to(recipient, amount, note=note)
+                transfer(request.user, recipient, amount, note=note, received_note=f"Received transfer from {request.user}")
             except ValueError as e:
                 messages.error(request, str(e))
                 return redirect('payment:transfer')
@@ -274,33 +279,55 @@ def transfer_page(request):
     else:
         form = TransferForm()
 
-    user_balance = None
-    try:
-        ub, _ = UserBalance.objects.get_or_create(user=request.user)
-        user_balance = ub.balance
-    except Exception:
-        user_balance = Decimal('0.0')
+    user_balance = get_balance_summary(request.user).balance
 
     return render(request, 'payment/transfer_page.html', {'form': form, 'user_balance': user_balance})
 
 
 @login_required
 def transfer_history(request):
-    txs = Transaction.objects.filter(user=request.user).order_by('-created_at')
+    txs = keyset_paginate(Transaction.objects.filter(user=request.user), request.GET)
     return render(request, 'payment/transfer_history.html', {'transactions': txs})
 
 
+@login_required
+def statement_export(request):
+    """
+    Stream the user's statement as CSV or NDJSON.
+    Query params: format=csv|ndjson, start=YYYY-MM-DD, end=YYYY-MM-DD (both inclusive, optional).
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in STATEMENT_FORMATS:
+        return HttpResponseBadRequest("Unknown statement format.")
+    start_param, end_param = request.GET.get('start'), request.GET.get('end')
+    try:
+        start_date = parse_date(start_param) if start_param else None
+        end_date = parse_date(end_param) if end_param else None
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD.")
+    # parse_date returns None for input that isn't YYYY-MM-DD at all
+    if (start_param and start_date is None) or (end_param and end_date is None):
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD.")
+
+    start, end = period_bounds(start_date, end_date)
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        render_statement(statement_rows(request.user, start, end), fmt), content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="statement.{fmt}"'
+    return response
+
+
 
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 
-from .models import P2PTransfer, Deposit
 from .forms import P2PTransferForm
 from users.models import CustomUser
-from django.db import models
 
 @login_required
+@idempotent
 def p2p_transfer_view(request):
     user = request.user
 
@@ -321,27 +348,22 @@ def p2p_transfer_view(request):
                 messages.error(request, "You cannot send money to yourself.")
                 return redirect("payment:transfer")
 
-            # Calculate sender’s available balance
-            total_deposit = Deposit.objects.filter(user=user, status="confirmed").aggregate(models.Sum("amount"))["amount__sum"] or 0
-            total_withdrawn = 0  # withdrawals already deducted before
-            total_sent = P2PTransfer.objects.filter(sender=user).aggregate(models.Sum("amount"))["amount__sum"] or 0
-            total_received = P2PTransfer.objects.filter(receiver=user).aggregate(models.Sum("amount"))["amount__sum"] or 0
-
-            available_balance = (total_deposit + total_received) - (total_sent + total_withdrawn)
-
-            if amount > available_balance:
+            # Sender's available balance comes from the ledger like every other page
+            if amount > get_balance_summary(user).balance:
                 messages.error(request, "Insufficient balance.")
                 return redirect("payment:transfer")
 
-            # Record transfer
-            P2PTransfer.objects.create(
-                sender=user,
-                receiver=receiver,
-                amount=amount
-            )
+            # Move the funds and record the transfer together, outside any outer
+            # transaction so a deadlock or serialization failure is retried
+            try:
+                p2p_transfer(user, receiver, amount, note=f"P2P transfer to {receiver.email}",
+                             received_note=f"P2P transfer from {user.email}")
+            except ValueError:
+                messages.error(request, "Insufficient balance.")
+                return redirect("payment:transfer")
 
             messages.success(request, f"Successfully sent ${amount} to {receiver.email}.")
-            return redirect("dashboard:user_dashboard")
+            return redirect("user_dashboard")
 
     else:
         form = P2PTransferForm()
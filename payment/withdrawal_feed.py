@@ -0,0 +1,127 @@
+# payment/withdrawal_feed.py
+"""
+Public feed of recent successful withdrawals.
+
+The landing pages list the latest sent withdrawals. Instead of querying and
+counting WithdrawalRequest on every view, the feed is a list of at most
+FEED_SIZE ready-to-render FeedRow tuples, newest first, kept in the
+default cache. The user is already masked and the amount and date already
+formatted.
+
+withdrawal_states publishes every transition to "sent". After the commit,
+publish() reads the new rows with one query and merges them into the
+buffer, dropping the oldest. Writers merge under a short cache lock.
+get_feed() is a single cache read. The buffer is rebuilt from the
+database (payment_wd_sent_feed_idx) only when it is missing: on a cold
+cache, after FEED_TIMEOUT, or after a sent withdrawal was deleted. Every
+change retires WITHDRAWAL_FEED_TAG, so cached pages showing the feed are
+re-rendered.
+
+Web workers and payout workers must share the cache backend for a
+publish in one process to show up in another.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.defaultfilters import floatformat
+from django.utils import dateformat, timezone
+
+from crownbridge_project import caching
+from .models import WithdrawalRequest
+
+FEED_KEY = "payment:withdrawal-feed"
+LOCK_KEY = "payment:withdrawal-feed:lock"
+FEED_SIZE = getattr(settings, "WITHDRAWAL_FEED_SIZE", 49)
+FEED_TIMEOUT = getattr(settings, "WITHDRAWAL_FEED_TIMEOUT", 3600)
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 2.0
+
+FeedRow = namedtuple("FeedRow", ["id", "name", "amount", "chain", "date", "sent_at"])
+
+_FIELDS = ("id", "user__full_name", "user__email", "amount", "chain", "processed_at")
+
+
+def mask_name(full_name, email) -> str:
+    """"Jane D." for a full name, "ja***@example.com" for an email."""
+    parts = (full_name or "").split()
+    if len(parts) > 1:
+        return f"{parts[0]} {parts[-1][0]}."
+    if parts:
+        return f"{parts[0][:2]}***"
+    local, _, domain = (email or "").partition("@")
+    return f"{local[:2]}***@{domain}" if domain else f"{local[:2]}***"
+
+
+def _rows(queryset):
+    return [
+        FeedRow(
+            pk, mask_name(full_name, email), floatformat(amount, 2), chain.upper(),
+            dateformat.format(timezone.localtime(sent_at), "M d, Y H:i"), sent_at,
+        )
+        for pk, full_name, email, amount, chain, sent_at in queryset.values_list(*_FIELDS)
+    ]
+
+
+def _sent():
+    return WithdrawalRequest.objects.filter(status="sent", processed_at__isnull=False)
+
+
+def rebuild():
+    """Reload the feed from the database and cache it."""
+    rows = _rows(_sent().order_by("-processed_at", "-id")[:FEED_SIZE])
+    cache.set(FEED_KEY, rows, FEED_TIMEOUT)
+    return rows
+
+
+def get_feed():
+    """The latest sent withdrawals as FeedRow tuples, newest first."""
+    rows = cache.get(FEED_KEY)
+    caching.count("withdrawal-feed", rows is not None)
+    if rows is None:
+        rows = rebuild()
+    return rows
+
+
+def _acquire():
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _push(ids):
+    locked = _acquire()
+    try:
+        feed = cache.get(FEED_KEY)
+        if feed is None:
+            rebuild()
+        else:
+            new = _rows(_sent().filter(pk__in=ids))
+            if not new:
+                return
+            seen = {row.id for row in new}
+            rows = new + [row for row in feed if row.id not in seen]
+            rows.sort(key=lambda row: (row.sent_at, row.id), reverse=True)
+            cache.set(FEED_KEY, rows[:FEED_SIZE], FEED_TIMEOUT)
+        caching.invalidate_tags(caching.WITHDRAWAL_FEED_TAG)
+    finally:
+        if locked:
+            cache.delete(LOCK_KEY)
+
+
+def publish(ids):
+    """Add the withdrawals `ids`, just moved to "sent", once the surrounding transaction commits."""
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: _push(ids))
+
+
+def invalidate():
+    """Drop the feed after the commit; the next read rebuilds it."""
+    transaction.on_commit(lambda: cache.delete(FEED_KEY))
+    caching.invalidate_tags(caching.WITHDRAWAL_FEED_TAG)
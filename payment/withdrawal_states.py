@@ -0,0 +1,90 @@
+# payment/withdrawal_states.py
+"""
+Compare-and-set status transitions for WithdrawalRequest.
+
+WithdrawalRequest.TRANSITIONS lists the allowed status changes:
+
+    pending -> approved -> processing -> sent | failed
+    pending -> rejected
+
+Every change is one UPDATE whose WHERE clause repeats the status and the
+version the caller read, and which bumps the version. Nobody holds a row
+lock between reading a withdrawal and changing it. When two actors race,
+say two staff members approving the same request, exactly one UPDATE
+matches. The other sees zero rows and reports the conflict instead of
+overwriting the first change.
+
+Withdrawals that reach "sent" are published to the public feed
+(payment.withdrawal_feed) once the transaction commits.
+"""
+from django.db import connection
+from django.db.models import F
+
+from . import withdrawal_feed
+from .models import WithdrawalRequest
+
+WITHDRAWAL_TABLE = WithdrawalRequest._meta.db_table
+
+
+class InvalidTransition(ValueError):
+    """Raised for a status change that WithdrawalRequest.TRANSITIONS does not allow."""
+
+    def __init__(self, source, target):
+        super().__init__(f"Withdrawal cannot go from {source!r} to {target!r}")
+
+
+def check_transition(source: str, target: str):
+    if target not in WithdrawalRequest.TRANSITIONS.get(source, ()):
+        raise InvalidTransition(source, target)
+
+
+def transition(withdrawal: WithdrawalRequest, target: str, **fields) -> bool:
+    """
+    Move `withdrawal` from the status and version it was read with to
+    `target`, also setting `fields`. Returns False, leaving the instance
+    untouched, when another actor changed the row first.
+    """
+    check_transition(withdrawal.status, target)
+    updated = WithdrawalRequest.objects.filter(
+        pk=withdrawal.pk, status=withdrawal.status, version=withdrawal.version
+    ).update(status=target, version=F("version") + 1, **fields)
+    if not updated:
+        return False
+    withdrawal.status = target
+    withdrawal.version += 1
+    for name, value in fields.items():
+        setattr(withdrawal, name, value)
+    if target == "sent":
+        withdrawal_feed.publish([withdrawal.pk])
+    return True
+
+
+def transition_many(rows, source: str, target: str, columns=(), assignments=(), params=(), batch_size: int = 1000):
+    """
+    Compare-and-set many withdrawals from `source` to `target`.
+
+    `rows` are (id, version, *values) tuples; `columns` names the extra
+    values as "name::sqltype" so `assignments` (SQL fragments such as
+    "tx_hash = v.tx_hash") can use them, and any %s in the assignments is
+    filled from `params`. Returns the set of ids that were changed; the
+    other rows had moved on since they were read.
+    """
+    check_transition(source, target)
+    names = [column.split("::")[0] for column in columns]
+    row_sql = "(" + ", ".join(["%s::uuid", "%s::integer"] + [f"%s::{column.split('::')[1]}" for column in columns]) + ")"
+    set_sql = ", ".join(["status = %s", "version = w.version + 1", *assignments])
+    rows = list(rows)
+    changed = set()
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            chunk = rows[i:i + batch_size]
+            cursor.execute(
+                f"UPDATE {WITHDRAWAL_TABLE} AS w SET {set_sql} "
+                f"FROM (VALUES {', '.join([row_sql] * len(chunk))}) AS v(id, version{''.join(', ' + n for n in names)}) "
+                f"WHERE w.id = v.id AND w.version = v.version AND w.status = %s RETURNING w.id",
+                [target, *params] + [value for row in chunk for value in row] + [source],
+            )
+            changed.update(row[0] for row in cursor.fetchall())
+    if target == "sent":
+        withdrawal_feed.publish(changed)
+    return changed
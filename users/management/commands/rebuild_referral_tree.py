@@ -0,0 +1,15 @@
+# users/management/commands/rebuild_referral_tree.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import referrals
+
+
+class Command(BaseCommand):
+    help = "Recreate the referral closure table and downline counts from referred_by."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        paths = referrals.rebuild()
+        self.stdout.write(f"Rebuilt {paths} referral paths in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profile_country'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='downline_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ReferralPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='downline_paths', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upline_paths', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='users_refpath_upline_idx'), models.Index(fields=['ancestor', 'depth'], name='users_refpath_downline_idx')],
+                'constraints': [models.UniqueConstraint(fields=('descendant', 'ancestor'), name='users_refpath_pair_uniq')],
+            },
+        ),
+        # backfill the closure table and downline counts from referred_by
+        migrations.RunSQL(
+            """
+            INSERT INTO users_referralpath (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE up (descendant_id, ancestor_id, depth) AS (
+                SELECT id, referred_by_id, 1 FROM users_customuser WHERE referred_by_id IS NOT NULL
+                UNION ALL
+                SELECT up.descendant_id, u.referred_by_id, up.depth + 1
+                FROM up JOIN users_customuser u ON u.id = up.ancestor_id
+                WHERE u.referred_by_id IS NOT NULL AND up.depth < 255
+            )
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM up
+            WHERE ancestor_id <> descendant_id
+            GROUP BY ancestor_id, descendant_id;
+
+            UPDATE users_customuser AS u SET downline_count = c.n
+            FROM (SELECT ancestor_id, COUNT(*) AS n FROM users_referralpath GROUP BY ancestor_id) AS c
+            WHERE c.ancestor_id = u.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_referral_closure'),
+    ]
+
+    operations = [
+        # 0005's backfill stopped at depth 255; rebuild the closure table with
+        # the cycle-safe walk from users.referrals.rebuild(), without a depth cap
+        migrations.RunSQL(
+            """
+            DELETE FROM users_referralpath;
+
+            INSERT INTO users_referralpath (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE up (descendant_id, ancestor_id, depth, path) AS (
+                SELECT id, referred_by_id, 1, ARRAY[id, referred_by_id] FROM users_customuser WHERE referred_by_id IS NOT NULL
+                UNION ALL
+                SELECT up.descendant_id, u.referred_by_id, up.depth + 1, up.path || u.referred_by_id
+                FROM up JOIN users_customuser u ON u.id = up.ancestor_id
+                WHERE u.referred_by_id IS NOT NULL AND u.referred_by_id <> ALL(up.path)
+            )
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM up
+            WHERE ancestor_id <> descendant_id
+            GROUP BY ancestor_id, descendant_id;
+
+            UPDATE users_customuser AS u SET downline_count = COALESCE(c.n, 0)
+            FROM users_customuser AS x
+            LEFT JOIN (SELECT ancestor_id, COUNT(*) AS n FROM users_referralpath GROUP BY ancestor_id) AS c ON c.ancestor_id = x.id
+            WHERE u.id = x.id AND u.downline_count IS DISTINCT FROM COALESCE(c.n, 0);
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -31,6 +31,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     referral_code = models.CharField(max_length=32, unique=True, blank=True, null=True)
     referred_by = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="referrals")
     referral_bonus_percent = models.DecimalField(max_digits=5, decimal_places=2, default=8.00)
+    # size of the whole referral subtree, kept by users.referrals
+    downline_count = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -50,6 +52,11 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
                     break
             if not self.referral_code:
                 self.referral_code = f"REF{uuid.uuid4().hex[:8].upper()}"
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            # downline_count moves with F() updates; a full save of a stale instance must not overwrite it
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "downline_count"
+            ]
         super().save(*args, **kwargs)
 
     @property
@@ -58,6 +65,29 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return f"{reverse('register')}?ref={self.referral_code}"
 
 
+class ReferralPath(models.Model):
+    """
+    Closure table of the referral tree: one row for every (ancestor,
+    descendant) pair linked through referred_by, `depth` levels apart.
+    Maintained by users.referrals.
+    """
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="downline_paths")
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="upline_paths")
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["descendant", "ancestor"], name="users_refpath_pair_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"], name="users_refpath_upline_idx"),
+            models.Index(fields=["ancestor", "depth"], name="users_refpath_downline_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 class EmailVerification(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="verifications")
     otp = models.CharField(max_length=6)
@@ -0,0 +1,140 @@
+# users/referrals.py
+"""
+Referral tree backed by a closure table.
+
+ReferralPath has one row for every (ancestor, descendant) pair in the
+referred_by tree. A user's upline, to any depth, is one indexed lookup
+(users_refpath_upline_idx). The size of a user's downline is kept in
+CustomUser.downline_count, so neither needs a recursive query.
+
+link() inserts a newly registered user's paths with one INSERT ... SELECT
+over the referrer's own paths and bumps every ancestor's downline_count with
+one UPDATE. move() re-parents a whole subtree when an existing user's
+referred_by changes, and remove() detaches a user's referrals before the
+user is deleted. rebuild() recreates the table from referred_by with a
+recursive CTE, for backfills and repairs. The CTE carries the path walked
+so far and stops at a user already on it, so a referred_by cycle cannot
+make it loop, however deep the tree is.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import CustomUser, ReferralPath
+
+PATH_TABLE = ReferralPath._meta.db_table
+USER_TABLE = CustomUser._meta.db_table
+
+REBUILD_SQL = f"""
+    INSERT INTO {PATH_TABLE} (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE up (descendant_id, ancestor_id, depth, path) AS (
+        SELECT id, referred_by_id, 1, ARRAY[id, referred_by_id] FROM {USER_TABLE} WHERE referred_by_id IS NOT NULL
+        UNION ALL
+        SELECT up.descendant_id, u.referred_by_id, up.depth + 1, up.path || u.referred_by_id
+        FROM up JOIN {USER_TABLE} u ON u.id = up.ancestor_id
+        WHERE u.referred_by_id IS NOT NULL AND u.referred_by_id <> ALL(up.path)
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth) FROM up
+    WHERE ancestor_id <> descendant_id
+    GROUP BY ancestor_id, descendant_id
+"""
+
+COUNT_SQL = f"""
+    UPDATE {USER_TABLE} AS u SET downline_count = COALESCE(c.n, 0)
+    FROM {USER_TABLE} AS x
+    LEFT JOIN (SELECT ancestor_id, COUNT(*) AS n FROM {PATH_TABLE} GROUP BY ancestor_id) AS c ON c.ancestor_id = x.id
+    WHERE u.id = x.id AND u.downline_count IS DISTINCT FROM COALESCE(c.n, 0)
+"""
+
+
+class ReferralCycle(ValueError):
+    """Raised when a user would end up in their own upline."""
+
+
+def _check_cycle(user_id, referrer_id):
+    if referrer_id is None or user_id is None:
+        return
+    if referrer_id == user_id or ReferralPath.objects.filter(ancestor_id=user_id, descendant_id=referrer_id).exists():
+        raise ReferralCycle(f"User {referrer_id} is in the downline of {user_id}")
+
+
+def check_referrer(user):
+    """Raise ReferralCycle if user.referred_by lies in the user's own downline."""
+    _check_cycle(user.pk, user.referred_by_id)
+
+
+def ancestors(user, max_depth: int = None):
+    """[(ancestor id, depth)] of `user`, nearest first."""
+    paths = ReferralPath.objects.filter(descendant=user)
+    if max_depth is not None:
+        paths = paths.filter(depth__lte=max_depth)
+    return list(paths.order_by("depth").values_list("ancestor_id", "depth"))
+
+
+def parent_in_tree(user_id):
+    return ReferralPath.objects.filter(descendant_id=user_id, depth=1).values_list("ancestor_id", flat=True).first()
+
+
+def link(user):
+    """Add the paths of a new leaf `user` under user.referred_by."""
+    if not user.referred_by_id:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {PATH_TABLE} (ancestor_id, descendant_id, depth) "
+            f"SELECT ancestor_id, %s, depth + 1 FROM {PATH_TABLE} WHERE descendant_id = %s "
+            f"UNION ALL SELECT %s, %s, 1",
+            [user.pk, user.referred_by_id, user.referred_by_id, user.pk],
+        )
+        CustomUser.objects.filter(downline_paths__descendant=user).update(downline_count=F("downline_count") + 1)
+
+
+def move(user, referrer_id):
+    """Re-parent `user` and their whole downline under `referrer_id` (None detaches them)."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        _check_cycle(user.pk, referrer_id)
+        size = CustomUser.objects.values_list("downline_count", flat=True).get(pk=user.pk) + 1
+        # detach: drop every path from the old upline into the subtree
+        old_upline = [pk for pk, _ in ancestors(user)]
+        cursor.execute(
+            f"DELETE FROM {PATH_TABLE} WHERE ancestor_id = ANY(%s) AND "
+            f"(descendant_id = %s OR descendant_id IN (SELECT descendant_id FROM {PATH_TABLE} WHERE ancestor_id = %s))",
+            [old_upline, user.pk, user.pk],
+        )
+        CustomUser.objects.filter(pk__in=old_upline).update(downline_count=F("downline_count") - size)
+        if referrer_id is None:
+            return
+        # attach: new upline x (user + subtree)
+        cursor.execute(
+            f"INSERT INTO {PATH_TABLE} (ancestor_id, descendant_id, depth) "
+            f"SELECT up.ancestor_id, sub.descendant_id, up.depth + sub.depth + 1 "
+            f"FROM (SELECT ancestor_id, depth FROM {PATH_TABLE} WHERE descendant_id = %s UNION ALL SELECT %s, 0) AS up "
+            f"CROSS JOIN (SELECT descendant_id, depth FROM {PATH_TABLE} WHERE ancestor_id = %s UNION ALL SELECT %s, 0) AS sub",
+            [referrer_id, referrer_id, user.pk, user.pk],
+        )
+        CustomUser.objects.filter(
+            pk__in=[referrer_id] + [pk for pk, _ in ancestors(referrer_id)]
+        ).update(downline_count=F("downline_count") + size)
+
+
+def sync(user):
+    """Bring the closure table in line with user.referred_by after a save."""
+    if parent_in_tree(user.pk) != user.referred_by_id:
+        move(user, user.referred_by_id)
+
+
+def remove(user):
+    """Detach `user` before deletion: their referrals become roots, as referred_by is SET_NULL."""
+    with transaction.atomic():
+        for child in CustomUser.objects.filter(referred_by=user).only("pk"):
+            move(child, None)
+        move(user, None)
+
+
+def rebuild():
+    """Recreate every path and downline count from referred_by."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PATH_TABLE}")
+        cursor.execute(REBUILD_SQL)
+        paths = cursor.rowcount
+        cursor.execute(COUNT_SQL)
+    return paths
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from .models import CustomUser, Profile
+from . import referrals
 
 
 @receiver(post_save, sender=CustomUser)
@@ -15,3 +16,28 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=CustomUser)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+def _referrer_saved(update_fields):
+    return update_fields is None or "referred_by" in update_fields
+
+
+@receiver(pre_save, sender=CustomUser)
+def check_referral_cycle(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw and _referrer_saved(update_fields):
+        referrals.check_referrer(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_referral_tree(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        referrals.link(instance)
+    elif _referrer_saved(update_fields):
+        referrals.sync(instance)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def detach_referral_tree(sender, instance, **kwargs):
+    referrals.remove(instance)
@@ -1,3 +1,75 @@
 from django.test import TestCase
 
-# Create your tests here.
+from . import referrals
+from .models import CustomUser, ReferralPath
+
+
+class ReferralClosureTests(TestCase):
+    def user(self, email, referred_by=None):
+        return CustomUser.objects.create(email=email, referred_by=referred_by)
+
+    def paths(self):
+        return set(ReferralPath.objects.values_list("ancestor_id", "descendant_id", "depth"))
+
+    def downline(self, *users):
+        return [CustomUser.objects.get(pk=u.pk).downline_count for u in users]
+
+    def setUp(self):
+        # a <- b <- c, and d on its own
+        self.a = self.user("a@example.com")
+        self.b = self.user("b@example.com", self.a)
+        self.c = self.user("c@example.com", self.b)
+        self.d = self.user("d@example.com")
+
+    def test_link_adds_a_path_to_every_ancestor(self):
+        self.assertEqual(referrals.ancestors(self.c), [(self.b.pk, 1), (self.a.pk, 2)])
+        self.assertEqual(referrals.ancestors(self.c, max_depth=1), [(self.b.pk, 1)])
+        self.assertEqual(self.downline(self.a, self.b, self.c), [2, 1, 0])
+
+    def test_changing_the_referrer_moves_the_whole_subtree(self):
+        self.b.referred_by = self.d
+        self.b.save()
+        self.assertEqual(referrals.ancestors(self.c), [(self.b.pk, 1), (self.d.pk, 2)])
+        self.assertEqual(self.downline(self.a, self.b, self.d), [0, 1, 2])
+
+        self.b.referred_by = None
+        self.b.save()
+        self.assertEqual(referrals.ancestors(self.c), [(self.b.pk, 1)])
+        self.assertEqual(self.downline(self.b, self.d), [1, 0])
+
+    def test_a_user_cannot_be_referred_from_their_own_downline(self):
+        self.a.referred_by = self.c
+        with self.assertRaises(referrals.ReferralCycle):
+            self.a.save()
+        with self.assertRaises(referrals.ReferralCycle):
+            referrals.move(self.b, self.b.pk)
+        self.assertEqual(referrals.ancestors(self.a), [])
+
+    def test_deleting_a_user_detaches_their_referrals(self):
+        self.b.delete()
+        self.assertEqual(referrals.ancestors(self.c), [])
+        self.assertEqual(self.downline(self.a), [0])
+
+    def test_rebuild_matches_the_incremental_table(self):
+        self.b.referred_by = self.d
+        self.b.save()
+        incremental = self.paths()
+        self.assertEqual(referrals.rebuild(), len(incremental))
+        self.assertEqual(self.paths(), incremental)
+        self.assertEqual(self.downline(self.a, self.b, self.c, self.d), [0, 1, 0, 2])
+
+    def test_rebuild_follows_deep_chains_and_stops_at_cycles(self):
+        # rebuild() repairs writes that bypassed save(), such as these
+        chain = CustomUser.objects.bulk_create(
+            CustomUser(email=f"deep{i}@example.com", referral_code=f"DEEP{i}") for i in range(300)
+        )
+        for parent, child in zip([self.c] + chain, chain):
+            CustomUser.objects.filter(pk=child.pk).update(referred_by=parent)
+        leaf = chain[-1]
+        e = self.user("e@example.com", self.d)
+        CustomUser.objects.filter(pk=self.d.pk).update(referred_by=e)
+        referrals.rebuild()
+        self.assertEqual(len(referrals.ancestors(leaf)), 302)
+        self.assertEqual(self.downline(self.a), [302])
+        self.assertEqual(referrals.ancestors(self.d), [(e.pk, 1)])
+        self.assertEqual(referrals.ancestors(e), [(self.d.pk, 1)])